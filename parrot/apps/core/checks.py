@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches)
+def per_process_caches(app_configs, **kwargs):
+    # The card index and card cache are invalidated through version keys in
+    # the default cache; a per-process backend never shows one worker's
+    # writes to another.
+    if not isinstance(caches["default"], (LocMemCache, DummyCache)):
+        return []
+    errors = []
+    if settings.CARD_INDEX_SIZE:
+        errors.append(Warning(
+            "CARD_INDEX_SIZE is set but the default cache is per-process.",
+            hint="Use a shared DJANGO_CACHE_BACKEND (file or redis) or set CARD_INDEX_SIZE=0; "
+                 "otherwise other workers keep serving known-card counts from before a write.",
+            id="core.W001",
+        ))
+    if settings.CARD_CACHE_SIZE:
+        errors.append(Warning(
+            "CARD_CACHE_SIZE is set but the default cache is per-process.",
+            hint="Use a shared DJANGO_CACHE_BACKEND (file or redis) or set CARD_CACHE_SIZE=0; "
+                 "otherwise other workers keep serving card text from before an edit.",
+            id="core.W002",
+        ))
+    return errors
@@ -0,0 +1,132 @@
+"""
+Read-replica routing for read-mostly views.
+
+Views opt in with ``@use_replica``: their GET/HEAD reads go to one of
+settings.DATABASE_REPLICAS, picked once per request. Everything else,
+including every write, stays on ``default``. Reads fall back to the primary
+when the request is inside a transaction on ``default``, when it has
+already written, or when the client wrote within the last
+DATABASE_REPLICA_PIN_SECONDS (tracked by a cookie that ReplicaPinMiddleware
+sets), so users always see their own writes.
+"""
+import random
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = "db_pin"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_read_alias: ContextVar[str | None] = ContextVar("replica_read_alias", default=None)
+# A dict rather than separate vars so writes made in a copied context (as
+# under sync_to_async) are still seen by the request that owns it.
+_request_state: ContextVar[dict | None] = ContextVar("replica_request_state", default=None)
+
+_END = object()
+
+
+def _reads_pinned() -> bool:
+    state = _request_state.get()
+    return bool(state and (state["pinned"] or state["wrote"]))
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or _reads_pinned() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state["wrote"] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+def _stream_with_alias(chunks, alias):
+    # Streaming bodies are consumed after the view returns, outside its context.
+    it = iter(chunks)
+    while True:
+        token = _read_alias.set(alias)
+        try:
+            chunk = next(it, _END)
+        finally:
+            _read_alias.reset(token)
+        if chunk is _END:
+            return
+        yield chunk
+
+
+def use_replica(view):
+    """Serve the view's reads from a replica for safe requests."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS or not settings.DATABASE_REPLICAS or _reads_pinned():
+            return view(request, *args, **kwargs)
+
+        alias = random.choice(settings.DATABASE_REPLICAS)
+        token = _read_alias.set(alias)
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+        if response.streaming and not _reads_pinned():
+            response.streaming_content = _stream_with_alias(response.streaming_content, alias)
+        return response
+    return wrapper
+
+
+class ReplicaPinMiddleware:
+    """Pins a client's reads to the primary for a while after it writes."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state, token = self._enter(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self._finish(request, response, state)
+
+    async def __acall__(self, request):
+        state, token = self._enter(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self._finish(request, response, state)
+
+    def _enter(self, request):
+        state = {"pinned": PIN_COOKIE in request.COOKIES, "wrote": False}
+        return state, _request_state.set(state)
+
+    def _finish(self, request, response, state):
+        if settings.DATABASE_REPLICAS and (state["wrote"] or request.method not in SAFE_METHODS):
+            response.set_cookie(
+                PIN_COOKIE,
+                "1",
+                max_age=settings.DATABASE_REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
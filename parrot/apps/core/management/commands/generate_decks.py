@@ -0,0 +1,166 @@
+import json
+import os
+import time
+import tomllib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import StringIO
+from pathlib import Path
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+ENTRY_KEYS = {"lang", "title", "csv", "n", "name", "source", "version"}
+
+
+def _init_worker():
+    django.setup()
+
+
+def _load_one(entry, prune, dry_run):
+    # Runs in a worker: one connection per process, one transaction per
+    # language (generate_top_deck is atomic), failures reported not raised.
+    out = StringIO()
+    t0 = time.perf_counter()
+    try:
+        call_command(
+            "generate_top_deck",
+            lang=entry["lang"],
+            title=entry["title"],
+            csv=entry["csv"],
+            n=entry.get("n", 1000),
+            name=entry.get("name"),
+            source=entry.get("source", "csv"),
+            deck_version=entry.get("version", ""),
+            prune=prune,
+            dry_run=dry_run,
+            stdout=out,
+        )
+        ok, message = True, out.getvalue().strip().splitlines()[-1]
+    except Exception as e:
+        ok, message = False, f"{type(e).__name__}: {e}"
+    finally:
+        connections.close_all()
+    return entry, ok, message, time.perf_counter() - t0
+
+
+def _positive_n(value, where: str) -> int:
+    # bool is an int and 2.5 would truncate; neither is a row count.
+    try:
+        n = int(value) if not isinstance(value, (bool, float)) else 0
+    except (TypeError, ValueError):
+        n = 0
+    if n <= 0:
+        raise CommandError(f"{where} needs a positive integer 'n', got {value!r}.")
+    return n
+
+
+def read_manifest(path: Path, default_title: str, default_n: int) -> list[dict]:
+    """
+    Read a JSON/TOML manifest or scan a directory of ``<lang>.csv`` files.
+
+    Manifest files hold a list of entries (or ``{"decks": [...]}``) with
+    lang, title, csv, n and optional name/source/version; csv paths are
+    relative to the manifest. Each language may appear once, since parallel
+    workers loading the same language would race on its words.
+    """
+    default_n = _positive_n(default_n, "--n")
+    if path.is_dir():
+        return [
+            {"lang": p.stem, "title": default_title, "csv": str(p), "n": default_n}
+            for p in sorted(path.glob("*.csv"))
+        ]
+
+    text = path.read_text(encoding="utf-8")
+    try:
+        data = tomllib.loads(text) if path.suffix == ".toml" else json.loads(text)
+    except (ValueError, tomllib.TOMLDecodeError) as e:
+        raise CommandError(f"Could not parse manifest {path}: {e}")
+    if isinstance(data, dict):
+        data = data.get("decks", [])
+
+    entries = []
+    seen: dict[str, int] = {}
+    for i, raw in enumerate(data, start=1):
+        if not isinstance(raw, dict) or not raw.get("lang") or not raw.get("csv"):
+            raise CommandError(f"Manifest entry {i} needs at least 'lang' and 'csv'.")
+        unknown = set(raw) - ENTRY_KEYS
+        if unknown:
+            raise CommandError(f"Manifest entry {i} has unknown keys: {', '.join(sorted(unknown))}")
+        if raw["lang"] in seen:
+            raise CommandError(f"Manifest entry {i} repeats lang '{raw['lang']}' from entry {seen[raw['lang']]}.")
+        seen[raw["lang"]] = i
+        entry = {"title": default_title, "n": default_n, **raw}
+        entry["n"] = _positive_n(entry["n"], f"Manifest entry {i}")
+        entry["csv"] = str((path.parent / entry["csv"]).resolve())
+        entries.append(entry)
+    return entries
+
+
+class Command(BaseCommand):
+    help = "Generate/update Top N decks for many languages in parallel from a manifest."
+
+    def add_arguments(self, parser):
+        parser.add_argument("manifest", help="JSON/TOML manifest file, or a directory of <lang>.csv files")
+        parser.add_argument("--title", default="Top 1000", help='Default deck title (default "Top 1000")')
+        parser.add_argument("--n", type=int, default=1000, help="Default rows per language (default 1000)")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (default: CPU count)")
+        parser.add_argument("--prune", action="store_true", help="Remove deck cards that are no longer in each list")
+        parser.add_argument("--dry-run", action="store_true", help="Print what would change without writing")
+
+    def handle(self, *args, **opts):
+        path = Path(opts["manifest"])
+        if not path.exists():
+            raise CommandError(f"Manifest not found: {path}")
+        entries = read_manifest(path, opts["title"], opts["n"])
+        if not entries:
+            raise CommandError("Manifest lists no decks.")
+        missing = [e["csv"] for e in entries if not Path(e["csv"]).exists()]
+        if missing:
+            raise CommandError(f"CSV file(s) not found: {', '.join(missing)}")
+
+        workers = max(1, min(opts["workers"], len(entries)))
+        if workers > 1 and connection.vendor == "sqlite":
+            # SQLite allows one writer at a time; parallel loads would only
+            # trade throughput for "database is locked" errors.
+            self.stderr.write("SQLite serialises writes; running with 1 worker.")
+            workers = 1
+
+        self.stdout.write(f"Loading {len(entries)} deck(s) with {workers} worker(s)")
+        t0 = time.perf_counter()
+        failed = []
+        results = self._run(entries, workers, opts["prune"], opts["dry_run"])
+        for done, (entry, ok, message, elapsed) in enumerate(results, start=1):
+            label = f"[{done}/{len(entries)}] {entry['lang']} '{entry['title']}' ({elapsed:.1f}s)"
+            if ok:
+                self.stdout.write(f"{label}: {message}")
+            else:
+                failed.append(entry["lang"])
+                self.stderr.write(f"{label} FAILED: {message}")
+
+        elapsed = time.perf_counter() - t0
+        if failed:
+            raise CommandError(
+                f"{len(failed)} of {len(entries)} language(s) failed after {elapsed:.1f}s: {', '.join(failed)}. "
+                "The other languages were committed."
+            )
+        self.stdout.write(self.style.SUCCESS(f"Loaded {len(entries)} deck(s) in {elapsed:.1f}s."))
+
+    def _run(self, entries, workers, prune, dry_run):
+        if workers == 1:
+            for entry in entries:
+                yield _load_one(entry, prune, dry_run)
+            return
+
+        # Forked workers must not inherit the parent's open connections.
+        connections.close_all()
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        try:
+            futures = [pool.submit(_load_one, entry, prune, dry_run) for entry in entries]
+            for future in as_completed(futures):
+                yield future.result()
+        except KeyboardInterrupt:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise CommandError("Interrupted; languages already reported as loaded were committed.")
+        pool.shutdown()
@@ -1,10 +1,88 @@
 import csv
+import time
 from pathlib import Path
+from typing import NamedTuple
 
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 
 from apps.core.models import Language, Deck, Flashcard, DeckCard
+from apps.library.services import frontier
+from apps.library.services.counts import apply_deck_cards_added, apply_deck_cards_removed
+from apps.library.signals import deck_cards_changed_in_bulk
+from apps.study.services import card_cache
+from apps.study.services.cards import RENDER_FIELDS, invalidate_card_sessions
+
+
+class Plan(NamedTuple):
+    card_ids: dict          # word -> id of cards that already exist
+    new_cards: list         # unsaved Flashcards
+    card_updates: list      # (Flashcard, [(field, old, new)])
+    new_links: list         # (word, rank) to attach to the deck
+    moved_links: list       # DeckCards with a new position
+    moved_diff: list        # (word, old position, new position)
+    stale_links: list       # DeckCards no longer in the list (only with --prune)
+    stale_words: list
+
+
+def _plan(language, deck, rows, prune) -> Plan:
+    existing = {}
+    if language is not None:
+        existing = {
+            c.word: c
+            for c in Flashcard.objects.filter(language=language).order_by().only(
+                "id", "word", "translation", "context_sentence", "frequency_rank"
+            )
+        }
+    links = {}
+    if deck is not None:
+        links = {dc.card_id: dc for dc in DeckCard.objects.filter(deck=deck).order_by().only("id", "card_id", "position")}
+
+    new_cards, card_updates, new_links, moved_links, moved_diff = [], [], [], [], []
+    for r in rows:
+        card = existing.get(r["word"])
+        if card is None:
+            new_cards.append(Flashcard(
+                language=language,
+                word=r["word"],
+                translation=r["translation"],
+                context_sentence=r["context"],
+                frequency_rank=r["rank"],
+            ))
+            new_links.append((r["word"], r["rank"]))
+            continue
+
+        changes = []
+        if r["translation"] and card.translation != r["translation"]:
+            changes.append(("translation", card.translation, r["translation"]))
+        if r["context"] and card.context_sentence != r["context"]:
+            changes.append(("context_sentence", card.context_sentence, r["context"]))
+        if card.frequency_rank is None or (r["rank"] and r["rank"] < card.frequency_rank):
+            changes.append(("frequency_rank", card.frequency_rank, r["rank"]))
+        if changes:
+            for field, _, value in changes:
+                setattr(card, field, value)
+            card_updates.append((card, changes))
+
+        link = links.get(card.id)
+        if link is None:
+            new_links.append((r["word"], r["rank"]))
+        elif link.position != r["rank"]:
+            moved_diff.append((r["word"], link.position, r["rank"]))
+            link.position = r["rank"]
+            moved_links.append(link)
+
+    stale_links, stale_words = [], []
+    if prune and links:
+        listed = {existing[r["word"]].id for r in rows if r["word"] in existing}
+        stale_links = [dc for card_id, dc in links.items() if card_id not in listed]
+        words = {c.id: w for w, c in existing.items()}
+        stale_words = [words.get(dc.card_id, f"#{dc.card_id}") for dc in stale_links]
+
+    return Plan(
+        {w: c.id for w, c in existing.items()},
+        new_cards, card_updates, new_links, moved_links, moved_diff, stale_links, stale_words,
+    )
 
 
 class Command(BaseCommand):
@@ -18,6 +96,9 @@ class Command(BaseCommand):
         parser.add_argument("--n", type=int, default=1000, help="How many rows to load (default 1000)")
         parser.add_argument("--source", default="csv", help="Deck source label (default csv)")
         parser.add_argument("--deck-version", default="", help="Deck version label (optional)")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows per INSERT/UPDATE batch (default 1000)")
+        parser.add_argument("--prune", action="store_true", help="Remove deck cards that are no longer in the list")
+        parser.add_argument("--dry-run", action="store_true", help="Print the changes without writing them")
 
     def handle(self, *args, **opts):
         lang_code: str = opts["lang"].strip()
@@ -27,6 +108,10 @@ class Command(BaseCommand):
         n: int = opts["n"]
         source: str = opts["source"]
         version: str = opts["deck_version"]
+        batch_size: int = opts["batch_size"]
+        prune: bool = opts["prune"]
+        dry_run: bool = opts["dry_run"]
+        self.verbosity = opts["verbosity"]
 
         if not csv_path.exists():
             raise CommandError(f"CSV file not found: {csv_path}")
@@ -57,95 +142,137 @@ class Command(BaseCommand):
             raise CommandError("No valid rows found in CSV.")
 
         rows.sort(key=lambda r: r["rank"])
+        # Keep the best-ranked occurrence of a repeated word.
+        rows = list({r["word"]: r for r in reversed(rows)}.values())[::-1]
 
+        t0 = time.perf_counter()
         with transaction.atomic():
-            language_defaults = {}
-            if lang_name:
-                language_defaults["name"] = lang_name.strip()
+            language, deck = self._language_and_deck(lang_code, lang_name, deck_title, source, version, dry_run)
+            plan = _plan(language, deck, rows, prune)
+            self._report_plan(plan, dry_run)
+            if not dry_run:
+                self._apply(plan, language, deck, batch_size)
+        elapsed = time.perf_counter() - t0
 
-            language, created = Language.objects.get_or_create(
-                code=lang_code,
-                defaults=language_defaults or None,
-            )
-            if created:
-                self.stdout.write(self.style.SUCCESS(f"Created language {language.code}"))
-            else:
-                if lang_name and language.name != lang_name.strip():
-                    language.name = lang_name.strip()
-                    language.save(update_fields=["name"])
-
-            deck, deck_created = Deck.objects.get_or_create(
-                language=language,
-                title=deck_title,
-                defaults={
-                    "description": "",
-                    "is_generated": True,
-                    "source": source,
-                    "version": version,
-                    "is_public": True
-                },
+        rate = len(rows) / elapsed if elapsed else 0.0
+        status = "dry run, nothing written" if dry_run else "ready"
+        self.stdout.write(self.style.SUCCESS(
+            f"Deck '{deck_title}' ({lang_code}) {status}. "
+            f"Cards created: {len(plan.new_cards)}, updated: {len(plan.card_updates)}, "
+            f"attached: {len(plan.new_links)}, moved: {len(plan.moved_links)}, removed: {len(plan.stale_links)}. "
+            f"{len(rows)} rows in {elapsed:.2f}s ({rate:.0f} rows/s)."
+        ))
+
+    def _language_and_deck(self, lang_code, lang_name, deck_title, source, version, dry_run):
+        if dry_run:
+            language = Language.objects.filter(code=lang_code).first()
+            deck = Deck.objects.filter(language=language, title=deck_title).first() if language else None
+            return language, deck
+
+        language_defaults = {}
+        if lang_name:
+            language_defaults["name"] = lang_name.strip()
+
+        language, created = Language.objects.get_or_create(
+            code=lang_code,
+            defaults=language_defaults or None,
+        )
+        if created:
+            self.stdout.write(self.style.SUCCESS(f"Created language {language.code}"))
+        else:
+            if lang_name and language.name != lang_name.strip():
+                language.name = lang_name.strip()
+                language.save(update_fields=["name"])
+
+        deck, deck_created = Deck.objects.get_or_create(
+            language=language,
+            title=deck_title,
+            defaults={
+                "description": "",
+                "is_generated": True,
+                "source": source,
+                "version": version,
+                "is_public": True
+            },
+        )
+        if not deck_created:
+            changed = False
+            if not deck.is_generated:
+                deck.is_generated = True
+                changed = True
+            if deck.source != source:
+                deck.source = source
+                changed = True
+            if version and deck.version != version:
+                deck.version = version
+                changed = True
+            if not deck.is_public:
+                deck.is_public = True
+                changed = True
+            if changed:
+                deck.save(update_fields=["is_generated", "source", "version", "is_public"])
+        # Serialises concurrent loads into the same deck.
+        Deck.objects.select_for_update().filter(pk=deck.pk).first()
+        return language, deck
+
+    def _report_plan(self, plan, dry_run):
+        if not dry_run and self.verbosity < 2:
+            return
+        for card in plan.new_cards:
+            self.stdout.write(f"+ {card.word} (rank {card.frequency_rank})")
+        for card, changes in plan.card_updates:
+            detail = ", ".join(f"{field} {old!r} -> {new!r}" for field, old, new in changes)
+            self.stdout.write(f"~ {card.word}: {detail}")
+        for word, old, new in plan.moved_diff:
+            self.stdout.write(f"~ {word}: position {old} -> {new}")
+        for word in plan.stale_words:
+            self.stdout.write(f"- {word}")
+
+    def _apply(self, plan, language, deck, batch_size):
+        Flashcard.objects.bulk_create(
+            plan.new_cards,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["language", "word"],
+            update_fields=["translation", "context_sentence", "frequency_rank"],
+        )
+        updated = [card for card, _ in plan.card_updates]
+        Flashcard.objects.bulk_update(
+            updated, ["translation", "context_sentence", "frequency_rank"], batch_size=batch_size,
+        )
+        # Edited cards may be cached per process and snapshotted in active
+        # study sessions.
+        edited = [card.id for card, changes in plan.card_updates if any(f in RENDER_FIELDS for f, _, _ in changes)]
+        card_cache.invalidate(edited)
+        invalidate_card_sessions(edited)
+        frontier.ranks_changed(
+            [card.id for card, changes in plan.card_updates if any(f == "frequency_rank" for f, _, _ in changes)]
+        )
+
+        # bulk_create does not return ids for upserts on every backend.
+        card_ids = dict(plan.card_ids)
+        new_words = [c.word for c in plan.new_cards]
+        for start in range(0, len(new_words), batch_size):
+            card_ids.update(
+                Flashcard.objects
+                .filter(language=language, word__in=new_words[start:start + batch_size])
+                .values_list("word", "id")
             )
-            if not deck_created:
-                changed = False
-                if not deck.is_generated:
-                    deck.is_generated = True
-                    changed = True
-                if deck.source != source:
-                    deck.source = source
-                    changed = True
-                if version and deck.version != version:
-                    deck.version = version
-                    changed = True
-                if not deck.is_public:
-                    deck.is_public = True
-                    changed = True
-                if changed:
-                    deck.save(update_fields=["is_generated", "source", "version"])
-
-            created_cards = 0
-            updated_cards = 0
-            attached = 0
-
-            for r in rows:
-                card, c_created = Flashcard.objects.get_or_create(
-                    language=language,
-                    word=r["word"],
-                    defaults={
-                        "translation": r["translation"],
-                        "context_sentence": r["context"],
-                        "frequency_rank": r["rank"],
-                    },
-                )
-                if c_created:
-                    created_cards += 1
-                else:
-                    changed_fields = []
-                    if r["translation"] and card.translation != r["translation"]:
-                        card.translation = r["translation"]
-                        changed_fields.append("translation")
-                    if r["context"] and card.context_sentence != r["context"]:
-                        card.context_sentence = r["context"]
-                        changed_fields.append("context_sentence")
-                    if card.frequency_rank is None or (r["rank"] and r["rank"] < card.frequency_rank):
-                        card.frequency_rank = r["rank"]
-                        changed_fields.append("frequency_rank")
-
-                    if changed_fields:
-                        card.save(update_fields=changed_fields)
-                        updated_cards += 1
-
-                dc, dc_created = DeckCard.objects.get_or_create(
-                    deck=deck,
-                    card=card,
-                    defaults={"position": r["rank"]},
-                )
-                if not dc_created and dc.position != r["rank"]:
-                    dc.position = r["rank"]
-                    dc.save(update_fields=["position"])
-                if dc_created:
-                    attached += 1
-
-            self.stdout.write(self.style.SUCCESS(
-                f"Deck '{deck.title}' ({language.code}) ready. "
-                f"Cards created: {created_cards}, updated: {updated_cards}, attached: {attached}."
-            ))
+
+        links = [DeckCard(deck=deck, card_id=card_ids[word], position=rank) for word, rank in plan.new_links]
+        DeckCard.objects.bulk_create(
+            links,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["deck", "card"],
+            update_fields=["position"],
+        )
+        DeckCard.objects.bulk_update(plan.moved_links, ["position"], batch_size=batch_size)
+        apply_deck_cards_added(deck, [dc.card_id for dc in links])
+
+        if plan.stale_links:
+            stale_ids = [dc.id for dc in plan.stale_links]
+            with deck_cards_changed_in_bulk():
+                for start in range(0, len(stale_ids), batch_size):
+                    DeckCard.objects.filter(id__in=stale_ids[start:start + batch_size]).delete()
+            apply_deck_cards_removed(deck, [dc.card_id for dc in plan.stale_links])
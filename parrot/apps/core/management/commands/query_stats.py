@@ -0,0 +1,37 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from apps.core.query_stats import reset_stats, stats
+
+
+class Command(BaseCommand):
+    help = "Show per-view query counts, DB time, slowest SQL and repeated query shapes from sampled requests."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--json", action="store_true", help="Print the raw aggregates as JSON")
+        parser.add_argument("--sql", action="store_true", help="Also print each view's slowest and repeated SQL")
+        parser.add_argument("--reset", action="store_true", help="Clear the aggregates after printing")
+
+    def handle(self, *args, **opts):
+        rows = stats()
+        if opts["json"]:
+            self.stdout.write(json.dumps(rows, indent=2))
+        elif not rows:
+            self.stdout.write("No sampled requests yet (see QUERY_STATS_SAMPLE_RATE).")
+        else:
+            self.stdout.write(
+                f"{'view':<32} {'samples':>8} {'avg q':>7} {'max q':>6} {'avg ms':>8} {'max ms':>8} {'repeated':>8}"
+            )
+            for r in rows:
+                self.stdout.write(
+                    f"{r['view'][:32]:<32} {r['samples']:>8} {r['avg_queries']:>7.1f} {r['max_queries']:>6} "
+                    f"{r['avg_db_ms']:>8.1f} {r['max_db_ms']:>8.1f} {len(r['duplicates']):>8}"
+                )
+                if opts["sql"]:
+                    self.stdout.write(f"    slowest ({r['slowest_ms']:.1f} ms): {r['slowest_sql']}")
+                    for sql, n in r["duplicates"].items():
+                        self.stdout.write(f"    x{n}: {sql}")
+        if opts["reset"]:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS("Query stats reset."))
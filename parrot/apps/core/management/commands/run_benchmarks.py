@@ -0,0 +1,270 @@
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from io import StringIO
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.core.models import Deck
+from apps.core.services.synthetic import SIZES, generate_dataset, spec_for
+from apps.library.models import UserDeck
+from apps.library.services.counts import compute_counts
+from apps.library.services.csv_io import ParsedRow, import_rows_into_deck, iter_deck_csv
+from apps.study.models import StudySession
+from apps.study.services.selector import select_session_queue
+
+BENCHMARKS = [
+    "select_session_queue",
+    "compute_counts",
+    "explore_cold",
+    "explore_warm",
+    "library",
+    "grade_card",
+    "csv_import",
+    "csv_export",
+    "generate_top_deck",
+]
+PREFIX = "bench-"
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class _Fixture:
+    """Handles into a generated dataset that the benchmarks share."""
+
+    def __init__(self):
+        ud = (
+            UserDeck.objects.select_related("user", "deck")
+            .filter(user__username__startswith=PREFIX)
+            .order_by("-deck__card_count", "id")
+            .first()
+        )
+        if ud is None:
+            raise CommandError("The dataset has no library entries; raise --users.")
+        self.user, self.deck = ud.user, ud.deck
+        self.user_decks = list(UserDeck.objects.select_related("deck").filter(user=self.user))
+        self.largest_deck = Deck.objects.filter(language__code__startswith=PREFIX).order_by("-card_count").first()
+        self.client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        self.client.force_login(self.user)
+        self.runs = 0
+
+    def next_run(self) -> int:
+        self.runs += 1
+        return self.runs
+
+
+class Command(BaseCommand):
+    help = (
+        "Time core paths (queue selection, counts, explore, library, grading, CSV import/export, "
+        "generate_top_deck) on synthetic datasets of several sizes and write the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="small,medium", help=f"Comma-separated presets from {', '.join(SIZES)} (default small,medium)")
+        parser.add_argument("--only", help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark after one warm-up (default 5)")
+        parser.add_argument("--rows", type=int, default=5000, help="Rows for the CSV import and generate_top_deck runs (default 5000)")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write results to this JSON file")
+        parser.add_argument("--compare", help="Baseline JSON from an earlier run; fail if any median regressed")
+        parser.add_argument(
+            "--threshold", type=float, default=1.25,
+            help="Slowdown ratio that counts as a regression with --compare (default 1.25)",
+        )
+
+    def handle(self, *args, **opts):
+        sizes = [s.strip() for s in opts["sizes"].split(",") if s.strip()]
+        unknown = set(sizes) - set(SIZES)
+        if unknown:
+            raise CommandError(f"Unknown size(s): {', '.join(sorted(unknown))}.")
+        names = BENCHMARKS
+        if opts["only"]:
+            names = [n.strip() for n in opts["only"].split(",") if n.strip()]
+            unknown = set(names) - set(BENCHMARKS)
+            if unknown:
+                raise CommandError(f"Unknown benchmark(s): {', '.join(sorted(unknown))}.")
+        if opts["repeat"] < 1:
+            raise CommandError("--repeat must be at least 1.")
+        baseline = self._load_baseline(opts["compare"]) if opts["compare"] else None
+
+        report = {
+            "meta": {
+                "commit": _git_commit(),
+                "created": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "repeat": opts["repeat"],
+                "seed": opts["seed"],
+            },
+            "datasets": {},
+            "results": [],
+        }
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.tmp_dir = Path(tmp_dir)
+            for size in sizes:
+                self._run_size(size, names, opts, report, baseline)
+
+        if opts["output"]:
+            Path(opts["output"]).write_text(json.dumps(report, indent=2), encoding="utf-8")
+            self.stdout.write(f"Wrote {opts['output']}")
+
+        if baseline is not None:
+            regressed = [
+                f"{r['size']}/{r['name']}" for r in report["results"]
+                if self._ratio(r, baseline) is not None and self._ratio(r, baseline) > opts["threshold"]
+            ]
+            if regressed:
+                raise CommandError(f"Slower than {opts['threshold']}x baseline: {', '.join(regressed)}")
+        self.stdout.write(self.style.SUCCESS("Done."))
+
+    def _run_size(self, size, names, opts, report, baseline):
+        # Each dataset lives in one transaction that is rolled back afterwards.
+        try:
+            with transaction.atomic():
+                t0 = time.perf_counter()
+                summary = generate_dataset(spec_for(size), seed=opts["seed"], prefix=PREFIX)
+                self.stdout.write(
+                    f"[{size}] {summary['cards']} cards, {summary['users']} users, {summary['progress']} progress, "
+                    f"{summary['reviews']} reviews (generated in {time.perf_counter() - t0:.1f}s)"
+                )
+                report["datasets"][size] = summary
+                fixture = _Fixture()
+                for name in names:
+                    result = {"size": size, **self._measure(name, fixture, opts)}
+                    report["results"].append(result)
+                    self._print(result, baseline)
+                raise _Rollback
+        except _Rollback:
+            pass
+        cache.clear()
+
+    def _measure(self, name, fixture, opts):
+        fn = getattr(self, f"_bench_{name}")(fixture, opts)
+        fn()  # warm-up
+        samples = []
+        for _ in range(opts["repeat"] - 1):
+            t0 = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - t0) * 1000)
+        with CaptureQueriesContext(connection) as ctx:
+            t0 = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - t0) * 1000)
+        samples.sort()
+        return {
+            "name": name,
+            "median_ms": statistics.median(samples),
+            "p95_ms": samples[min(len(samples) - 1, int(0.95 * len(samples)))],
+            "min_ms": samples[0],
+            "queries": len(ctx.captured_queries),
+        }
+
+    # Each _bench_* returns the callable that is timed.
+
+    def _bench_select_session_queue(self, f, opts):
+        return lambda: select_session_queue(f.user, f.deck, chunk_size=20, new_ratio=0.2, daily_new_limit=20, new_today=0)
+
+    def _bench_compute_counts(self, f, opts):
+        totals = {ud.deck_id: ud.deck.card_count for ud in f.user_decks}
+        return lambda: compute_counts(f.user_decks, totals=totals)
+
+    def _bench_explore_cold(self, f, opts):
+        def run():
+            cache.clear()
+            f.client.get("/")
+        return run
+
+    def _bench_explore_warm(self, f, opts):
+        return lambda: f.client.get("/")
+
+    def _bench_library(self, f, opts):
+        return lambda: f.client.get("/library/")
+
+    def _bench_grade_card(self, f, opts):
+        def run():
+            session = StudySession.objects.filter(user=f.user, deck=f.deck, status="active").first()
+            if session is None:
+                f.client.get(f"/study/start/{f.deck.id}/")
+                session = StudySession.objects.get(user=f.user, deck=f.deck, status="active")
+            f.client.post(
+                f"/study/grade/{session.id}/",
+                {"index": session.index, "nonce": session.current_nonce, "quality": 4},
+            )
+        return run
+
+    def _bench_csv_import(self, f, opts):
+        def run():
+            deck = Deck.objects.create(language=f.deck.language, title=f"{PREFIX}import {f.next_run()}", created_by=f.user)
+            rows = [
+                ParsedRow(rank=i, word=f"imp{deck.id}-{i}", translation=f"t{i}", context="")
+                for i in range(opts["rows"])
+            ]
+            import_rows_into_deck(deck=deck, user=f.user, rows=rows)
+        return run
+
+    def _bench_csv_export(self, f, opts):
+        return lambda: sum(len(piece) for piece in iter_deck_csv(f.largest_deck))
+
+    def _bench_generate_top_deck(self, f, opts):
+        path = self.tmp_dir / "top.csv"
+        with open(path, "w", encoding="utf-8") as out:
+            out.write("rank,word,translation\n")
+            out.writelines(f"{i},top{i},t{i}\n" for i in range(1, opts["rows"] + 1))
+
+        def run():
+            call_command(
+                "generate_top_deck",
+                lang=f"{PREFIX}top{f.next_run()}",
+                title="Top",
+                csv=str(path),
+                n=opts["rows"],
+                stdout=StringIO(),
+            )
+        return run
+
+    def _load_baseline(self, path):
+        try:
+            data = json.loads(Path(path).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read baseline {path}: {e}")
+        return {(r["size"], r["name"]): r for r in data.get("results", [])}
+
+    def _ratio(self, result, baseline):
+        before = baseline.get((result["size"], result["name"]))
+        if not before or not before["median_ms"]:
+            return None
+        return result["median_ms"] / before["median_ms"]
+
+    def _print(self, r, baseline):
+        line = (
+            f"  {r['name']:<22} median {r['median_ms']:>9.2f} ms  p95 {r['p95_ms']:>9.2f} ms  "
+            f"queries {r['queries']:>4}"
+        )
+        ratio = self._ratio(r, baseline) if baseline else None
+        if ratio is not None:
+            line += f"  {ratio:>5.2f}x baseline"
+        self.stdout.write(line)
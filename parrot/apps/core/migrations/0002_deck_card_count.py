@@ -0,0 +1,34 @@
+# Generated by Django 4.2.27 on 2026-10-18 06:16
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_card_count(apps, schema_editor):
+    Deck = apps.get_model("core", "Deck")
+    DeckCard = apps.get_model("core", "DeckCard")
+    counts = (
+        DeckCard.objects.filter(deck=OuterRef("pk"))
+        .order_by()
+        .values("deck")
+        .annotate(n=Count("id"))
+        .values("n")
+    )
+    Deck.objects.update(card_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deck',
+            name='card_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_card_count, migrations.RunPython.noop),
+    ]
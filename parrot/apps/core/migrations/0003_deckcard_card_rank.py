@@ -0,0 +1,34 @@
+# Generated by Django 4.2.27 on 2026-10-18 06:42
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def copy_ranks(apps, schema_editor):
+    DeckCard = apps.get_model("core", "DeckCard")
+    Flashcard = apps.get_model("core", "Flashcard")
+    DeckCard.objects.update(card_rank=Coalesce(
+        Subquery(Flashcard.objects.filter(pk=OuterRef("card_id")).values("frequency_rank")[:1]),
+        Value(2**31 - 1),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_deck_card_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deckcard',
+            name='card_rank',
+            field=models.PositiveIntegerField(default=2147483647),
+        ),
+        migrations.AddIndex(
+            model_name='deckcard',
+            index=models.Index(fields=['deck', 'card_rank', 'card'], name='core_deckca_deck_id_1ff4be_idx'),
+        ),
+        migrations.RunPython(copy_ranks, migrations.RunPython.noop),
+    ]
@@ -23,6 +23,8 @@ class Deck(models.Model):
     created = models.DateTimeField(auto_now_add=True)
 
     is_public = models.BooleanField(null=False, default=False)
+    # Maintained by library.services.counts whenever DeckCards change.
+    card_count = models.PositiveIntegerField(default=0)
     
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -73,10 +75,17 @@ class Flashcard(models.Model):
         return f"{self.word} ({self.language.code})"
     
 
+# DeckCard.card_rank of cards without a frequency rank, so they sort last.
+UNRANKED = 2**31 - 1
+
+
 class DeckCard(models.Model):
     deck = models.ForeignKey(Deck, on_delete=models.CASCADE, related_name="deck_cards")
     card = models.ForeignKey(Flashcard, on_delete=models.CASCADE, related_name="deck_cards")
     position = models.PositiveIntegerField(default=0)
+    # card.frequency_rank copied here so a deck's new-card order is an index
+    # range. Maintained by library.services.frontier.
+    card_rank = models.PositiveIntegerField(default=UNRANKED)
 
     class Meta:
         constraints = [
@@ -85,5 +94,6 @@ class DeckCard(models.Model):
         indexes = [
             models.Index(fields=["deck", "position"]),
             models.Index(fields=["deck", "card"]),
+            models.Index(fields=["deck", "card_rank", "card"]),
         ]
         ordering= ["deck_id", "position"]
\ No newline at end of file
@@ -0,0 +1,217 @@
+"""
+Per-request query instrumentation.
+
+QueryStatsMiddleware samples a fraction of requests (QUERY_STATS_SAMPLE_RATE)
+and records, for each, the query count, total DB time, the slowest
+statement and statements that ran more than once with the same shape
+(usually an N+1 loop). Each sampled request is logged as one JSON line,
+optionally reported in a ``Server-Timing`` header, and folded into per-view
+totals kept in the cache, read by the ``query_stats`` command and the
+staff-only /ops/query-stats/ endpoint.
+
+Every connection carries one permanent execute wrapper (installed when the
+connection opens) that forwards to the recorder in a ContextVar. The
+middleware sets the ContextVar, and asgiref copies it into sync_to_async
+threads, so async views whose ORM work runs on other threads' connections
+are recorded too.
+"""
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+VIEWS_KEY = "query_stats:views"
+SQL_PREVIEW = 300
+TOP_DUPLICATES = 5
+# A shape repeated this often in one request is logged as a warning.
+REPEAT_WARNING = 5
+
+_IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_SPACE = re.compile(r"\s+")
+
+
+def fingerprint(sql: str) -> str:
+    """The statement's shape: literals and IN-list lengths removed."""
+    sql = _IN_LIST.sub("IN (...)", sql)
+    sql = _LITERAL.sub("?", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = (0.0, "")
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - t0
+            self.count += 1
+            self.seconds += elapsed
+            if elapsed > self.slowest[0]:
+                self.slowest = (elapsed, sql)
+            self.shapes[fingerprint(sql)] += 1
+
+    def duplicates(self) -> list[tuple[str, int]]:
+        return [(shape, n) for shape, n in self.shapes.most_common(TOP_DUPLICATES) if n > 1]
+
+    def summary(self, view: str) -> dict:
+        return {
+            "view": view,
+            "queries": self.count,
+            "db_ms": round(self.seconds * 1000, 3),
+            "slowest_ms": round(self.slowest[0] * 1000, 3),
+            "slowest_sql": self.slowest[1][:SQL_PREVIEW],
+            "duplicates": [{"sql": shape[:SQL_PREVIEW], "count": n} for shape, n in self.duplicates()],
+        }
+
+
+_current: ContextVar["QueryRecorder | None"] = ContextVar("query_stats_recorder", default=None)
+
+
+def _dispatch(execute, sql, params, many, context):
+    recorder = _current.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install(connection) -> None:
+    # First in the list: execute_wrapper() blocks pop the last entry on exit.
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _dispatch)
+
+
+def _view_key(view: str) -> str:
+    return f"query_stats:view:{view}"
+
+
+def record(summary: dict) -> None:
+    # Read-modify-write per view: concurrent workers can drop a sample, which
+    # sampled statistics tolerate.
+    view = summary["view"]
+    key = _view_key(view)
+    agg = cache.get(key) or {
+        "view": view, "samples": 0, "queries": 0, "db_ms": 0.0, "max_queries": 0, "max_db_ms": 0.0,
+        "slowest_ms": 0.0, "slowest_sql": "", "duplicates": {},
+    }
+    agg["samples"] += 1
+    agg["queries"] += summary["queries"]
+    agg["db_ms"] += summary["db_ms"]
+    agg["max_queries"] = max(agg["max_queries"], summary["queries"])
+    agg["max_db_ms"] = max(agg["max_db_ms"], summary["db_ms"])
+    if summary["slowest_ms"] > agg["slowest_ms"]:
+        agg["slowest_ms"], agg["slowest_sql"] = summary["slowest_ms"], summary["slowest_sql"]
+    for dup in summary["duplicates"]:
+        agg["duplicates"][dup["sql"]] = max(agg["duplicates"].get(dup["sql"], 0), dup["count"])
+    agg["duplicates"] = dict(Counter(agg["duplicates"]).most_common(TOP_DUPLICATES))
+    cache.set(key, agg, None)
+
+    views = cache.get(VIEWS_KEY) or []
+    if view not in views:
+        cache.set(VIEWS_KEY, [*views, view], None)
+
+
+def stats() -> list[dict]:
+    """Per-view aggregates with averages, busiest views first."""
+    views = cache.get(VIEWS_KEY) or []
+    found = cache.get_many([_view_key(v) for v in views])
+    rows = []
+    for agg in found.values():
+        rows.append({
+            **agg,
+            "avg_queries": agg["queries"] / agg["samples"],
+            "avg_db_ms": agg["db_ms"] / agg["samples"],
+        })
+    return sorted(rows, key=lambda r: r["db_ms"], reverse=True)
+
+
+def reset_stats() -> None:
+    views = cache.get(VIEWS_KEY) or []
+    cache.delete_many([VIEWS_KEY, *(_view_key(v) for v in views)])
+
+
+def _view_name(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match is not None else "<unresolved>"
+
+
+class QueryStatsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+        recorder = self._start()
+        token = _current.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, recorder)
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+        recorder = self._start()
+        token = _current.set(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, recorder)
+
+    def _sampled(self) -> bool:
+        rate = settings.QUERY_STATS_SAMPLE_RATE
+        return rate > 0 and (rate >= 1 or random.random() < rate)
+
+    def _start(self) -> QueryRecorder:
+        # Connections opened before the connection_created hook was connected
+        # are covered here, for this thread.
+        for alias in settings.DATABASES:
+            install(connections[alias])
+        return QueryRecorder()
+
+    def _finish(self, request, response, recorder):
+        summary = recorder.summary(_view_name(request))
+        summary["method"] = request.method
+        summary["status"] = response.status_code
+        try:
+            record(summary)
+        except Exception:
+            logger.exception("Could not record query stats for %s", summary["view"])
+        repeated = max((d["count"] for d in summary["duplicates"]), default=0)
+        level = logging.WARNING if repeated >= REPEAT_WARNING else logging.INFO
+        logger.log(level, json.dumps(summary))
+        if settings.QUERY_STATS_SERVER_TIMING:
+            desc = f"{summary['queries']} queries"
+            if summary["duplicates"]:
+                desc += f", {sum(d['count'] for d in summary['duplicates'])} repeated"
+            timing = f'db;dur={summary["db_ms"]:.1f};desc="{desc}"'
+            if response.has_header("Server-Timing"):
+                timing = f'{response["Server-Timing"]}, {timing}'
+            response["Server-Timing"] = timing
+        return response
@@ -0,0 +1,127 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.core.models import Language, Deck
+from apps.library.models import UserDeck
+from apps.study.models import StudySession
+
+# Cached values live under keys that embed a version number. Changes bump the
+# version after commit instead of deleting entries, so a reader racing a
+# writer can never re-cache old data under the new key.
+LANGUAGES_VERSION = "explore:languages:v"
+
+
+def _listing_version_key(language_id) -> str:
+    return f"explore:lang:{language_id}:v"
+
+
+def _badges_version_key(user_id) -> str:
+    return f"explore:user:{user_id}:v"
+
+
+def _new_version() -> int:
+    # Start from the clock so a version key lost to eviction never restarts
+    # at a number an older entry was stored under.
+    return time.time_ns() // 1000
+
+
+def _versions(keys) -> dict:
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _new_version(), None)
+            found[key] = cache.get(key)
+    return found
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), None)
+
+
+def bump_languages():
+    transaction.on_commit(lambda: _bump(LANGUAGES_VERSION))
+
+
+def bump_listing(language_id):
+    transaction.on_commit(lambda: _bump(_listing_version_key(language_id)))
+
+
+def bump_badges(user_id):
+    transaction.on_commit(lambda: _bump(_badges_version_key(user_id)))
+
+
+def public_listing() -> list[dict]:
+    """
+    Languages with their public decks as plain dicts.
+
+    Cached per language; a warm page costs four cache round trips and no
+    queries.
+    """
+    timeout = settings.EXPLORE_CACHE_TIMEOUT
+    version = _versions([LANGUAGES_VERSION])[LANGUAGES_VERSION]
+    languages_key = f"explore:languages:{version}"
+    languages = cache.get(languages_key)
+    if languages is None:
+        languages = list(Language.objects.order_by("name").values("id", "name", "code"))
+        cache.set(languages_key, languages, timeout)
+
+    versions = _versions([_listing_version_key(lang["id"]) for lang in languages])
+    keys = {lang["id"]: f"explore:lang:{lang['id']}:{versions[_listing_version_key(lang['id'])]}" for lang in languages}
+    cached = cache.get_many(keys.values())
+
+    missing = [lang_id for lang_id, key in keys.items() if key not in cached]
+    if missing:
+        fresh = {lang_id: [] for lang_id in missing}
+        decks = (
+            Deck.objects.filter(is_public=True, language_id__in=missing)
+            .order_by("title")
+            .values("id", "title", "card_count", "language_id")
+        )
+        for deck in decks:
+            fresh[deck.pop("language_id")].append(deck)
+        new_entries = {keys[lang_id]: entries for lang_id, entries in fresh.items()}
+        cache.set_many(new_entries, timeout)
+        cached.update(new_entries)
+
+    return [{**lang, "decks": cached[keys[lang["id"]]]} for lang in languages]
+
+
+def user_badges(user, deck_ids) -> dict[int, tuple[bool, bool, int]]:
+    """
+    ``{deck_id: (in_library, has_active_session, known_cards)}`` for ``user``.
+
+    Cached per user under the user's badge version, which library, session
+    and known-count changes bump. With CARD_INDEX_SIZE set, known counts are
+    read live from the bitmap index instead, which tracks its own changes.
+    """
+    from apps.library.services.counts import known_counts
+
+    live_known = bool(settings.CARD_INDEX_SIZE)
+    deck_ids = sorted(deck_ids)
+    version = _versions([_badges_version_key(user.id)])[_badges_version_key(user.id)]
+    digest = hashlib.md5(",".join(map(str, deck_ids)).encode()).hexdigest()
+    key = f"explore:badges:{user.id}:{version}:{int(live_known)}:{digest}"
+    badges = cache.get(key)
+    if badges is None:
+        in_library = set(UserDeck.objects.filter(user=user, deck_id__in=deck_ids).values_list("deck_id", flat=True))
+        active = set(
+            StudySession.objects.filter(user=user, deck_id__in=deck_ids, status="active")
+            .values_list("deck_id", flat=True)
+        )
+        known = {} if live_known else known_counts(user, deck_ids)
+        badges = {
+            deck_id: (deck_id in in_library, deck_id in active, known.get(deck_id, 0))
+            for deck_id in deck_ids
+        }
+        cache.set(key, badges, settings.EXPLORE_CACHE_TIMEOUT)
+    if live_known:
+        known = known_counts(user, deck_ids)
+        badges = {deck_id: (lib, act, known.get(deck_id, 0)) for deck_id, (lib, act, _) in badges.items()}
+    return badges
@@ -0,0 +1,147 @@
+"""
+A small roaring-style compressed bitmap of non-negative integer ids.
+
+Ids are split into a high key (id >> 16) and a 16-bit low part. Each key
+holds one container: a sorted uint16 array while it has at most ARRAY_MAX
+members, a 65536-bit bitmap (1024 uint64 words) above that. Card ids
+cluster by insertion order, so a deck or a user's history packs into a few
+dense containers and set operations run container by container in numpy.
+"""
+import numpy as np
+
+ARRAY_MAX = 4096
+WORDS = 1 << 10
+_LOW = 0xFFFF
+
+
+def _to_bitmap(low: np.ndarray) -> np.ndarray:
+    bits = np.zeros(1 << 16, dtype=bool)
+    bits[low] = True
+    return np.packbits(bits, bitorder="little").view("<u8").copy()
+
+
+def _to_array(words: np.ndarray) -> np.ndarray:
+    return np.flatnonzero(np.unpackbits(words.view(np.uint8), bitorder="little")).astype(np.uint16)
+
+
+def _is_bitmap(container: np.ndarray) -> bool:
+    return container.dtype != np.uint16
+
+
+def _cardinality(container: np.ndarray) -> int:
+    return int(np.bitwise_count(container).sum()) if _is_bitmap(container) else len(container)
+
+
+def _bits(words: np.ndarray, low: np.ndarray) -> np.ndarray:
+    low = low.astype(np.uint64)
+    return ((words[low >> np.uint64(6)] >> (low & np.uint64(63))) & np.uint64(1)).astype(bool)
+
+
+def _and(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Members of both containers, as an array container."""
+    if _is_bitmap(a) and _is_bitmap(b):
+        return _to_array(a & b)
+    if _is_bitmap(a):
+        a, b = b, a
+    if _is_bitmap(b):
+        return a[_bits(b, a)]
+    if len(a) > len(b):
+        a, b = b, a
+    idx = np.minimum(np.searchsorted(b, a), len(b) - 1)
+    return a[b[idx] == a]
+
+
+def _and_cardinality(a: np.ndarray, b: np.ndarray) -> int:
+    if _is_bitmap(a) and _is_bitmap(b):
+        return int(np.bitwise_count(a & b).sum())
+    return len(_and(a, b))
+
+
+def _compact(low: np.ndarray) -> np.ndarray:
+    return low if len(low) <= ARRAY_MAX else _to_bitmap(low)
+
+
+class RoaringBitmap:
+    __slots__ = ("_containers",)
+
+    def __init__(self, ids=()):
+        self._containers: dict[int, np.ndarray] = {}
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        if not len(ids):
+            return
+        high = ids >> 16
+        for chunk in np.split(ids, np.flatnonzero(np.diff(high)) + 1):
+            self._containers[int(chunk[0] >> 16)] = _compact((chunk & _LOW).astype(np.uint16))
+
+    def __len__(self) -> int:
+        return sum(_cardinality(c) for c in self._containers.values())
+
+    def __contains__(self, x: int) -> bool:
+        container = self._containers.get(x >> 16)
+        if container is None:
+            return False
+        low = x & _LOW
+        if _is_bitmap(container):
+            return bool(int(container[low >> 6]) >> (low & 63) & 1)
+        i = np.searchsorted(container, low)
+        return i < len(container) and container[i] == low
+
+    def add(self, x: int) -> None:
+        key, low = x >> 16, x & _LOW
+        container = self._containers.get(key)
+        if container is None:
+            self._containers[key] = np.array([low], dtype=np.uint16)
+        elif _is_bitmap(container):
+            container[low >> 6] |= np.uint64(1 << (low & 63))
+        else:
+            i = np.searchsorted(container, low)
+            if i == len(container) or container[i] != low:
+                self._containers[key] = _compact(np.insert(container, i, low))
+
+    def discard(self, x: int) -> None:
+        key, low = x >> 16, x & _LOW
+        container = self._containers.get(key)
+        if container is None:
+            return
+        if _is_bitmap(container):
+            container[low >> 6] &= ~np.uint64(1 << (low & 63))
+            if _cardinality(container) <= ARRAY_MAX:
+                container = self._containers[key] = _to_array(container)
+        else:
+            i = np.searchsorted(container, low)
+            if i < len(container) and container[i] == low:
+                container = self._containers[key] = np.delete(container, i)
+        if not len(container):
+            del self._containers[key]
+
+    def update(self, ids) -> None:
+        for x in ids:
+            self.add(int(x))
+
+    def difference_update(self, ids) -> None:
+        for x in ids:
+            self.discard(int(x))
+
+    def intersection_cardinality(self, other: "RoaringBitmap") -> int:
+        small, large = sorted((self._containers, other._containers), key=len)
+        return sum(_and_cardinality(c, large[k]) for k, c in small.items() if k in large)
+
+    def intersection(self, other: "RoaringBitmap") -> np.ndarray:
+        """Shared ids, ascending."""
+        parts = [
+            (np.int64(k) << 16) | _and(c, other._containers[k]).astype(np.int64)
+            for k, c in sorted(self._containers.items())
+            if k in other._containers
+        ]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def to_array(self) -> np.ndarray:
+        parts = [
+            (np.int64(k) << 16) | (_to_array(c) if _is_bitmap(c) else c).astype(np.int64)
+            for k, c in sorted(self._containers.items())
+        ]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(c.nbytes for c in self._containers.values())
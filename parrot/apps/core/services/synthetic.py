@@ -0,0 +1,204 @@
+from dataclasses import asdict, dataclass, replace
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.core.models import Language, Deck, Flashcard, DeckCard
+from apps.library.models import UserDeck
+from apps.study.models import CardProgress, ReviewLog
+from apps.study.services import due_index
+
+BATCH_SIZE = 5000
+# Progress and review rows (kept as tuples) are written once this many are pending.
+FLUSH_ROWS = 100_000
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    languages: int = 2
+    decks_per_language: int = 4
+    max_deck_size: int = 2000
+    # Exponent of the rank-size law: the k-th deck of a language has about
+    # max_deck_size / k**deck_zipf cards.
+    deck_zipf: float = 1.0
+    users: int = 20
+    decks_per_user: float = 3.0
+    history_days: int = 180
+    max_reviews_per_card: int = 8
+
+
+SIZES = {
+    "tiny": DatasetSpec(languages=1, decks_per_language=2, max_deck_size=200, users=3, history_days=30),
+    "small": DatasetSpec(),
+    "medium": DatasetSpec(languages=3, decks_per_language=6, max_deck_size=10000, users=100),
+    "large": DatasetSpec(languages=5, decks_per_language=10, max_deck_size=50000, users=300),
+}
+
+
+def spec_for(size: str, **overrides) -> DatasetSpec:
+    return replace(SIZES[size], **{k: v for k, v in overrides.items() if v is not None})
+
+
+def clear_dataset(prefix: str) -> None:
+    get_user_model().objects.filter(username__startswith=f"{prefix}user").delete()
+    Language.objects.filter(code__startswith=f"{prefix}l").delete()
+
+
+@transaction.atomic
+def generate_dataset(spec: DatasetSpec, seed: int = 0, prefix: str = "syn-", now=None) -> dict:
+    """
+    Bulk-create a reproducible dataset: languages, decks with Zipf-distributed
+    sizes drawn from a shared ranked vocabulary, and users whose libraries
+    carry CardProgress and ReviewLog histories.
+
+    The same spec and seed give the same rows (ids aside). Names start with
+    ``prefix`` so a dataset can be removed with clear_dataset. The DeckDue
+    index is rebuilt; counter caches (UserDeck counts, KnownCardCount) are
+    left to be built on demand.
+    """
+    rng = np.random.default_rng(seed)
+    now = now or timezone.now()
+
+    decks = []  # (deck, card ids in position order)
+    for li in range(spec.languages):
+        language = Language.objects.create(code=f"{prefix}l{li}", name=f"Synthetic {li}")
+        sizes = [max(1, int(spec.max_deck_size / (k ** spec.deck_zipf))) for k in range(1, spec.decks_per_language + 1)]
+        vocabulary = Flashcard.objects.bulk_create(
+            [
+                Flashcard(language=language, word=f"w{li}-{r}", translation=f"t{li}-{r}", frequency_rank=r)
+                for r in range(1, spec.max_deck_size + 1)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        card_ids = np.array([c.id for c in vocabulary])
+        # Smaller decks lean toward frequent words, as topic lists do.
+        weights = 1.0 / np.arange(1, len(card_ids) + 1) ** 0.5
+        weights /= weights.sum()
+        for k, size in enumerate(sizes):
+            if k == 0:
+                picked = np.arange(size)
+            else:
+                picked = np.sort(rng.choice(len(card_ids), size=size, replace=False, p=weights))
+            chosen = card_ids[picked]
+            deck = Deck.objects.create(
+                language=language,
+                title=f"Deck {k}",
+                is_public=True,
+                is_generated=k == 0,
+                card_count=size,
+            )
+            DeckCard.objects.bulk_create(
+                [
+                    DeckCard(deck=deck, card_id=int(cid), position=i, card_rank=int(r) + 1)
+                    for i, (cid, r) in enumerate(zip(chosen, picked), start=1)
+                ],
+                batch_size=BATCH_SIZE,
+            )
+            decks.append((deck, chosen))
+
+    users = get_user_model().objects.bulk_create(
+        [get_user_model()(username=f"{prefix}user{i}") for i in range(spec.users)],
+        batch_size=BATCH_SIZE,
+    )
+    # Popular decks are picked more often.
+    popularity = 1.0 / np.arange(1, len(decks) + 1)
+    popularity /= popularity.sum()
+
+    user_decks, progress, logs = [], [], []
+    totals = {"progress": 0, "reviews": 0}
+    for user in users:
+        n_decks = int(min(len(decks), max(1, rng.poisson(spec.decks_per_user))))
+        seen = set()
+        for di in rng.choice(len(decks), size=n_decks, replace=False, p=popularity):
+            deck, chosen = decks[di]
+            user_decks.append(UserDeck(user=user, deck=deck))
+            # Users work through a deck in order and most stop early.
+            studied = [int(c) for c in chosen[: int(len(chosen) * rng.beta(2, 5))] if int(c) not in seen]
+            seen.update(studied)
+            _history(rng, spec, user, deck, studied, now, progress, logs)
+        if len(progress) + len(logs) >= FLUSH_ROWS:
+            totals["progress"] += _flush(CardProgress, progress)
+            totals["reviews"] += _flush(ReviewLog, logs)
+
+    UserDeck.objects.bulk_create(user_decks, batch_size=BATCH_SIZE)
+    totals["progress"] += _flush(CardProgress, progress)
+    totals["reviews"] += _flush(ReviewLog, logs)
+    due_index.rebuild([user.id for user in users])
+
+    return {
+        "spec": asdict(spec),
+        "seed": seed,
+        "languages": spec.languages,
+        "decks": len(decks),
+        "cards": spec.languages * spec.max_deck_size,
+        "users": len(users),
+        "user_decks": len(user_decks),
+        **totals,
+    }
+
+
+PROGRESS_COLUMNS = [
+    "user", "card", "due_at", "last_reviewed_at", "ease", "interval_days", "repetitions", "lapses", "state",
+    "algorithm", "algo_state",
+]
+REVIEW_COLUMNS = ["user", "deck", "card", "quality", "reviewed_at"]
+
+
+def _flush(model, rows) -> int:
+    # Progress and review rows are the bulk of a dataset; plain executemany
+    # skips building model instances and loads several times faster.
+    if not rows:
+        return 0
+    fields = PROGRESS_COLUMNS if model is CardProgress else REVIEW_COLUMNS
+    qn = connection.ops.quote_name
+    columns = ", ".join(qn(model._meta.get_field(f).column) for f in fields)
+    sql = f"INSERT INTO {qn(model._meta.db_table)} ({columns}) VALUES ({', '.join(['%s'] * len(fields))})"
+    n = len(rows)
+    with connection.cursor() as cursor:
+        for start in range(0, n, BATCH_SIZE):
+            cursor.executemany(sql, rows[start:start + BATCH_SIZE])
+    rows.clear()
+    return n
+
+
+def _history(rng, spec, user, deck, card_ids, now, progress, logs):
+    n = len(card_ids)
+    if not n:
+        return
+    adapt = connection.ops.adapt_datetimefield_value
+    window = spec.history_days * 86400
+    reps = rng.integers(1, spec.max_reviews_per_card + 1, size=n)
+    lapses = rng.binomial(reps - 1, 0.15)
+    ease = np.clip(2.5 - 0.2 * lapses + rng.normal(0, 0.15, size=n), 1.3, 3.0)
+    interval = np.clip(np.round(ease ** (reps - lapses) * rng.uniform(0.7, 1.3, size=n)), 1, 3650).astype(int)
+    last_ago = rng.uniform(0, window, size=n)
+    # Learning a card takes roughly as long as its current interval.
+    first_ago = np.minimum(window, last_ago + interval * 86400 * rng.uniform(0.5, 1.5, size=n))
+
+    for i, card_id in enumerate(card_ids):
+        last = now - timedelta(seconds=float(last_ago[i]))
+        progress.append((
+            user.id,
+            card_id,
+            adapt(last + timedelta(days=int(interval[i]))),
+            adapt(last),
+            float(ease[i]),
+            int(interval[i]),
+            int(reps[i] - lapses[i]),
+            int(lapses[i]),
+            "review" if reps[i] - lapses[i] >= 2 else "learning",
+            "sm2",
+            "{}",
+        ))
+
+    # Each card's reviews are spread evenly from its first to its last review.
+    owner = np.repeat(np.arange(n), reps)
+    step = np.arange(len(owner)) - np.repeat(np.cumsum(reps) - reps, reps)
+    span = np.where(reps > 1, (first_ago - last_ago) / np.maximum(reps - 1, 1), 0.0)
+    ago = last_ago[owner] + span[owner] * (reps[owner] - 1 - step)
+    qualities = rng.choice((1, 3, 4, 5), size=len(owner), p=(0.15, 0.2, 0.5, 0.15))
+    for j, i in enumerate(owner):
+        logs.append((user.id, deck.id, card_ids[i], int(qualities[j]), adapt(now - timedelta(seconds=float(ago[j])))))
@@ -0,0 +1,45 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.core import query_stats
+from apps.core.models import UNRANKED, Deck, DeckCard, Language
+from apps.core.services.explore_cache import bump_languages, bump_listing
+
+
+@receiver(post_save, sender=Language)
+@receiver(post_delete, sender=Language)
+def language_changed(sender, instance, **kwargs):
+    bump_languages()
+
+
+@receiver(pre_save, sender=Deck)
+def deck_saving(sender, instance, update_fields=None, **kwargs):
+    # A deck moved to another language also leaves the old listing.
+    if instance._state.adding or (update_fields is not None and not {"language", "language_id"} & update_fields):
+        return
+    instance._previous_language_id = (
+        Deck.objects.filter(pk=instance.pk).values_list("language_id", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Deck)
+@receiver(post_delete, sender=Deck)
+def deck_changed(sender, instance, **kwargs):
+    bump_listing(instance.language_id)
+    previous = instance.__dict__.pop("_previous_language_id", None)
+    if previous is not None and previous != instance.language_id:
+        bump_listing(previous)
+
+
+# Bulk-created links get their rank from library.services.frontier.cards_added.
+@receiver(pre_save, sender=DeckCard)
+def deck_card_saving(sender, instance, **kwargs):
+    if instance._state.adding:
+        rank = instance.card.frequency_rank
+        instance.card_rank = UNRANKED if rank is None else rank
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    query_stats.install(connection)
@@ -1,3 +1,437 @@
-from django.test import TestCase
+import json
+import os
+import random
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, router
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.core.checks import per_process_caches
+from apps.core.db_router import PIN_COOKIE, ReplicaPinMiddleware, use_replica
+from apps.core.management.commands.generate_decks import read_manifest
+from apps.core.query_stats import QueryStatsMiddleware, fingerprint, stats
+from apps.core.models import Deck, DeckCard, Flashcard, Language
+from apps.core.services.roaring import RoaringBitmap
+from apps.core.services.synthetic import generate_dataset, spec_for
+from apps.library.models import KnownCardCount, UserDeck
+from apps.library.services.counts import (
+    COUNT_FIELDS,
+    apply_deck_cards_added,
+    apply_reviews,
+    compute_counts,
+)
+from apps.study.models import CardProgress, ReviewLog
+
+
+class GenerateTopDeckTests(TestCase):
+    def _load(self, text, *args):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", encoding="utf-8", delete=False) as f:
+            f.write(text)
+        self.addCleanup(os.unlink, f.name)
+        out = StringIO()
+        call_command("generate_top_deck", "--lang", "cs", "--title", "Top", "--csv", f.name, *args, stdout=out)
+        return out.getvalue()
+
+    def _positions(self):
+        return list(DeckCard.objects.order_by("position").values_list("card__word", "position"))
+
+    def test_bulk_load_update_and_prune(self):
+        self._load("rank,word,translation\n1,pes,dog\n2,kočka,cat\n3,dům,house\n")
+        deck = Deck.objects.get(title="Top")
+        user = get_user_model().objects.create(username="u")
+        ud = UserDeck.objects.create(user=user, deck=deck)
+        UserDeck.objects.bulk_update(compute_counts([ud], timezone.now()), COUNT_FIELDS)
+
+        out = self._load("rank,word,translation\n1,kočka,kitty\n2,pes,\n4,strom,tree\n", "--prune", "--dry-run")
+        self.assertIn("~ kočka: translation 'cat' -> 'kitty'", out)
+        self.assertIn("- dům", out)
+        self.assertEqual(self._positions(), [("pes", 1), ("kočka", 2), ("dům", 3)])
+
+        self._load("rank,word,translation\n1,kočka,kitty\n2,pes,\n4,strom,tree\n", "--prune", "--batch-size", "2")
+        self.assertEqual(self._positions(), [("kočka", 1), ("pes", 2), ("strom", 4)])
+        self.assertEqual(Flashcard.objects.get(word="kočka").translation, "kitty")
+        self.assertEqual(Flashcard.objects.get(word="pes").translation, "dog")
+        self.assertTrue(Flashcard.objects.filter(word="dům").exists())
+
+        ud.refresh_from_db()
+        self.assertEqual((ud.cached_new_count, ud.cached_total_in_deck), (3, 3))
+
+
+class GenerateDecksTests(TestCase):
+    def test_failed_language_does_not_roll_back_others(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = tmp.name
+        files = {
+            "cs.csv": "rank,word\n1,pes\n2,kočka\n",
+            "de.csv": "rank,wort\n1,Hund\n",
+            "manifest.json": json.dumps([
+                {"lang": "cs", "title": "Top", "csv": "cs.csv", "name": "Czech"},
+                {"lang": "de", "title": "Top", "csv": "de.csv"},
+            ]),
+        }
+        for name, text in files.items():
+            with open(os.path.join(root, name), "w", encoding="utf-8") as f:
+                f.write(text)
+
+        out, err = StringIO(), StringIO()
+        with self.assertRaisesMessage(CommandError, "1 of 2 language(s) failed"):
+            call_command("generate_decks", os.path.join(root, "manifest.json"), stdout=out, stderr=err)
+
+        self.assertIn("de 'Top'", err.getvalue())
+        self.assertEqual(
+            list(DeckCard.objects.filter(deck__language__code="cs").values_list("card__word", flat=True)),
+            ["pes", "kočka"],
+        )
+        self.assertFalse(Deck.objects.filter(language__code="de").exists())
+
+    def test_manifest_rejects_bad_n_and_repeated_languages(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        manifest = Path(tmp.name) / "manifest.json"
+        cases = [
+            ([{"lang": "cs", "csv": "cs.csv", "n": "ten"}], "Manifest entry 1 needs a positive integer 'n'"),
+            ([{"lang": "cs", "csv": "cs.csv", "n": 0}], "Manifest entry 1 needs a positive integer 'n'"),
+            ([{"lang": "cs", "csv": "cs.csv", "n": 2.5}], "Manifest entry 1 needs a positive integer 'n'"),
+            (
+                [{"lang": "cs", "csv": "cs.csv"}, {"lang": "cs", "title": "Other", "csv": "cs2.csv"}],
+                "Manifest entry 2 repeats lang 'cs' from entry 1.",
+            ),
+        ]
+        for entries, message in cases:
+            manifest.write_text(json.dumps(entries), encoding="utf-8")
+            with self.subTest(entries=entries), self.assertRaisesMessage(CommandError, message):
+                read_manifest(manifest, "Top", 1000)
+
+        manifest.write_text(json.dumps([{"lang": "cs", "csv": "cs.csv", "n": "20"}]), encoding="utf-8")
+        self.assertEqual(read_manifest(manifest, "Top", 1000)[0]["n"], 20)
+
+
+@override_settings(CARD_INDEX_SIZE=0)
+class ExploreCountsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create(username="u")
+        self.language = Language.objects.create(code="cs", name="Czech")
+        self.decks = [Deck.objects.create(language=self.language, title=f"D{i}", is_public=True) for i in range(2)]
+        self.cards = Flashcard.objects.bulk_create(Flashcard(language=self.language, word=f"w{i}") for i in range(6))
+        for deck in self.decks:
+            DeckCard.objects.bulk_create(DeckCard(deck=deck, card=c, position=i) for i, c in enumerate(self.cards[:4]))
+            apply_deck_cards_added(deck, [c.id for c in self.cards[:4]])
+        self.client.force_login(self.user)
+
+    def _explore(self):
+        resp = self.client.get(reverse("explore"))
+        return {d["title"]: (d["known_cards"], d["card_count"]) for lang in resp.context["languages"] for d in lang["decks"]}
+
+    def _grade(self, card):
+        now = timezone.now()
+        CardProgress.objects.create(user=self.user, card=card, due_at=now + timedelta(days=1))
+        apply_reviews(self.user, [(card.id, None, now + timedelta(days=1))], now=now)
+
+    def test_counters_follow_grading_and_deck_changes(self):
+        self._grade(self.cards[0])
+        self.assertEqual(self._explore(), {"D0": (1, 4), "D1": (1, 4)})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._grade(self.cards[1])
+            self._grade(self.cards[5])
+            DeckCard.objects.create(deck=self.decks[0], card=self.cards[5], position=9)
+            DeckCard.objects.filter(deck=self.decks[1], card=self.cards[0]).delete()
+
+        self.assertEqual(self._explore(), {"D0": (3, 5), "D1": (1, 3)})
+
+    def test_query_count_does_not_grow_with_decks(self):
+        # Measured cold (cache cleared) so the database work is what counts.
+        self._explore()
+        cache.clear()
+        with CaptureQueriesContext(connection) as small:
+            self._explore()
+
+        more = Flashcard.objects.bulk_create(Flashcard(language=self.language, word=f"x{i}") for i in range(200))
+        DeckCard.objects.bulk_create(DeckCard(deck=self.decks[0], card=c, position=10 + i) for i, c in enumerate(more))
+        for card in more[:50]:
+            CardProgress.objects.create(user=self.user, card=card, due_at=timezone.now())
+        cache.clear()
+        with CaptureQueriesContext(connection) as large:
+            self._explore()
+
+        self.assertEqual(len(small), len(large))
+        self.assertFalse(any("COUNT(" in q["sql"].upper() for q in large.captured_queries))
+
+
+@override_settings(CARD_INDEX_SIZE=2048)
+class ExploreCountsWithCardIndexTests(ExploreCountsTests):
+    def test_known_card_rows_are_maintained_for_switching_the_index_off(self):
+        row = KnownCardCount.objects.create(user=self.user, deck=self.decks[0], known=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self._grade(self.cards[0])
+
+        row.refresh_from_db()
+        self.assertEqual(row.known, 1)
+        self.assertEqual(self._explore(), {"D0": (1, 4), "D1": (1, 4)})
+        with override_settings(CARD_INDEX_SIZE=0):
+            self.assertEqual(self._explore(), {"D0": (1, 4), "D1": (1, 4)})
+
+    def test_per_process_cache_is_reported(self):
+        self.assertEqual([e.id for e in per_process_caches(None)], ["core.W001"])
+
+
+class RoaringBitmapTests(SimpleTestCase):
+    def test_matches_set_semantics_across_container_kinds(self):
+        rng = random.Random(0)
+        for size, span in [(0, 10), (50, 1000), (5000, 70000), (30000, 300000)]:
+            a = {rng.randrange(span) for _ in range(size)}
+            b = {rng.randrange(span) for _ in range(6000)}
+            left, right = RoaringBitmap(list(a)), RoaringBitmap(list(b))
+            for _ in range(200):
+                x = rng.randrange(span)
+                if rng.random() < 0.5:
+                    left.add(x)
+                    a.add(x)
+                else:
+                    left.discard(x)
+                    a.discard(x)
+                self.assertEqual(x in left, x in a)
+
+            self.assertEqual(len(left), len(a))
+            self.assertEqual(left.to_array().tolist(), sorted(a))
+            self.assertEqual(left.intersection_cardinality(right), len(a & b))
+            self.assertEqual(left.intersection(right).tolist(), sorted(a & b))
+
+
+class ExploreCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.language = Language.objects.create(code="cs", name="Czech")
+        self.deck = Deck.objects.create(language=self.language, title="Top", is_public=True)
+
+    def _titles(self, client=None):
+        resp = (client or self.client).get(reverse("explore"))
+        return [(d["title"], d["card_count"]) for lang in resp.context["languages"] for d in lang["decks"]]
+
+    def test_anonymous_listing_is_cached_until_a_version_bump(self):
+        self.assertEqual(self._titles(), [("Top", 0)])
+        with self.assertNumQueries(0):
+            self._titles()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Deck.objects.create(language=self.language, title="Basics", is_public=True)
+        self.assertEqual(self._titles(), [("Basics", 0), ("Top", 0)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.is_public = False
+            other.save()
+            card = Flashcard.objects.create(language=self.language, word="pes")
+            DeckCard.objects.create(deck=self.deck, card=card, position=1)
+        self.assertEqual(self._titles(), [("Top", 1)])
+
+    def test_moving_a_deck_refreshes_both_languages(self):
+        german = Language.objects.create(code="de", name="German")
+        Deck.objects.create(language=german, title="Basics", is_public=True)
+        self.assertEqual(sorted(self._titles()), [("Basics", 0), ("Top", 0)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.deck.language = german
+            self.deck.save()
+        resp = self.client.get(reverse("explore"))
+        listing = {lang["code"]: [d["title"] for d in lang["decks"]] for lang in resp.context["languages"]}
+        self.assertNotIn("Top", listing.get("cs", []))
+        self.assertEqual(sorted(listing["de"]), ["Basics", "Top"])
+
+    def test_badges_are_per_user(self):
+        user = get_user_model().objects.create(username="u")
+        self.client.force_login(user)
+        self.client.get(reverse("explore"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UserDeck.objects.create(user=user, deck=self.deck)
+        resp = self.client.get(reverse("explore"))
+        self.assertTrue(resp.context["languages"][0]["decks"][0]["in_library"])
+
+        self.client.logout()
+        resp = self.client.get(reverse("explore"))
+        self.assertNotIn("in_library", resp.context["languages"][0]["decks"][0])
+
+
+class SyntheticDataTests(TestCase):
+    def _shape(self, prefix):
+        return (
+            list(Deck.objects.filter(language__code__startswith=prefix).order_by("language__code", "title").values_list("card_count", flat=True)),
+            list(
+                UserDeck.objects.filter(user__username__startswith=prefix)
+                .order_by("user__username", "deck__title").values_list("deck__title", flat=True)
+            ),
+            CardProgress.objects.filter(user__username__startswith=prefix).count(),
+            ReviewLog.objects.filter(user__username__startswith=prefix).count(),
+        )
+
+    def test_same_seed_same_dataset(self):
+        spec = spec_for("tiny")
+        a = generate_dataset(spec, seed=7, prefix="a-")
+        b = generate_dataset(spec, seed=7, prefix="b-")
+
+        self.assertEqual(self._shape("a-"), self._shape("b-"))
+        self.assertEqual(a["progress"], self._shape("a-")[2])
+        self.assertEqual(a["reviews"], self._shape("a-")[3])
+        self.assertEqual(self._shape("a-")[0], [200, 100])
+        self.assertNotEqual(generate_dataset(spec, seed=8, prefix="c-")["reviews"], b["reviews"])
+
+    def test_benchmarks_write_json_and_roll_back(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.json")
+            call_command(
+                "run_benchmarks", "--sizes", "tiny", "--only", "select_session_queue,library,csv_export",
+                "--repeat", "2", "--output", path, stdout=StringIO(),
+            )
+            with open(path, encoding="utf-8") as f:
+                report = json.load(f)
+
+        self.assertEqual([r["name"] for r in report["results"]], ["select_session_queue", "library", "csv_export"])
+        self.assertIn("median_ms", report["results"][0])
+        self.assertFalse(Language.objects.exists())
+
+
+@override_settings(DATABASE_REPLICAS=["replica_0"])
+class ReplicaRouterTests(SimpleTestCase):
+    # Only routing decisions are checked, so no replica database is needed.
+    def _call(self, view, method="get", cookies=None):
+        request = getattr(RequestFactory(), method)("/")
+        request.COOKIES.update(cookies or {})
+        return ReplicaPinMiddleware(view)(request)
+
+    def _reader(self, write=False):
+        seen = []
+
+        @use_replica
+        def view(request):
+            if write:
+                router.db_for_write(Deck)
+            seen.append(router.db_for_read(Deck))
+            return HttpResponse()
+
+        return view, seen
+
+    def test_safe_reads_go_to_replica(self):
+        view, seen = self._reader()
+
+        response = self._call(view)
+
+        self.assertEqual(seen, ["replica_0"])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_unsafe_request_reads_primary_and_pins(self):
+        view, seen = self._reader()
+
+        response = self._call(view, method="post")
+
+        self.assertEqual(seen, ["default"])
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_pinned_client_reads_primary(self):
+        view, seen = self._reader()
+
+        self._call(view, cookies={PIN_COOKIE: "1"})
+
+        self.assertEqual(seen, ["default"])
+
+    def test_write_pins_rest_of_request(self):
+        view, seen = self._reader(write=True)
+
+        response = self._call(view)
+
+        self.assertEqual(seen, ["default"])
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_undecorated_view_reads_primary(self):
+        seen = []
+
+        def view(request):
+            seen.append(router.db_for_read(Deck))
+            return HttpResponse()
+
+        self._call(view)
+
+        self.assertEqual(seen, ["default"])
+
+    def test_streamed_body_reads_replica(self):
+        seen = []
+
+        def chunks():
+            seen.append(router.db_for_read(Deck))
+            yield b"x"
+
+        response = self._call(use_replica(lambda request: StreamingHttpResponse(chunks())))
+        b"".join(response.streaming_content)
+
+        self.assertEqual(seen, ["replica_0"])
+
+
+@override_settings(QUERY_STATS_SAMPLE_RATE=1.0, QUERY_STATS_SERVER_TIMING=True)
+class QueryStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create(username="u")
+
+    def test_fingerprint_ignores_literals_and_in_list_length(self):
+        self.assertEqual(
+            fingerprint('SELECT "a" FROM t WHERE id IN (%s, %s, %s) AND n = 3'),
+            fingerprint('SELECT "a" FROM t\n WHERE id IN (%s) AND n = 4'),
+        )
+
+    def test_request_gets_server_timing_and_per_view_totals(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get("/library/")
+        self.client.get("/library/")
+
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries')
+        row = next(r for r in stats() if r["view"] == "library")
+        self.assertEqual(row["samples"], 2)
+        self.assertGreater(row["avg_queries"], 0)
+
+    def test_repeated_shapes_are_reported(self):
+        def view(request):
+            for i in range(3):
+                Deck.objects.filter(id=i).exists()
+            return HttpResponse()
+
+        with self.assertLogs("apps.core.query_stats", "INFO") as logs:
+            QueryStatsMiddleware(view)(RequestFactory().get("/"))
+
+        logged = json.loads(logs.records[0].getMessage())
+        self.assertEqual(logged["queries"], 3)
+        self.assertEqual([d["count"] for d in logged["duplicates"]], [3])
+        self.assertEqual(list(stats()[0]["duplicates"].values()), [3])
+
+    def test_async_views_record_queries_from_worker_threads(self):
+        async def view(request):
+            # A fresh worker thread, so the queries use a connection the
+            # event loop thread never touched.
+            await sync_to_async(lambda: [Deck.objects.filter(id=i).exists() for i in range(2)], thread_sensitive=False)()
+            return HttpResponse()
+
+        with self.assertLogs("apps.core.query_stats", "INFO") as logs:
+            response = async_to_sync(QueryStatsMiddleware(view))(RequestFactory().get("/"))
+
+        self.assertEqual(json.loads(logs.records[0].getMessage())["queries"], 2)
+        self.assertIn('desc="2 queries', response["Server-Timing"])
+
+    def test_endpoint_is_staff_only(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get("/ops/query-stats/").status_code, 302)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.assertIn("views", self.client.get("/ops/query-stats/").json())
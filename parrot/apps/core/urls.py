@@ -3,4 +3,5 @@ from . import views
 
 urlpatterns = [
     path("", views.explore, name="explore"),
+    path("ops/query-stats/", views.query_stats, name="query_stats"),
 ]
\ No newline at end of file
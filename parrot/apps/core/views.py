@@ -1,42 +1,37 @@
-from django.db.models import Prefetch, Q, Count, Exists, OuterRef
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
-from apps.core.models import Language, Deck
-from apps.library.models import UserDeck
-from apps.study.models import StudySession
+from apps.core.query_stats import stats
+from apps.core.services.explore_cache import public_listing, user_badges
+from apps.library.services import card_index
+from apps.study.services import card_cache
 
 
 def explore(request):
-    decks_qs = Deck.objects.filter(is_public=True).order_by("title")
+    # Public listings are shared by every visitor; only the per-deck badges
+    # depend on the user, and they are cached separately.
+    languages = public_listing()
 
     if request.user.is_authenticated:
-        decks_qs = decks_qs.annotate(
-            total_cards=Count("deck_cards", distinct=True),
-            known_cards=Count(
-                "deck_cards__card__progress",
-                filter=Q(deck_cards__card__progress__user=request.user),
-                distinct=True,
-            ),
-            in_library=Exists(
-                UserDeck.objects.filter(
-                    user=request.user,
-                    deck=OuterRef("pk"),
-                )
-            ),
-            has_active_session=Exists(
-                StudySession.objects.filter(
-                    user=request.user,
-                    deck=OuterRef("pk"),
-                    status="active",
-                )
-            ),
-        )
-    else:
-        decks_qs = decks_qs.annotate(
-            total_cards=Count("deck_cards", distinct=True),
-        )
-
-    languages = Language.objects.all().prefetch_related(
-        Prefetch("decks", queryset=decks_qs)
-    ).order_by("name")
+        badges = user_badges(request.user, [deck["id"] for lang in languages for deck in lang["decks"]])
+        languages = [
+            {
+                **lang,
+                "decks": [
+                    dict(zip(("in_library", "has_active_session", "known_cards"), badges[deck["id"]]), **deck)
+                    for deck in lang["decks"]
+                ],
+            }
+            for lang in languages
+        ]
 
     return render(request, "core/explore.html", {"languages": languages})
+
+
+@staff_member_required
+def query_stats(request):
+    # Cache counters are per process: they describe the worker that answered.
+    return JsonResponse({
+        "views": stats(),
+        "process": {"card_cache": card_cache.stats(), "card_index": card_index.stats()},
+    })
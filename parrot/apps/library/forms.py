@@ -1,12 +1,20 @@
 from django import forms
 from apps.library.models import UserDeck
 from apps.core.models import Deck, Flashcard
+from apps.study.services.algorithms import SCHEDULERS
 
 
 class UserDeckSettingsForm(forms.ModelForm):
     class Meta:
         model = UserDeck
-        fields = ["is_active", "daily_new_limit", "chunk_size", "new_ratio"]
+        fields = ["is_active", "daily_new_limit", "chunk_size", "new_ratio", "algorithm"]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["algorithm"] = forms.ChoiceField(
+            choices=[(name, name.upper()) for name in sorted(SCHEDULERS)],
+            help_text="Scheduler for cards you review for the first time from this deck.",
+        )
 
     def clean_daily_new_limit(self):
         v = self.cleaned_data["daily_new_limit"]
@@ -0,0 +1,102 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef
+
+from apps.core.models import Deck, DeckCard
+from apps.core.services.synthetic import SIZES, generate_dataset, spec_for
+from apps.library.models import UserDeck
+from apps.library.services import card_index
+from apps.study.models import CardProgress
+
+PREFIX = "bench-index-"
+
+
+def _orm_known_counts(user_id, deck_ids):
+    return dict(
+        CardProgress.objects
+        .filter(user_id=user_id, card__deck_cards__deck_id__in=deck_ids)
+        .values(deck_id=F("card__deck_cards__deck_id"))
+        .annotate(n=Count("id"))
+        .values_list("deck_id", "n")
+    )
+
+
+def _orm_new_counts(user_id, deck_ids):
+    return dict(
+        DeckCard.objects
+        .filter(deck_id__in=deck_ids)
+        .filter(~Exists(CardProgress.objects.filter(user_id=user_id, card_id=OuterRef("card_id"))))
+        .values("deck_id")
+        .annotate(n=Count("id"))
+        .values_list("deck_id", "n")
+    )
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compare known/new-card counts from the bitmap card index with the equivalent ORM queries."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", choices=sorted(SIZES), default="small", help="Synthetic dataset preset (default small)")
+        parser.add_argument("--users", type=int, default=10, help="Users to measure (default 10)")
+        parser.add_argument("--repeat", type=int, default=20, help="Timed runs per user (default 20)")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **opts):
+        if opts["repeat"] < 1:
+            raise CommandError("--repeat must be at least 1.")
+        if not settings.CARD_INDEX_SIZE:
+            raise CommandError("The card index is off; run with CARD_INDEX_SIZE set (e.g. CARD_INDEX_SIZE=2048).")
+        try:
+            with transaction.atomic():
+                self._run(opts)
+                raise _Rollback
+        except _Rollback:
+            pass
+        card_index.clear()
+
+    def _run(self, opts):
+        summary = generate_dataset(spec_for(opts["size"]), seed=opts["seed"], prefix=PREFIX)
+        self.stdout.write(f"[{opts['size']}] {summary['cards']} cards, {summary['progress']} progress rows")
+
+        user_ids = list(
+            UserDeck.objects.filter(user__username__startswith=PREFIX)
+            .values_list("user_id", flat=True).distinct().order_by("user_id")[:opts["users"]]
+        )
+        deck_ids = list(Deck.objects.filter(language__code__startswith=PREFIX).values_list("id", flat=True))
+
+        timings = {"orm known": [], "orm new": [], "index cold": [], "index warm": [], "index new": []}
+        for user_id in user_ids:
+            card_index.clear()
+            t0 = time.perf_counter()
+            card_index.known_counts(user_id, deck_ids)
+            timings["index cold"].append((time.perf_counter() - t0) * 1e6)
+
+            expected = _orm_known_counts(user_id, deck_ids)
+            got = card_index.known_counts(user_id, deck_ids)
+            if {k: v for k, v in got.items() if v} != expected:
+                raise CommandError(f"Index and ORM disagree for user {user_id}.")
+
+            for label, fn in [
+                ("orm known", _orm_known_counts),
+                ("orm new", _orm_new_counts),
+                ("index warm", card_index.known_counts),
+                ("index new", card_index.new_counts),
+            ]:
+                for _ in range(opts["repeat"]):
+                    t0 = time.perf_counter()
+                    fn(user_id, deck_ids)
+                    timings[label].append((time.perf_counter() - t0) * 1e6)
+
+        self.stdout.write(f"{len(user_ids)} users x {len(deck_ids)} decks, median per call:")
+        for label, samples in timings.items():
+            self.stdout.write(f"  {label:<11} {statistics.median(samples):>11.1f} us")
+        stats = card_index.stats()
+        self.stdout.write(self.style.SUCCESS(f"Done ({stats['entries']} bitmaps, {stats['bytes'] / 1024:.0f} KiB)."))
@@ -0,0 +1,125 @@
+import csv
+import gc
+import io
+import os
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.core.models import Language, Deck, Flashcard, DeckCard
+from apps.library.services.csv_io import gzip_stream, iter_deck_csv
+
+
+def _legacy_export(deck):
+    output = io.StringIO(newline="")
+    writer = csv.writer(output)
+    writer.writerow(["rank", "word", "translation", "context"])
+    for dc in DeckCard.objects.filter(deck=deck).select_related("card").order_by("position", "id"):
+        c = dc.card
+        writer.writerow([dc.position, c.word, c.translation, c.context_sentence])
+    yield output.getvalue().encode("utf-8")
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+class _PeakRSS:
+    # ru_maxrss cannot be reset between runs, so sample the current RSS instead.
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.peak = self.base = _rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, _rss_bytes())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        if self.base is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self.base is not None:
+            self._thread.join()
+            self.peak = max(self.peak, _rss_bytes())
+
+    @property
+    def growth_mib(self):
+        return None if self.base is None else (self.peak - self.base) / 2**20
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark deck CSV export: time to first byte, total time, size and peak RSS growth."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cards", type=int, default=100000, help="Cards in the exported deck (default 100000)")
+        parser.add_argument("--legacy", action="store_true", help="Also time the previous build-in-memory export")
+
+    def handle(self, *args, **opts):
+        try:
+            with transaction.atomic():
+                self._run(opts["cards"], opts["legacy"])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, n, legacy):
+        language = Language.objects.create(code="bench-export", name="Bench")
+        deck = Deck.objects.create(language=language, title="Export")
+        cards = Flashcard.objects.bulk_create(
+            [
+                Flashcard(
+                    language=language,
+                    word=f"word{i}",
+                    translation=f"translation {i}",
+                    context_sentence=f"A reasonably long example sentence using word{i}, with a comma.",
+                )
+                for i in range(n)
+            ],
+            batch_size=2000,
+        )
+        DeckCard.objects.bulk_create(
+            [DeckCard(deck=deck, card=c, position=i) for i, c in enumerate(cards, start=1)],
+            batch_size=2000,
+        )
+        del cards
+
+        modes = [
+            ("stream", lambda: iter_deck_csv(deck)),
+            ("stream+gzip", lambda: gzip_stream(iter_deck_csv(deck))),
+        ]
+        if legacy:
+            modes.append(("legacy", lambda: _legacy_export(deck)))
+
+        self.stdout.write(f"{'mode':<12} {'ttfb ms':>9} {'total ms':>9} {'MiB out':>8} {'peak RSS +MiB':>14}")
+        for name, make in modes:
+            gc.collect()
+            with _PeakRSS() as rss:
+                t0 = time.perf_counter()
+                ttfb = None
+                size = 0
+                for piece in make():
+                    if ttfb is None:
+                        ttfb = time.perf_counter() - t0
+                    size += len(piece)
+                total = time.perf_counter() - t0
+            growth = "n/a" if rss.growth_mib is None else f"{rss.growth_mib:.1f}"
+            self.stdout.write(
+                f"{name:<12} {ttfb * 1000:>9.1f} {total * 1000:>9.1f} {size / 2**20:>8.2f} {growth:>14}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Done ({n} cards)."))
@@ -0,0 +1,89 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from apps.core.models import Language, Deck, Flashcard, DeckCard
+from apps.library.services.csv_io import ParsedRow, import_rows_into_deck
+
+
+def _legacy_import_rows_into_deck(*, deck, user, rows):
+    existing_words = set(Flashcard.objects.filter(deck_cards__deck=deck).values_list("word", flat=True))
+    next_pos = (DeckCard.objects.filter(deck=deck).aggregate(m=Max("position"))["m"] or 0) + 1
+    for r in rows:
+        if r.word in existing_words:
+            continue
+        card = Flashcard.objects.create(
+            language=deck.language,
+            word=r.word,
+            translation=r.translation,
+            context_sentence=r.context,
+            frequency_rank=r.rank,
+            created_by=user,
+        )
+        DeckCard.objects.create(deck=deck, card=card, position=next_pos)
+        next_pos += 1
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark CSV import throughput (rows/sec) for import_rows_into_deck."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", default="1000,5000,20000", help="Comma-separated row counts (default 1000,5000,20000)")
+        parser.add_argument(
+            "--shared",
+            type=float,
+            default=0.2,
+            help="Fraction of words that already exist in another deck of the language (default 0.2)",
+        )
+        parser.add_argument("--legacy", action="store_true", help="Also time the previous row-by-row import")
+
+    def handle(self, *args, **opts):
+        try:
+            steps = sorted({int(s) for s in opts["rows"].split(",") if s.strip()})
+        except ValueError:
+            raise CommandError("--rows must be a comma-separated list of integers.")
+        if not 0 <= opts["shared"] <= 1:
+            raise CommandError("--shared must be between 0 and 1.")
+
+        for n in steps:
+            line = f"rows={n:>7}  bulk: {self._measure(import_rows_into_deck, n, opts['shared']):>9.0f} rows/s"
+            if opts["legacy"]:
+                # The old path crashes on words shared with another deck, so it
+                # only ever sees fresh words.
+                line += f"  legacy (fresh words only): {self._measure(_legacy_import_rows_into_deck, n, 0):>9.0f} rows/s"
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS("Done."))
+
+    def _measure(self, fn, n, shared):
+        try:
+            with transaction.atomic():
+                language = Language.objects.create(code="bench-import", name="Bench")
+                user = get_user_model().objects.create(username="bench-import-user")
+                deck = Deck.objects.create(language=language, title="Import target", created_by=user)
+                other = Deck.objects.create(language=language, title="Other")
+
+                n_shared = int(n * shared)
+                cards = Flashcard.objects.bulk_create(
+                    [Flashcard(language=language, word=f"w{i}") for i in range(n_shared)],
+                    batch_size=2000,
+                )
+                DeckCard.objects.bulk_create(
+                    [DeckCard(deck=other, card=c, position=i) for i, c in enumerate(cards)],
+                    batch_size=2000,
+                )
+                rows = [ParsedRow(rank=i, word=f"w{i}", translation=f"t{i}", context="") for i in range(n)]
+
+                t0 = time.perf_counter()
+                fn(deck=deck, user=user, rows=rows)
+                elapsed = time.perf_counter() - t0
+                raise _Rollback
+        except _Rollback:
+            pass
+        return n / elapsed
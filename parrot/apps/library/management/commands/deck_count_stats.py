@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.library.services.freshness import metrics, reset_metrics
+
+
+class Command(BaseCommand):
+    help = "Show hit/stale/miss rates of UserDeck cached counts as served by the library page."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Zero the counters after printing")
+
+    def handle(self, *args, **opts):
+        m = metrics()
+        self.stdout.write(f"{'kind':<6} {'count':>10} {'rate':>7}")
+        for kind in ("hit", "stale", "miss"):
+            self.stdout.write(f"{kind:<6} {m[kind]:>10} {m[kind + '_rate']:>7.1%}")
+        self.stdout.write(f"{'total':<6} {m['total']:>10}")
+        if opts["reset"]:
+            reset_metrics()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.library.models import UserDeck
+from apps.library.services.counts import COUNT_FIELDS, compute_counts, roll_forward
+
+
+def _snapshot(ud):
+    return (ud.cached_due_count, ud.cached_new_count, ud.cached_total_in_deck, dict(ud.due_histogram))
+
+
+class Command(BaseCommand):
+    help = "Verify UserDeck due/new/total counters against real counts and repair drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, help="Only check this user id")
+        parser.add_argument("--deck", type=int, help="Only check this deck id")
+        parser.add_argument("--batch-size", type=int, default=200, help="UserDecks per batch (default 200)")
+        parser.add_argument("--dry-run", action="store_true", help="Report drift without writing")
+
+    def handle(self, *args, **opts):
+        qs = UserDeck.objects.filter(cached_at__isnull=False).order_by("id")
+        if opts["user"]:
+            qs = qs.filter(user_id=opts["user"])
+        if opts["deck"]:
+            qs = qs.filter(deck_id=opts["deck"])
+
+        batch_size: int = opts["batch_size"]
+        dry_run: bool = opts["dry_run"]
+        checked = drifted = 0
+        last_id = 0
+
+        while True:
+            with transaction.atomic():
+                batch = list(qs.select_for_update().filter(id__gt=last_id)[:batch_size])
+                if not batch:
+                    break
+                last_id = batch[-1].id
+
+                now = timezone.now()
+                before = {}
+                for ud in batch:
+                    roll_forward(ud, now)
+                    before[ud.id] = _snapshot(ud)
+                compute_counts(batch, now)
+
+                bad = [ud for ud in batch if _snapshot(ud) != before[ud.id]]
+                if opts["verbosity"] >= 2:
+                    for ud in bad:
+                        due, new, total, _ = before[ud.id]
+                        self.stdout.write(self.style.WARNING(
+                            f"UserDeck {ud.id} (user {ud.user_id}, deck {ud.deck_id}): "
+                            f"due {due}->{ud.cached_due_count}, new {new}->{ud.cached_new_count}, "
+                            f"total {total}->{ud.cached_total_in_deck}"
+                        ))
+                if bad and not dry_run:
+                    UserDeck.objects.bulk_update(bad, COUNT_FIELDS, batch_size=500)
+
+            checked += len(batch)
+            drifted += len(bad)
+
+        verb = "found" if dry_run else "repaired"
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} UserDecks, {verb} drift in {drifted}."))
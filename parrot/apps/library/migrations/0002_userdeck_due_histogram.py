@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-18 05:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userdeck',
+            name='due_histogram',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
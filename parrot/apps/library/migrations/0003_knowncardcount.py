@@ -0,0 +1,30 @@
+# Generated by Django 4.2.27 on 2026-10-18 06:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_deck_card_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('library', '0002_userdeck_due_histogram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KnownCardCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('known', models.PositiveIntegerField(default=0)),
+                ('deck', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='known_card_counts', to='core.deck')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='known_card_counts', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='knowncardcount',
+            constraint=models.UniqueConstraint(fields=('user', 'deck'), name='uniq_known_count_per_user_deck'),
+        ),
+    ]
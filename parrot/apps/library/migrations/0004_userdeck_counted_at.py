@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-18 06:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0003_knowncardcount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userdeck',
+            name='counted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.27 on 2026-10-18 06:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0004_userdeck_counted_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userdeck',
+            name='new_cursor_card',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userdeck',
+            name='new_cursor_rank',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
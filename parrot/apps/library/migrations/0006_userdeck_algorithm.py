@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-18 07:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0005_userdeck_new_cursor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userdeck',
+            name='algorithm',
+            field=models.CharField(default='sm2', max_length=16),
+        ),
+    ]
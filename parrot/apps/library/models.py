@@ -12,11 +12,16 @@ class UserDeck(models.Model):
     daily_new_limit = models.PositiveIntegerField(default=20)
     chunk_size = models.PositiveIntegerField(default=20)
     new_ratio = models.FloatField(default=0.2)
+    # Scheduler for cards first reviewed from this deck; cards keep theirs.
+    algorithm = models.CharField(max_length=16, default="sm2")
     
     cached_due_count = models.PositiveIntegerField(default=0)
     cached_new_count = models.PositiveIntegerField(default=0)
     cached_total_in_deck = models.PositiveIntegerField(default=0)
     cached_at = models.DateTimeField(null=True, blank=True)
+    due_histogram = models.JSONField(default=dict, blank=True)
+    # Last full recount; cached_at only marks the histogram watermark.
+    counted_at = models.DateTimeField(null=True, blank=True)
 
     last_studied_at = models.DateTimeField(null=True, blank=True)
     reviews_today = models.PositiveIntegerField(default=0)
@@ -27,6 +32,11 @@ class UserDeck(models.Model):
     new_today = models.PositiveIntegerField(default=0)
     new_today_date = models.DateField(null=True, blank=True)
 
+    # Every deck card ordered before (new_cursor_rank, new_cursor_card) has
+    # progress; see library.services.frontier.
+    new_cursor_rank = models.PositiveIntegerField(default=0)
+    new_cursor_card = models.BigIntegerField(default=0)
+
 
     class Meta:
         constraints = [
@@ -63,4 +73,19 @@ class UserDeck(models.Model):
             self.new_today_date = today
             self.new_today = 0
         self.new_today += n
-        self.total_new_seen += n
\ No newline at end of file
+        self.total_new_seen += n
+
+class KnownCardCount(models.Model):
+    """
+    Cards of ``deck`` the user has any progress on, for decks whether or not
+    they are in the user's library. Rows are created on demand from an exact
+    count and then maintained incrementally (see library.services.counts).
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="known_card_counts")
+    deck = models.ForeignKey("core.Deck", on_delete=models.CASCADE, related_name="known_card_counts")
+    known = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "deck"], name="uniq_known_count_per_user_deck"),
+        ]
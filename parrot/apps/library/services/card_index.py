@@ -0,0 +1,167 @@
+"""
+In-process bitmap index of deck membership and of the cards each user has
+progress on.
+
+Bitmaps are built lazily from the database and kept in a per-process LRU of
+CARD_INDEX_SIZE entries. Every entry carries the version its key had in the
+shared cache when it was read. Writers bump that version after commit, and
+the writing process patches its own copy in place. Other processes see the
+version move and rebuild the entry on their next read.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.core.models import DeckCard
+from apps.core.services.roaring import RoaringBitmap
+from apps.study.models import CardProgress
+
+_lock = threading.Lock()
+_entries: "OrderedDict[str, tuple[int, RoaringBitmap]]" = OrderedDict()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _new_version() -> int:
+    # Clock-based, as in explore_cache, so a version lost to eviction never
+    # comes back at a number an old entry still carries.
+    return time.time_ns() // 1000
+
+
+def _deck_key(deck_id) -> str:
+    return f"card_index:deck:{deck_id}"
+
+
+def _user_key(user_id) -> str:
+    return f"card_index:user:{user_id}"
+
+
+def _versions(keys) -> dict:
+    vkeys = {key: f"{key}:v" for key in keys}
+    found = cache.get_many(vkeys.values())
+    versions = {}
+    for key, vkey in vkeys.items():
+        if vkey not in found:
+            cache.add(vkey, _new_version(), None)
+            found[vkey] = cache.get(vkey)
+        versions[key] = found[vkey]
+    return versions
+
+
+def _lookup(versions: dict) -> tuple[dict, list]:
+    found, missing = {}, []
+    with _lock:
+        for key, version in versions.items():
+            entry = _entries.get(key)
+            if entry is not None and entry[0] == version:
+                _entries.move_to_end(key)
+                found[key] = entry[1]
+            else:
+                missing.append(key)
+        _stats["hits"] += len(found)
+        _stats["misses"] += len(missing)
+    return found, missing
+
+
+def _store(versions: dict, bitmaps: dict) -> None:
+    size = settings.CARD_INDEX_SIZE
+    with _lock:
+        for key, bitmap in bitmaps.items():
+            _entries[key] = (versions[key], bitmap)
+            _entries.move_to_end(key)
+        while len(_entries) > size:
+            _entries.popitem(last=False)
+
+
+def deck_bitmaps(deck_ids) -> dict[int, RoaringBitmap]:
+    keys = {_deck_key(deck_id): deck_id for deck_id in set(deck_ids)}
+    versions = _versions(keys)
+    found, missing = _lookup(versions)
+    if missing:
+        ids = {keys[key]: [] for key in missing}
+        for deck_id, card_id in DeckCard.objects.filter(deck_id__in=ids).values_list("deck_id", "card_id"):
+            ids[deck_id].append(card_id)
+        built = {_deck_key(deck_id): RoaringBitmap(card_ids) for deck_id, card_ids in ids.items()}
+        _store(versions, built)
+        found.update(built)
+    return {deck_id: found[key] for key, deck_id in keys.items()}
+
+
+def user_bitmap(user_id) -> RoaringBitmap:
+    key = _user_key(user_id)
+    versions = _versions([key])
+    found, missing = _lookup(versions)
+    if missing:
+        bitmap = RoaringBitmap(CardProgress.objects.filter(user_id=user_id).values_list("card_id", flat=True))
+        _store(versions, {key: bitmap})
+        return bitmap
+    return found[key]
+
+
+def known_counts(user_id, deck_ids) -> dict[int, int]:
+    """Cards of each deck the user has progress on."""
+    seen = user_bitmap(user_id)
+    return {deck_id: bitmap.intersection_cardinality(seen) for deck_id, bitmap in deck_bitmaps(deck_ids).items()}
+
+
+def new_counts(user_id, deck_ids) -> dict[int, int]:
+    """Cards of each deck the user has no progress on."""
+    seen = user_bitmap(user_id)
+    return {
+        deck_id: len(bitmap) - bitmap.intersection_cardinality(seen)
+        for deck_id, bitmap in deck_bitmaps(deck_ids).items()
+    }
+
+
+def _patch(key, apply):
+    vkey = f"{key}:v"
+    try:
+        version = cache.incr(vkey)
+    except ValueError:
+        cache.set(vkey, _new_version(), None)
+        version = None
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return
+        # Patch only a copy that was current right before this bump; anything
+        # else has missed a change and is rebuilt on the next read.
+        if version is not None and entry[0] == version - 1:
+            apply(entry[1])
+            _entries[key] = (version, entry[1])
+        else:
+            del _entries[key]
+
+
+def cards_known(user_id, card_ids) -> None:
+    card_ids = list(card_ids)
+    if card_ids:
+        transaction.on_commit(lambda: _patch(_user_key(user_id), lambda bitmap: bitmap.update(card_ids)))
+
+
+def deck_cards_changed(deck_id, card_ids, sign) -> None:
+    card_ids = list(card_ids)
+    if not card_ids:
+        return
+    if sign > 0:
+        transaction.on_commit(lambda: _patch(_deck_key(deck_id), lambda bitmap: bitmap.update(card_ids)))
+    else:
+        transaction.on_commit(lambda: _patch(_deck_key(deck_id), lambda bitmap: bitmap.difference_update(card_ids)))
+
+
+def stats() -> dict:
+    with _lock:
+        return {
+            **_stats,
+            "entries": len(_entries),
+            "bytes": sum(bitmap.nbytes for _, bitmap in _entries.values()),
+        }
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+        _stats.update(hits=0, misses=0)
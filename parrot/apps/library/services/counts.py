@@ -1,29 +1,306 @@
+from collections import Counter, defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest, TruncHour
 from django.utils import timezone
-from apps.core.models import Flashcard
+
+from apps.core.models import Deck, DeckCard
+from apps.core.services.explore_cache import bump_badges, bump_listing
+from apps.library.models import KnownCardCount, UserDeck
+from apps.library.services import card_index, frontier
+from apps.study.models import CardProgress, DeckDue
+from apps.study.services import due_index
+
+# UserDeck counters are exact as of the hour bucket containing ``cached_at``:
+# cards due before that hour are in ``cached_due_count``, later ones sit in
+# ``due_histogram`` keyed by epoch hour until time rolls them forward. The
+# current hour's bucket is split exactly at read time by add_due_this_hour.
+BUCKET_SECONDS = 3600
+COUNT_FIELDS = [
+    "cached_due_count", "cached_new_count", "cached_total_in_deck", "cached_at", "due_histogram", "counted_at",
+]
+
+
+def due_bucket(dt) -> int:
+    return int(dt.timestamp()) // BUCKET_SECONDS
 
 
-def compute_due_new_counts(user, deck):
+def roll_forward(ud: UserDeck, now=None) -> bool:
+    now = now or timezone.now()
+    watermark = due_bucket(now)
+    if due_bucket(ud.cached_at) >= watermark:
+        return False
 
-    now = timezone.now()
+    rolled = 0
+    for key in [k for k in ud.due_histogram if int(k) < watermark]:
+        rolled += ud.due_histogram.pop(key)
+    ud.cached_due_count += rolled
+    ud.cached_at = now
+    return True
 
-    due_count = (
-        Flashcard.objects.filter(
-            deck_cards__deck=deck,
-            progress__user=user,
-            progress__due_at__lte=now,
+
+def add_due_this_hour(user_decks, now=None) -> None:
+    """
+    Add the cards that fell due earlier in the current hour to the rolled
+    ``cached_due_count`` of ``user_decks`` (for display, not saved), so the
+    count matches the due_at <= now the session queue uses.
+
+    One range read on the DeckDue (user, deck, due_at) index, limited to the
+    decks whose current bucket holds anything.
+    """
+    now = now or timezone.now()
+    key = str(due_bucket(now))
+    pending = {(ud.user_id, ud.deck_id): ud for ud in user_decks if ud.due_histogram.get(key)}
+    if not pending:
+        return
+    hour_start = datetime.fromtimestamp(int(key) * BUCKET_SECONDS, tz=dt_timezone.utc)
+    rows = (
+        DeckDue.objects
+        .filter(
+            user_id__in={user_id for user_id, _ in pending},
+            deck_id__in={deck_id for _, deck_id in pending},
+            due_at__gte=hour_start,
+            due_at__lte=now,
         )
-        .distinct()
-        .count()
+        .values("user_id", "deck_id")
+        .annotate(n=Count("id"))
+        .values_list("user_id", "deck_id", "n")
     )
+    for user_id, deck_id, n in rows:
+        ud = pending.get((user_id, deck_id))
+        if ud is not None:
+            ud.cached_due_count += min(n, ud.due_histogram[key])
+
+
+def _add_due(ud: UserDeck, due_at, n=1):
+    bucket = due_bucket(due_at)
+    if bucket < due_bucket(ud.cached_at):
+        ud.cached_due_count = max(0, ud.cached_due_count + n)
+        return
+    key = str(bucket)
+    left = ud.due_histogram.get(key, 0) + n
+    if left > 0:
+        ud.due_histogram[key] = left
+    else:
+        ud.due_histogram.pop(key, None)
+
 
-    new_count = (
-        Flashcard.objects.filter(
-            deck_cards__deck=deck,
+def compute_counts(user_decks, now=None, totals=None, using=None) -> list[UserDeck]:
+    """
+    Recompute the counters of ``user_decks`` in place (not saved).
+
+    One grouped query over the users' progress covers every deck. Deck
+    totals are counted from DeckCard unless ``totals`` ({deck_id: n}, e.g.
+    from Deck.card_count) is given. ``using`` pins the reads to one database;
+    counts that will be saved should come from the primary, not a replica.
+    """
+    user_decks = list(user_decks)
+    if not user_decks:
+        return user_decks
+    now = now or timezone.now()
+    watermark = due_bucket(now)
+
+    deck_ids = {ud.deck_id for ud in user_decks}
+    user_ids = {ud.user_id for ud in user_decks}
+
+    if totals is None:
+        totals = dict(
+            DeckCard.objects.using(using).filter(deck_id__in=deck_ids)
+            .values("deck_id")
+            .annotate(n=Count("id"))
+            .values_list("deck_id", "n")
         )
-        .exclude(progress__user=user)
-        .distinct()
-        .count()
+
+    seen = defaultdict(int)
+    due = defaultdict(int)
+    histograms = defaultdict(dict)
+    progress_hours = (
+        CardProgress.objects.using(using)
+        .filter(user_id__in=user_ids, card__deck_cards__deck_id__in=deck_ids)
+        .values("user_id", deck_id=F("card__deck_cards__deck_id"), hour=TruncHour("due_at", tzinfo=dt_timezone.utc))
+        .annotate(n=Count("id"))
+        .values_list("user_id", "deck_id", "hour", "n")
     )
+    for user_id, deck_id, hour, n in progress_hours:
+        pair = (user_id, deck_id)
+        seen[pair] += n
+        bucket = due_bucket(hour)
+        if bucket < watermark:
+            due[pair] += n
+        else:
+            histograms[pair][str(bucket)] = n
+
+    for ud in user_decks:
+        pair = (ud.user_id, ud.deck_id)
+        total = totals.get(ud.deck_id, 0)
+        ud.cached_total_in_deck = total
+        ud.cached_new_count = total - seen[pair]
+        ud.cached_due_count = due[pair]
+        ud.due_histogram = histograms[pair]
+        ud.cached_at = now
+        ud.counted_at = now
+    return user_decks
+
+
+@transaction.atomic
+def apply_reviews(user, reviews, now=None):
+    reviews = list(reviews)
+    if not reviews:
+        return
+    now = now or timezone.now()
+    _bump_known(user, [card_id for card_id, due_before, _ in reviews if due_before is None])
+    user_decks = {
+        ud.deck_id: ud
+        for ud in UserDeck.objects.select_for_update().filter(user=user, cached_at__isnull=False)
+    }
+    if not user_decks:
+        return
+
+    decks_by_card = defaultdict(list)
+    memberships = DeckCard.objects.filter(
+        deck_id__in=user_decks,
+        card_id__in={card_id for card_id, _, _ in reviews},
+    ).values_list("card_id", "deck_id")
+    for card_id, deck_id in memberships:
+        decks_by_card[card_id].append(user_decks[deck_id])
+
+    touched = {}
+    for card_id, due_before, due_after in reviews:
+        for ud in decks_by_card[card_id]:
+            roll_forward(ud, now)
+            if due_before is None:
+                ud.cached_new_count = max(0, ud.cached_new_count - 1)
+            else:
+                _add_due(ud, due_before, -1)
+            _add_due(ud, due_after)
+            touched[ud.id] = ud
+    UserDeck.objects.bulk_update(touched.values(), COUNT_FIELDS)
 
-    total = Flashcard.objects.filter(deck_cards__deck=deck).distinct().count()
-    return due_count, new_count, total
+
+@transaction.atomic
+def apply_deck_cards_added(deck, card_ids, now=None):
+    _apply_deck_cards_delta(deck, card_ids, +1, now)
+
+
+@transaction.atomic
+def apply_deck_cards_removed(deck, card_ids, now=None):
+    _apply_deck_cards_delta(deck, card_ids, -1, now)
+
+
+def _apply_deck_cards_delta(deck, card_ids, sign, now):
+    card_ids = list(card_ids)
+    if not card_ids:
+        return
+    now = now or timezone.now()
+    deck_id = getattr(deck, "pk", deck)
+    Deck.objects.filter(pk=deck_id).update(card_count=Greatest(F("card_count") + sign * len(card_ids), Value(0)))
+    language_id = getattr(deck, "language_id", None) or Deck.objects.filter(pk=deck_id).values_list(
+        "language_id", flat=True
+    ).first()
+    bump_listing(language_id)
+    card_index.deck_cards_changed(deck_id, card_ids, sign)
+    _shift_known(deck, card_ids, sign)
+    if sign > 0:
+        frontier.cards_added(deck_id, card_ids)
+        due_index.add_deck_cards(deck_id, card_ids)
+    else:
+        due_index.remove_deck_cards(deck_id, card_ids)
+    user_decks = {
+        ud.user_id: ud
+        for ud in UserDeck.objects.select_for_update().filter(deck=deck, cached_at__isnull=False)
+    }
+    if not user_decks:
+        return
+
+    for ud in user_decks.values():
+        roll_forward(ud, now)
+        ud.cached_total_in_deck = max(0, ud.cached_total_in_deck + sign * len(card_ids))
+        ud.cached_new_count = max(0, ud.cached_new_count + sign * len(card_ids))
+
+    for start in range(0, len(card_ids), 500):
+        progress = (
+            CardProgress.objects
+            .filter(
+                card_id__in=card_ids[start:start + 500],
+                user__user_decks__deck=deck,
+                user__user_decks__cached_at__isnull=False,
+            )
+            .values_list("user_id", "due_at")
+        )
+        for user_id, due_at in progress:
+            ud = user_decks[user_id]
+            ud.cached_new_count = max(0, ud.cached_new_count - sign)
+            _add_due(ud, due_at, sign)
+
+    UserDeck.objects.bulk_update(user_decks.values(), COUNT_FIELDS, batch_size=500)
+
+
+# KnownCardCount upkeep. The rows are kept exact even while CARD_INDEX_SIZE
+# is set and known_counts() reads the bitmap index instead, so turning the
+# index off never serves counts from before it was on.
+def _bump_known(user, card_ids):
+    # First reviews: every existing (user, deck) row for a deck holding the
+    # card gains one. Missing rows are filled exactly by known_counts().
+    if not card_ids:
+        return
+    card_index.cards_known(user.id, card_ids)
+    per_deck = Counter(DeckCard.objects.filter(card_id__in=card_ids).values_list("deck_id", flat=True))
+    rows = list(KnownCardCount.objects.select_for_update().filter(user=user, deck_id__in=per_deck))
+    for row in rows:
+        row.known += per_deck[row.deck_id]
+    KnownCardCount.objects.bulk_update(rows, ["known"])
+    if rows:
+        bump_badges(user.id)
+
+
+def _shift_known(deck, card_ids, sign):
+    per_user = Counter()
+    for start in range(0, len(card_ids), 500):
+        per_user.update(dict(
+            CardProgress.objects
+            .filter(card_id__in=card_ids[start:start + 500], user__known_card_counts__deck=deck)
+            .values("user_id")
+            .annotate(n=Count("id"))
+            .values_list("user_id", "n")
+        ))
+    if not per_user:
+        return
+    rows = list(KnownCardCount.objects.select_for_update().filter(deck=deck, user_id__in=per_user))
+    for row in rows:
+        row.known = max(0, row.known + sign * per_user[row.user_id])
+        bump_badges(row.user_id)
+    KnownCardCount.objects.bulk_update(rows, ["known"], batch_size=500)
+
+
+def known_counts(user, deck_ids) -> dict[int, int]:
+    """
+    Known-card counts for ``deck_ids``: bitmap intersections from
+    card_index when CARD_INDEX_SIZE is set, otherwise one lookup plus one
+    grouped count for decks the user has no row for yet (those rows are
+    then created).
+    """
+    deck_ids = set(deck_ids)
+    if settings.CARD_INDEX_SIZE:
+        return card_index.known_counts(user.id, deck_ids)
+    known = dict(
+        KnownCardCount.objects.filter(user=user, deck_id__in=deck_ids).values_list("deck_id", "known")
+    )
+    missing = deck_ids - known.keys()
+    if missing:
+        fresh = dict.fromkeys(missing, 0)
+        fresh.update(
+            CardProgress.objects
+            .filter(user=user, card__deck_cards__deck_id__in=missing)
+            .values(deck_id=F("card__deck_cards__deck_id"))
+            .annotate(n=Count("id"))
+            .values_list("deck_id", "n")
+        )
+        KnownCardCount.objects.bulk_create(
+            [KnownCardCount(user=user, deck_id=deck_id, known=n) for deck_id, n in fresh.items()],
+            ignore_conflicts=True,
+        )
+        known.update(fresh)
+    return known
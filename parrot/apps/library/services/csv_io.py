@@ -1,12 +1,15 @@
+import codecs
 import csv
-import io
+import re
+import zlib
 from dataclasses import dataclass
-from typing import Iterable
+from typing import Iterable, Iterator
 
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.db.models import Max
 
 from apps.core.models import Deck, Flashcard, DeckCard
+from apps.library.services.counts import apply_deck_cards_added
 
 
 @dataclass
@@ -17,101 +20,260 @@ class ParsedRow:
     context: str
 
 
-def parse_csv_bytes(data: bytes) -> tuple[list[ParsedRow], list[str]]:
+MAX_ERRORS = 50
 
-    errors: list[str] = []
-    rows: list[ParsedRow] = []
+_LINE_END = re.compile(r"\r\n|\r|\n")
+
+
+def _split_lines(buf: str, final: bool) -> tuple[list[str], str]:
+    lines = []
+    start = 0
+    for m in _LINE_END.finditer(buf):
+        if not final and m.end() == len(buf) and m.group() == "\r":
+            break  # may be the first half of a \r\n split across chunks
+        lines.append(buf[start:m.end()])
+        start = m.end()
+    if final and start < len(buf):
+        lines.append(buf[start:])
+        start = len(buf)
+    return lines, buf[start:]
+
+
+def _iter_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    # Incremental UTF-8 decoding; lines keep their endings (like newline="")
+    # so the csv module can handle quoted newlines.
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buf = ""
+    for chunk in chunks:
+        try:
+            buf += decoder.decode(chunk)
+        except UnicodeDecodeError as e:
+            # Hand over the complete lines before the bad byte so the error
+            # is reported against the right line.
+            lines, _ = _split_lines(buf + e.object[:e.start].decode("utf-8", "ignore"), final=False)
+            yield from lines
+            raise
+        lines, buf = _split_lines(buf, final=False)
+        yield from lines
+    lines, _ = _split_lines(buf + decoder.decode(b"", final=True), final=True)
+    yield from lines
 
+
+def parse_csv_stream(chunks: Iterable[bytes], errors: list[str]) -> Iterator[ParsedRow]:
+    """
+    Parse CSV bytes lazily, yielding rows as they are read.
+
+    Problems are appended to ``errors`` with their line numbers. Once an
+    error is recorded no further rows are yielded, but the rest of the file
+    is still checked (up to MAX_ERRORS) so the user sees every problem at
+    once.
+    """
+    reader = csv.DictReader(_iter_lines(chunks))
     try:
-        text = data.decode("utf-8-sig")
-    except UnicodeDecodeError:
-        errors.append("CSV must be UTF-8 encoded.")
-        return [], errors
+        if not reader.fieldnames:
+            errors.append("CSV has no header row.")
+            return
 
-    f = io.StringIO(text, newline="")
-    reader = csv.DictReader(f)
-    if not reader.fieldnames:
-        return [], ["CSV has no header row."]
+        fieldnames = {h.strip().lower() for h in reader.fieldnames if h}
+        if "word" not in fieldnames:
+            errors.append(f"CSV must include a 'word' column. Found: {sorted(fieldnames)}")
+            return
 
-    fieldnames = {h.strip().lower() for h in reader.fieldnames if h}
-    if "word" not in fieldnames:
-        return [], [f"CSV must include a 'word' column. Found: {sorted(fieldnames)}"]
+        for row in reader:
+            word = (row.get("word") or row.get("Word") or "").strip()
+            if not word:
+                continue
 
-    for i, row in enumerate(reader, start=2):  
-        word = (row.get("word") or row.get("Word") or "").strip()
-        if not word:
-            continue
+            rank_raw = (row.get("rank") or row.get("Rank") or "").strip()
+            rank: int | None = None
+            if rank_raw:
+                try:
+                    rank = int(rank_raw)
+                except ValueError:
+                    errors.append(f"Line {reader.line_num}: invalid rank '{rank_raw}' (must be an integer).")
+                    if len(errors) >= MAX_ERRORS:
+                        errors.append("Too many errors; stopped checking.")
+                        return
 
-        rank_raw = (row.get("rank") or row.get("Rank") or "").strip()
-        rank: int | None = None
-        if rank_raw:
-            try:
-                rank = int(rank_raw)
-            except ValueError:
-                errors.append(f"Line {i}: invalid rank '{rank_raw}' (must be an integer).")
+            translation = (row.get("translation") or row.get("Translation") or "").strip()
+            context = (
+                (row.get("context") or row.get("Context") or "")
+                or (row.get("context_sentence") or row.get("Context_sentence") or row.get("Context Sentence") or "")
+            ).strip()
 
-        translation = (row.get("translation") or row.get("Translation") or "").strip()
-        context = (
-            (row.get("context") or row.get("Context") or "")
-            or (row.get("context_sentence") or row.get("Context_sentence") or row.get("Context Sentence") or "")
-        ).strip()
+            if not errors:
+                yield ParsedRow(rank=rank, word=word, translation=translation, context=context)
+    except UnicodeDecodeError:
+        errors.append(f"Line {reader.line_num + 1}: CSV must be UTF-8 encoded.")
+    except csv.Error as e:
+        errors.append(f"Line {reader.line_num}: {e}")
 
-        rows.append(ParsedRow(rank=rank, word=word, translation=translation, context=context))
 
+def parse_csv_bytes(data: bytes) -> tuple[list[ParsedRow], list[str]]:
+    errors: list[str] = []
+    rows = list(parse_csv_stream([data], errors))
     return rows, errors
 
 
-@transaction.atomic
-def import_rows_into_deck(*, deck: Deck, user, rows: Iterable[ParsedRow]) -> dict:
+def import_csv_into_deck(*, deck: Deck, user, chunks: Iterable[bytes]) -> tuple[dict | None, list[str]]:
+    """
+    Stream an uploaded CSV straight into ``deck``.
 
-    rows = list(rows)
-    if not rows:
-        return {"created": 0, "attached": 0, "skipped": 0}
+    Memory is bounded by the import batch size rather than the file size.
+    Nothing is imported if any line fails validation.
+    """
+    errors: list[str] = []
+    with transaction.atomic():
+        stats = import_rows_into_deck(deck=deck, user=user, rows=parse_csv_stream(chunks, errors))
+        if errors:
+            transaction.set_rollback(True)
+            return None, errors
+    return stats, errors
 
-    existing_words = set(
-        Flashcard.objects.filter(deck_cards__deck=deck)
-        .values_list("word", flat=True)
-    )
 
-    max_pos = DeckCard.objects.filter(deck=deck).aggregate(m=Max("position"))["m"] or 0
-    next_pos = max_pos + 1
+IMPORT_BATCH_SIZE = 1000
+
+
+@transaction.atomic
+def import_rows_into_deck(*, deck: Deck, user, rows: Iterable[ParsedRow], batch_size: int = IMPORT_BATCH_SIZE) -> dict:
+    """
+    Add ``rows`` to ``deck`` in batches.
 
+    Words already in the deck (or repeated in the file) are skipped. Words
+    that exist elsewhere in the language are attached to the shared card
+    rather than recreated; only unknown words create Flashcards.
+    """
     created = attached = skipped = 0
+    attached_ids: list[int] = []
 
+    # Serialises imports into the same deck so positions stay contiguous.
+    Deck.objects.select_for_update().filter(pk=deck.pk).first()
+    in_deck = set(DeckCard.objects.filter(deck=deck).values_list("card_id", flat=True))
+    max_pos = DeckCard.objects.filter(deck=deck).aggregate(m=Max("position"))["m"] or 0
+    next_pos = max_pos + 1
+
+    batch: list[ParsedRow] = []
     for r in rows:
-        if r.word in existing_words:
-            skipped += 1
-            continue
+        batch.append(r)
+        if len(batch) >= batch_size:
+            c, a, s, next_pos = _import_batch(deck, user, batch, in_deck, next_pos, attached_ids)
+            created, attached, skipped = created + c, attached + a, skipped + s
+            batch = []
+    if batch:
+        c, a, s, next_pos = _import_batch(deck, user, batch, in_deck, next_pos, attached_ids)
+        created, attached, skipped = created + c, attached + a, skipped + s
 
-        card = Flashcard.objects.create(
-            language=deck.language,
-            word=r.word,
-            translation=r.translation,
-            context_sentence=r.context,
-            frequency_rank=r.rank,
-            created_by=user,
+    apply_deck_cards_added(deck, attached_ids)
+    return {"created": created, "attached": attached, "skipped": skipped}
+
+
+def _import_batch(deck, user, batch, in_deck, next_pos, attached_ids):
+    # Repeats inside the batch resolve to the same card and are skipped
+    # below; repeats across batches are already in in_deck.
+    words = list(dict.fromkeys(r.word for r in batch))
+    rows = {r.word: r for r in reversed(batch)}
+    existing: dict[str, int] = {}
+    created = 0
+    while True:
+        existing.update(
+            Flashcard.objects.filter(
+                language_id=deck.language_id, word__in=[w for w in words if w not in existing]
+            ).values_list("word", "id")
         )
-        created += 1
+        new_cards = [
+            Flashcard(
+                language_id=deck.language_id,
+                word=w,
+                translation=rows[w].translation,
+                context_sentence=rows[w].context,
+                frequency_rank=rows[w].rank,
+                created_by=user,
+            )
+            for w in words if w not in existing
+        ]
+        if not new_cards:
+            break
+        # A concurrent import may have created some of these words since the
+        # lookup. The savepoint keeps this transaction usable after the
+        # conflict, and the lookup above picks their ids up on the retry, so
+        # every row this insert writes is one this import created.
+        try:
+            with transaction.atomic():
+                Flashcard.objects.bulk_create(new_cards)
+        except IntegrityError:
+            continue
+        created = len(new_cards)
+        if all(c.pk is not None for c in new_cards):
+            existing.update((c.word, c.pk) for c in new_cards)
+        else:
+            existing.update(
+                Flashcard.objects.filter(
+                    language_id=deck.language_id, word__in=[c.word for c in new_cards]
+                ).values_list("word", "id")
+            )
+        break
 
-        DeckCard.objects.create(deck=deck, card=card, position=next_pos)
-        attached += 1
+    deck_cards = []
+    skipped = 0
+    for r in batch:
+        card_id = existing[r.word]
+        if card_id in in_deck:
+            skipped += 1
+            continue
+        in_deck.add(card_id)
+        deck_cards.append(DeckCard(deck=deck, card_id=card_id, position=next_pos))
         next_pos += 1
+    DeckCard.objects.bulk_create(deck_cards)
 
-    return {"created": created, "attached": attached, "skipped": skipped}
+    attached_ids.extend(dc.card_id for dc in deck_cards)
+    return created, len(deck_cards), skipped, next_pos
 
 
-def export_deck_to_csv_text(deck: Deck) -> str:
+EXPORT_HEADER = ["rank", "word", "translation", "context"]
+EXPORT_CHUNK_ROWS = 2000
+EXPORT_PIECE_BYTES = 64 * 1024
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
 
-    output = io.StringIO(newline="")
-    writer = csv.writer(output)
-    writer.writerow(["rank", "word", "translation", "context"])
+def iter_deck_csv(deck: Deck, chunk_size: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """
+    Yield the deck as UTF-8 CSV in pieces of roughly EXPORT_PIECE_BYTES.
 
-    for dc in (
+    Rows come from a server-side cursor as plain tuples, so memory stays
+    flat however large the deck is.
+    """
+    writer = csv.writer(_Echo())
+    rows = (
         DeckCard.objects.filter(deck=deck)
-        .select_related("card")
         .order_by("position", "id")
-    ):
-        c = dc.card
-        writer.writerow([dc.position, c.word, c.translation, c.context_sentence])
+        .values_list("position", "card__word", "card__translation", "card__context_sentence")
+        .iterator(chunk_size=chunk_size)
+    )
+    parts = [writer.writerow(EXPORT_HEADER)]
+    size = 0
+    for row in rows:
+        line = writer.writerow(row)
+        parts.append(line)
+        size += len(line)
+        if size >= EXPORT_PIECE_BYTES:
+            yield "".join(parts).encode("utf-8")
+            parts = []
+            size = 0
+    yield "".join(parts).encode("utf-8")
+
+
+def gzip_stream(pieces: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for piece in pieces:
+        out = compressor.compress(piece)
+        if out:
+            yield out
+    yield compressor.flush()
 
-    return output.getvalue()
+
+def export_deck_to_csv_text(deck: Deck) -> str:
+    return b"".join(iter_deck_csv(deck)).decode("utf-8")
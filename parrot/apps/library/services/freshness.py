@@ -0,0 +1,120 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.library.models import UserDeck
+from apps.library.services.counts import COUNT_FIELDS, compute_counts
+
+logger = logging.getLogger(__name__)
+
+HIT, STALE, MISS = "hit", "stale", "miss"
+METRIC_KEYS = {kind: f"metrics:deck_counts:{kind}" for kind in (HIT, STALE, MISS)}
+
+_executor = None
+_executor_lock = threading.Lock()
+_in_flight: set[int] = set()
+_in_flight_lock = threading.Lock()
+
+
+def classify(ud: UserDeck, now=None) -> str:
+    """
+    ``miss``: never counted. ``stale``: older than USERDECK_COUNTS_TTL seconds
+    since the last full recount (0 disables the TTL). ``hit`` otherwise.
+    """
+    if ud.cached_at is None:
+        return MISS
+    ttl = settings.USERDECK_COUNTS_TTL
+    if ttl and (ud.counted_at is None or (now or timezone.now()) - ud.counted_at > timedelta(seconds=ttl)):
+        return STALE
+    return HIT
+
+
+def record(kind: str, n: int = 1):
+    # Kept in the cache so every worker process reports into the same totals.
+    if not n:
+        return
+    key = METRIC_KEYS[kind]
+    try:
+        cache.incr(key, n)
+    except ValueError:
+        if not cache.add(key, n, None):
+            cache.incr(key, n)
+
+
+def metrics() -> dict:
+    values = cache.get_many(METRIC_KEYS.values())
+    counts = {kind: values.get(key, 0) for kind, key in METRIC_KEYS.items()}
+    total = sum(counts.values())
+    rates = {f"{kind}_rate": (n / total if total else 0.0) for kind, n in counts.items()}
+    return {**counts, "total": total, **rates}
+
+
+def reset_metrics():
+    cache.delete_many(METRIC_KEYS.values())
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.USERDECK_COUNTS_REFRESH_WORKERS,
+                thread_name_prefix="deck-counts",
+            )
+        return _executor
+
+
+def refresh_counts(user_deck_ids):
+    """Recount the given UserDecks that are still stale, under row locks."""
+    with transaction.atomic():
+        now = timezone.now()
+        user_decks = [
+            ud for ud in UserDeck.objects.select_for_update().select_related("deck").filter(id__in=user_deck_ids)
+            if classify(ud, now) != HIT
+        ]
+        totals = {ud.deck_id: ud.deck.card_count for ud in user_decks}
+        UserDeck.objects.bulk_update(compute_counts(user_decks, now, totals=totals), COUNT_FIELDS)
+    return len(user_decks)
+
+
+def _run_refresh(ids):
+    try:
+        refresh_counts(ids)
+    except Exception:
+        logger.exception("Background deck count refresh failed for %s", ids)
+    finally:
+        with _in_flight_lock:
+            _in_flight.difference_update(ids)
+        if settings.USERDECK_COUNTS_REFRESH == "thread":
+            connection.close()
+
+
+def _submit(user_deck_ids):
+    with _in_flight_lock:
+        ids = [i for i in user_deck_ids if i not in _in_flight]
+        _in_flight.update(ids)
+    if not ids:
+        return
+    if settings.USERDECK_COUNTS_REFRESH == "sync":
+        _run_refresh(ids)
+    else:
+        _get_executor().submit(_run_refresh, ids)
+
+
+def schedule_refresh(user_deck_ids):
+    """
+    Refresh stale counts off the request path (stale-while-revalidate).
+
+    USERDECK_COUNTS_REFRESH picks the backend: "thread" (an in-process pool,
+    default) or "sync" (inline, for tests and scripts). Ids already being
+    refreshed are skipped.
+    """
+    user_deck_ids = list(user_deck_ids)
+    if user_deck_ids:
+        transaction.on_commit(lambda: _submit(user_deck_ids))
@@ -0,0 +1,92 @@
+"""
+New-card frontier per UserDeck.
+
+A deck introduces new cards in (DeckCard.card_rank, card_id) order. Every
+card ordered before a UserDeck's frontier (new_cursor_rank, new_cursor_card)
+already has progress, so new-card selection reads forward from the frontier
+on the (deck, card_rank, card) index instead of anti-joining the whole deck.
+Cards the user met early, e.g. in another deck of the language, stay ahead
+of the frontier and are skipped by the progress probe until it passes them.
+
+The frontier only advances past cards that have progress. Cards joining a
+deck and cards whose rank drops can land behind it unseen, so both rewind
+the frontiers of the affected decks.
+"""
+from django.db.models import OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from apps.core.models import UNRANKED, DeckCard, Flashcard
+from apps.library.models import UserDeck
+
+BATCH_SIZE = 500
+
+
+def ahead_of(qs, rank: int, card_id: int):
+    """Restrict DeckCards ``qs`` to the keys at or after (rank, card_id)."""
+    # The redundant card_rank >= rank bound gives the planner an index seek.
+    return qs.filter(card_rank__gte=rank).filter(Q(card_rank__gt=rank) | Q(card_id__gte=card_id))
+
+
+def advance(ud: UserDeck, first_new) -> None:
+    """
+    Move ``ud``'s frontier (not saved) to ``first_new``, the (card_rank,
+    card_id) of the first unseen card at or after it, or past the end of the
+    deck when there is none.
+    """
+    if first_new is None:
+        last = (
+            DeckCard.objects.filter(deck_id=ud.deck_id)
+            .order_by("-card_rank", "-card_id")
+            .values_list("card_rank", "card_id")
+            .first()
+        )
+        if last is None:
+            return
+        first_new = (last[0], last[1] + 1)
+    ud.new_cursor_rank, ud.new_cursor_card = first_new
+
+
+def _rewind(deck_id, rank, card_id):
+    UserDeck.objects.filter(deck_id=deck_id).filter(
+        Q(new_cursor_rank__gt=rank) | Q(new_cursor_rank=rank, new_cursor_card__gt=card_id)
+    ).update(new_cursor_rank=rank, new_cursor_card=card_id)
+
+
+def _copy_ranks(qs):
+    qs.update(card_rank=Coalesce(
+        Subquery(Flashcard.objects.filter(pk=OuterRef("card_id")).values("frequency_rank")[:1]),
+        Value(UNRANKED),
+    ))
+
+
+def cards_added(deck_id, card_ids) -> None:
+    """Copy the ranks of cards just linked to the deck and rewind past them."""
+    first = None
+    for start in range(0, len(card_ids), BATCH_SIZE):
+        links = DeckCard.objects.filter(deck_id=deck_id, card_id__in=card_ids[start:start + BATCH_SIZE])
+        _copy_ranks(links)
+        key = links.order_by("card_rank", "card_id").values_list("card_rank", "card_id").first()
+        if key is not None and (first is None or key < first):
+            first = key
+    if first is not None:
+        _rewind(deck_id, *first)
+
+
+def ranks_changed(card_ids) -> None:
+    """Re-copy the ranks of edited cards; a rank that dropped rewinds its decks."""
+    first = {}
+    for start in range(0, len(card_ids), BATCH_SIZE):
+        changed = []
+        for link_id, deck_id, card_id, old, rank in DeckCard.objects.filter(
+            card_id__in=card_ids[start:start + BATCH_SIZE]
+        ).values_list("id", "deck_id", "card_id", "card_rank", "card__frequency_rank"):
+            rank = UNRANKED if rank is None else rank
+            if rank == old:
+                continue
+            changed.append(link_id)
+            if rank < old and (deck_id not in first or (rank, card_id) < first[deck_id]):
+                first[deck_id] = (rank, card_id)
+        if changed:
+            _copy_ranks(DeckCard.objects.filter(id__in=changed))
+    for deck_id, key in first.items():
+        _rewind(deck_id, *key)
@@ -0,0 +1,95 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from apps.core.models import Deck, DeckCard, Flashcard
+from apps.core.services.explore_cache import bump_badges
+from apps.library.models import UserDeck
+from apps.library.services import frontier
+from apps.library.services.counts import apply_deck_cards_added, apply_deck_cards_removed
+from apps.study.services import due_index
+
+_state = threading.local()
+
+
+@contextmanager
+def deck_cards_changed_in_bulk():
+    """
+    Skip the per-row bookkeeping for DeckCard saves and deletes in this block.
+
+    The caller must apply apply_deck_cards_added / apply_deck_cards_removed
+    for the cards itself, once per batch, so nothing is counted twice.
+    """
+    previous = getattr(_state, "bulk", False)
+    _state.bulk = True
+    try:
+        yield
+    finally:
+        _state.bulk = previous
+
+
+def _deleting() -> tuple[set, set]:
+    if not hasattr(_state, "decks"):
+        _state.decks, _state.cards = set(), set()
+    return _state.decks, _state.cards
+
+
+# One-off link writes (the deck admin inline, the shell) are applied per row.
+@receiver(post_save, sender=DeckCard)
+def deck_card_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and not getattr(_state, "bulk", False):
+        apply_deck_cards_added(instance.deck_id, [instance.card_id])
+
+
+@receiver(post_delete, sender=DeckCard)
+def deck_card_removed(sender, instance, **kwargs):
+    decks, cards = _deleting()
+    if getattr(_state, "bulk", False) or instance.deck_id in decks or instance.card_id in cards:
+        return
+    apply_deck_cards_removed(instance.deck_id, [instance.card_id])
+
+
+# Links that go in a cascade are applied before the delete, while the rows
+# are still readable: a deck's in one call, a card's in one call per deck
+# holding it. The per-row receiver skips them until the owner is gone.
+@receiver(pre_delete, sender=Deck)
+def deck_deleting(sender, instance, **kwargs):
+    apply_deck_cards_removed(instance, list(instance.deck_cards.values_list("card_id", flat=True)))
+    _deleting()[0].add(instance.pk)
+
+
+@receiver(pre_delete, sender=Flashcard)
+def flashcard_deleting(sender, instance, **kwargs):
+    for deck_id in DeckCard.objects.filter(card=instance).values_list("deck_id", flat=True):
+        apply_deck_cards_removed(deck_id, [instance.id])
+    _deleting()[1].add(instance.pk)
+
+
+@receiver(post_delete, sender=Deck)
+def deck_deleted(sender, instance, **kwargs):
+    _deleting()[0].discard(instance.pk)
+
+
+@receiver(post_delete, sender=Flashcard)
+def flashcard_deleted(sender, instance, **kwargs):
+    _deleting()[1].discard(instance.pk)
+
+
+@receiver(post_save, sender=UserDeck)
+@receiver(post_delete, sender=UserDeck)
+def user_deck_changed(sender, instance, created=False, **kwargs):
+    # Only membership shows on explore; counter and settings saves don't.
+    if created or kwargs["signal"] is post_delete:
+        bump_badges(instance.user_id)
+    if created:
+        due_index.add_user_deck(instance.user_id, instance.deck_id)
+    elif kwargs["signal"] is post_delete:
+        due_index.remove_user_deck(instance.user_id, instance.deck_id)
+
+
+@receiver(post_save, sender=Flashcard)
+def flashcard_saved(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or "frequency_rank" in update_fields):
+        frontier.ranks_changed([instance.id])
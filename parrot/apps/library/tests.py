@@ -1,3 +1,346 @@
-from django.test import TestCase
+import gzip
+from datetime import datetime, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.core.db_router import ReplicaRouter
+from apps.core.models import Language, Deck, Flashcard, DeckCard
+from apps.library.models import UserDeck
+from apps.library.services.counts import (
+    BUCKET_SECONDS,
+    COUNT_FIELDS,
+    add_due_this_hour,
+    apply_deck_cards_added,
+    apply_reviews,
+    compute_counts,
+    due_bucket,
+    known_counts,
+    roll_forward,
+)
+from apps.library.services import card_index
+from apps.library.services.freshness import metrics
+from apps.library.services.csv_io import ParsedRow, import_csv_into_deck, import_rows_into_deck
+from apps.library.signals import deck_cards_changed_in_bulk
+from apps.study.models import CardProgress
+
+
+class IncrementalCountsTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="u")
+        self.language = Language.objects.create(code="cs", name="Czech")
+        self.deck = Deck.objects.create(language=self.language, title="Top")
+        self.cards = [
+            Flashcard.objects.create(language=self.language, word=f"w{i}", frequency_rank=i)
+            for i in range(6)
+        ]
+        for i, card in enumerate(self.cards[:4]):
+            DeckCard.objects.create(deck=self.deck, card=card, position=i)
+        self.ud = UserDeck.objects.create(user=self.user, deck=self.deck)
+        self.now = timezone.now()
+        UserDeck.objects.bulk_update(compute_counts([self.ud], self.now), COUNT_FIELDS)
+
+    def _counts(self, at):
+        ud = UserDeck.objects.get(id=self.ud.id)
+        roll_forward(ud, at)
+        return ud.cached_due_count, ud.cached_new_count, ud.cached_total_in_deck
+
+    def _real(self, at):
+        ud = compute_counts([UserDeck.objects.get(id=self.ud.id)], at)[0]
+        return ud.cached_due_count, ud.cached_new_count, ud.cached_total_in_deck
+
+    def _grade(self, card, due_after):
+        progress = CardProgress.objects.filter(user=self.user, card=card).first()
+        due_before = progress.due_at if progress else None
+        CardProgress.objects.update_or_create(user=self.user, card=card, defaults={"due_at": due_after})
+        apply_reviews(self.user, [(card.id, due_before, due_after)], now=self.now)
+
+    def test_review_moves_card_from_new_and_rolls_into_due(self):
+        self._grade(self.cards[0], self.now + timedelta(days=1))
+        self._grade(self.cards[1], self.now + timedelta(days=6))
+
+        self.assertEqual(self._counts(self.now), (0, 2, 4))
+        later = self.now + timedelta(days=2)
+        self.assertEqual(self._counts(later), (1, 2, 4))
+        self.assertEqual(self._counts(later), self._real(later))
+
+        self._grade(self.cards[0], self.now + timedelta(days=10))
+        self.assertEqual(self._counts(later), (0, 2, 4))
+
+    def test_current_hour_counts_cards_due_by_now(self):
+        hour_start = datetime.fromtimestamp(due_bucket(self.now) * BUCKET_SECONDS, tz=dt_timezone.utc)
+        self._grade(self.cards[0], hour_start)
+        self._grade(self.cards[1], self.now + timedelta(microseconds=1))
+
+        ud = UserDeck.objects.get(id=self.ud.id)
+        roll_forward(ud, self.now)
+        self.assertEqual(ud.cached_due_count, 0)
+        add_due_this_hour([ud], self.now)
+        self.assertEqual(ud.cached_due_count, 1)
+
+    def test_deck_card_added_and_removed(self):
+        CardProgress.objects.create(user=self.user, card=self.cards[4], due_at=self.now - timedelta(days=2))
+        DeckCard.objects.create(deck=self.deck, card=self.cards[4], position=5)
+        DeckCard.objects.create(deck=self.deck, card=self.cards[5], position=6)
+
+        self.assertEqual(self._counts(self.now), (1, 5, 6))
+        self.assertEqual(self._counts(self.now), self._real(self.now))
+
+        DeckCard.objects.filter(deck=self.deck, card=self.cards[4]).delete()
+        self.assertEqual(self._counts(self.now), (0, 5, 5))
+        self.assertEqual(self._counts(self.now), self._real(self.now))
+
+    def test_single_deck_card_delete_updates_counts(self):
+        self._grade(self.cards[0], self.now - timedelta(hours=2))
+        DeckCard.objects.get(deck=self.deck, card=self.cards[0]).delete()
+
+        self.assertEqual(Deck.objects.get(id=self.deck.id).card_count, 3)
+        self.assertEqual(self._counts(self.now), (0, 3, 3))
+        self.assertEqual(self._counts(self.now), self._real(self.now))
+
+    def test_bulk_block_skips_per_row_bookkeeping(self):
+        with deck_cards_changed_in_bulk():
+            DeckCard.objects.filter(deck=self.deck, card=self.cards[0]).delete()
+            DeckCard.objects.create(deck=self.deck, card=self.cards[5], position=9)
+        self.assertEqual(self._counts(self.now), (0, 4, 4))
+
+    def test_card_and_deck_deletes_apply_their_links_once(self):
+        self._grade(self.cards[0], self.now - timedelta(hours=2))
+        self.cards[0].delete()
+        self.assertEqual(self._counts(self.now), (0, 3, 3))
+        self.assertEqual(self._counts(self.now), self._real(self.now))
+
+        more = Flashcard.objects.bulk_create(Flashcard(language=self.language, word=f"x{i}") for i in range(40))
+        DeckCard.objects.bulk_create(DeckCard(deck=self.deck, card=c, position=10 + i) for i, c in enumerate(more))
+        apply_deck_cards_added(self.deck, [c.id for c in more])
+        other = Deck.objects.create(language=self.language, title="Other")
+        DeckCard.objects.create(deck=other, card=self.cards[1], position=0)
+        UserDeck.objects.create(user=self.user, deck=other, cached_at=self.now)
+        with CaptureQueriesContext(connection) as small:
+            other.delete()
+        with CaptureQueriesContext(connection) as large:
+            self.deck.delete()
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+
+class CSVImportTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="u")
+        self.language = Language.objects.create(code="cs", name="Czech")
+        self.deck = Deck.objects.create(language=self.language, title="Mine", created_by=self.user)
+        other = Deck.objects.create(language=self.language, title="Other")
+        self.shared = Flashcard.objects.create(language=self.language, word="pes", translation="dog")
+        DeckCard.objects.create(deck=other, card=self.shared, position=1)
+        self.ud = UserDeck.objects.create(user=self.user, deck=self.deck)
+        UserDeck.objects.bulk_update(compute_counts([self.ud], timezone.now()), COUNT_FIELDS)
+
+    def _rows(self, *words):
+        return [ParsedRow(rank=i, word=w, translation="", context="") for i, w in enumerate(words, start=1)]
+
+    def test_attaches_shared_words_and_skips_duplicates(self):
+        stats = import_rows_into_deck(
+            deck=self.deck, user=self.user, rows=self._rows("kočka", "pes", "dům", "kočka"), batch_size=2,
+        )
+        self.assertEqual(stats, {"created": 2, "attached": 3, "skipped": 1})
+        self.assertEqual(Flashcard.objects.get(word="pes").translation, "dog")
+
+        stats = import_rows_into_deck(deck=self.deck, user=self.user, rows=self._rows("pes", "strom"))
+        self.assertEqual(stats, {"created": 1, "attached": 1, "skipped": 1})
+
+        positions = list(DeckCard.objects.filter(deck=self.deck).order_by("position").values_list("card__word", "position"))
+        self.assertEqual(positions, [("kočka", 1), ("pes", 2), ("dům", 3), ("strom", 4)])
+        ud = UserDeck.objects.get(id=self.ud.id)
+        self.assertEqual((ud.cached_new_count, ud.cached_total_in_deck), (4, 4))
+
+    def test_words_inserted_concurrently_are_not_counted_as_created(self):
+        other_user = get_user_model().objects.create(username="other")
+        lookup = Flashcard.objects.filter
+        raced = []
+
+        def racing(*args, **kwargs):
+            # Another import commits the first new word just after our lookup.
+            if not raced:
+                raced.append(Flashcard.objects.create(language=self.language, word="kočka", created_by=other_user))
+                return lookup(pk__in=[])
+            return lookup(*args, **kwargs)
+
+        with patch.object(Flashcard.objects, "filter", side_effect=racing):
+            stats = import_rows_into_deck(deck=self.deck, user=self.user, rows=self._rows("kočka", "dům"))
+
+        self.assertEqual(stats, {"created": 1, "attached": 2, "skipped": 0})
+        self.assertEqual(Flashcard.objects.get(word="kočka").created_by, other_user)
+        self.assertEqual(Flashcard.objects.get(word="dům").created_by, self.user)
+
+    def _chunks(self, text, size=3):
+        data = text.encode("utf-8-sig")
+        return (data[i:i + size] for i in range(0, len(data), size))
+
+    def test_streaming_import_across_chunk_boundaries(self):
+        text = 'word,rank,context\r\nkočka,1,"a\r\nb"\r\npes,2,\r\n'
+        stats, errors = import_csv_into_deck(deck=self.deck, user=self.user, chunks=self._chunks(text))
+
+        self.assertEqual(errors, [])
+        self.assertEqual(stats, {"created": 1, "attached": 2, "skipped": 0})
+        self.assertEqual(Flashcard.objects.get(word="kočka").context_sentence, "a\r\nb")
+
+    def test_streaming_import_reports_line_and_imports_nothing(self):
+        text = "word,rank\nkočka,1\ndům,x\n" + "".join(f"w{i},{i}\n" for i in range(50))
+        stats, errors = import_csv_into_deck(deck=self.deck, user=self.user, chunks=self._chunks(text))
+
+        self.assertIsNone(stats)
+        self.assertEqual(errors, ["Line 3: invalid rank 'x' (must be an integer)."])
+        self.assertFalse(DeckCard.objects.filter(deck=self.deck).exists())
+
+    def test_export_streams_plain_and_gzip(self):
+        import_rows_into_deck(deck=self.deck, user=self.user, rows=self._rows("kočka", "pes"))
+        self.client.force_login(self.user)
+        url = reverse("deck_export_csv", args=[self.deck.id])
+
+        resp = self.client.get(url)
+        body = b"".join(resp.streaming_content)
+        self.assertEqual(body.decode("utf-8"), "rank,word,translation,context\r\n1,kočka,,\r\n2,pes,dog,\r\n")
+
+        resp = self.client.get(url, {"gzip": 1})
+        self.assertEqual(resp["Content-Type"], "application/gzip")
+        self.assertEqual(gzip.decompress(b"".join(resp.streaming_content)), body)
+
+        resp = self.client.get(url, {"gzip": 0})
+        self.assertNotEqual(resp["Content-Type"], "application/gzip")
+
+
+class LibraryViewTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="u")
+        self.language = Language.objects.create(code="cs", name="Czech")
+        self.cards = Flashcard.objects.bulk_create(Flashcard(language=self.language, word=f"w{i}") for i in range(5))
+        self.client.force_login(self.user)
+
+    def _add_decks(self, n, start=0):
+        now = timezone.now()
+        for i in range(start, start + n):
+            deck = Deck.objects.create(language=self.language, title=f"D{i}")
+            DeckCard.objects.bulk_create(DeckCard(deck=deck, card=c, position=j) for j, c in enumerate(self.cards))
+            apply_deck_cards_added(deck, [c.id for c in self.cards])
+            UserDeck.objects.create(user=self.user, deck=deck)
+        CardProgress.objects.get_or_create(user=self.user, card=self.cards[0], defaults={"due_at": now - timedelta(hours=2)})
+
+    def _load(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(reverse("library"))
+        return resp, len(ctx)
+
+    def test_fresh_decks_are_counted_in_one_pass(self):
+        self._add_decks(2)
+        _, few = self._load()
+        UserDeck.objects.update(cached_at=None)
+        self._add_decks(20, start=2)
+        resp, many = self._load()
+
+        self.assertEqual(few, many)
+        counts = {(ud.cached_due_count, ud.cached_new_count, ud.cached_total_in_deck) for ud in resp.context["user_decks"]}
+        self.assertEqual(counts, {(1, 4, 5)})
+        self.assertFalse(UserDeck.objects.filter(cached_at__isnull=True).exists())
+
+    def test_first_count_reads_the_primary(self):
+        self._add_decks(2)
+        UserDeck.objects.update(cached_at=None)
+        reads = []
+
+        # Tests run inside a transaction, which already keeps routed reads on
+        # the primary; record what the counting models would be routed to.
+        def db_for_read(model, **hints):
+            if model in (CardProgress, DeckCard, Deck):
+                reads.append(model)
+                return "replica_0"
+            return None
+
+        with patch.object(ReplicaRouter, "db_for_read", side_effect=db_for_read):
+            resp, _ = self._load()
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(reads, [])
+
+    @override_settings(USERDECK_COUNTS_TTL=60, USERDECK_COUNTS_REFRESH="sync")
+    def test_stale_counts_are_served_then_refreshed(self):
+        cache.clear()
+        self._add_decks(2)
+        self._load()
+        ud = UserDeck.objects.order_by("id").first()
+        UserDeck.objects.filter(id=ud.id).update(
+            cached_new_count=99, counted_at=timezone.now() - timedelta(minutes=5),
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resp, _ = self._load()
+        served = {u.id: u.cached_new_count for u in resp.context["user_decks"]}
+        self.assertEqual(served[ud.id], 99)
+
+        ud.refresh_from_db()
+        self.assertEqual(ud.cached_new_count, 4)
+        m = metrics()
+        self.assertEqual((m["hit"], m["stale"], m["miss"]), (1, 1, 2))
+
+
+@override_settings(CARD_INDEX_SIZE=2048)
+class CardIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        card_index.clear()
+        self.user = get_user_model().objects.create(username="u")
+        language = Language.objects.create(code="cs", name="Czech")
+        self.decks = [Deck.objects.create(language=language, title=f"D{i}") for i in range(2)]
+        self.cards = Flashcard.objects.bulk_create(Flashcard(language=language, word=f"w{i}") for i in range(6))
+        DeckCard.objects.bulk_create(DeckCard(deck=self.decks[0], card=c, position=i) for i, c in enumerate(self.cards[:4]))
+        DeckCard.objects.bulk_create(DeckCard(deck=self.decks[1], card=c, position=i) for i, c in enumerate(self.cards[2:]))
+        for card in self.cards[1:3]:
+            CardProgress.objects.create(user=self.user, card=card, due_at=timezone.now())
+        self.deck_ids = [d.id for d in self.decks]
+
+    def test_counts_are_patched_in_place_after_commit(self):
+        self.assertEqual(card_index.known_counts(self.user.id, self.deck_ids), {self.decks[0].id: 2, self.decks[1].id: 1})
+        self.assertEqual(card_index.new_counts(self.user.id, self.deck_ids), {self.decks[0].id: 2, self.decks[1].id: 3})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CardProgress.objects.create(user=self.user, card=self.cards[5], due_at=timezone.now())
+            DeckCard.objects.create(deck=self.decks[0], card=self.cards[5], position=9)
+            DeckCard.objects.filter(deck=self.decks[1], card=self.cards[2]).delete()
+
+        with self.assertNumQueries(0):
+            known = card_index.known_counts(self.user.id, self.deck_ids)
+        self.assertEqual(known, {self.decks[0].id: 3, self.decks[1].id: 1})
+
+    def test_other_processes_changes_force_a_rebuild(self):
+        card_index.known_counts(self.user.id, self.deck_ids)
+        # Another worker's write: the rows change and the version moves on.
+        CardProgress.objects.create(user=self.user, card=self.cards[0], due_at=timezone.now())
+        cache.incr(f"card_index:user:{self.user.id}:v")
+
+        with self.assertNumQueries(1):
+            known = card_index.known_counts(self.user.id, self.deck_ids)
+        self.assertEqual(known[self.decks[0].id], 3)
+
+    def test_known_count_rows_stay_exact_while_the_index_is_on(self):
+        with override_settings(CARD_INDEX_SIZE=0):
+            self.assertEqual(known_counts(self.user, self.deck_ids), {self.decks[0].id: 2, self.decks[1].id: 1})
+
+        DeckCard.objects.filter(deck=self.decks[1], card=self.cards[2]).delete()
+
+        with override_settings(CARD_INDEX_SIZE=0):
+            self.assertEqual(known_counts(self.user, self.deck_ids), {self.decks[0].id: 2, self.decks[1].id: 0})
+
+    @override_settings(CARD_INDEX_SIZE=1)
+    def test_lru_keeps_the_most_recent_bitmap(self):
+        card_index.deck_bitmaps([self.decks[0].id])
+        card_index.deck_bitmaps([self.decks[1].id])
+        self.assertEqual(card_index.stats()["entries"], 1)
+        with self.assertNumQueries(0):
+            card_index.deck_bitmaps([self.decks[1].id])
+        with self.assertNumQueries(1):
+            card_index.deck_bitmaps([self.decks[0].id])
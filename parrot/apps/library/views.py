@@ -1,15 +1,22 @@
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse, HttpResponseForbidden
+from django.http import HttpResponse, HttpResponseForbidden, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
 from django.db.models import Exists, OuterRef, Max
-from django.db import transaction
+from django.db import DEFAULT_DB_ALIAS, transaction
 
+from apps.core.db_router import use_replica
 from apps.core.models import Deck, Flashcard, DeckCard
 from apps.library.models import UserDeck
-from apps.library.services.counts import compute_due_new_counts
-from apps.library.services.csv_io import parse_csv_bytes, import_rows_into_deck, export_deck_to_csv_text
+from apps.library.services.counts import (
+    COUNT_FIELDS,
+    add_due_this_hour,
+    compute_counts,
+    roll_forward,
+)
+from apps.library.services.freshness import HIT, MISS, STALE, classify, record, schedule_refresh
+from apps.library.services.csv_io import gzip_stream, import_csv_into_deck, iter_deck_csv
 from apps.library.forms import UserDeckSettingsForm, DeckCreateForm, CardCreateForm, CardEditForm, DeckVisibilityForm, DeckImportCSVForm
 from apps.study.models import StudySession
 
@@ -21,6 +28,7 @@ def _require_deck_owner(request, deck: Deck):
 
 
 @login_required
+@use_replica
 def library(request):
     user_decks = (
         UserDeck.objects.select_related("deck", "deck__language")
@@ -37,21 +45,33 @@ def library(request):
         .order_by("deck__language__name", "deck__title")
     )
 
+    user_decks = list(user_decks)
+    now = timezone.now()
+    kinds = {ud.id: classify(ud, now) for ud in user_decks}
+    missing = [ud for ud in user_decks if kinds[ud.id] == MISS]
+    # Rolling is only for display; the stored counters stay valid for their
+    # own watermark, so there is nothing to write back for them.
     for ud in user_decks:
-        if ud.cached_at is None:
-            due, new, total = compute_due_new_counts(request.user, ud.deck)
-            ud.cached_due_count = due
-            ud.cached_new_count = new
-            ud.cached_total_in_deck = total
-            ud.cached_at = timezone.now()
-            ud.save(
-                update_fields=[
-                    "cached_due_count",
-                    "cached_new_count",
-                    "cached_total_in_deck",
-                    "cached_at",
-                ]
-            )
+        if kinds[ud.id] != MISS:
+            roll_forward(ud, now)
+    # Decks already carry their card totals, so one grouped progress query
+    # and one bulk_update cover every never-counted deck. The result becomes
+    # the stored baseline for the incremental counters, so it is read from
+    # the primary: replica lag would otherwise persist until the TTL.
+    if missing:
+        totals = dict(
+            Deck.objects.using(DEFAULT_DB_ALIAS)
+            .filter(id__in={ud.deck_id for ud in missing})
+            .values_list("id", "card_count")
+        )
+        UserDeck.objects.bulk_update(
+            compute_counts(missing, now, totals=totals, using=DEFAULT_DB_ALIAS), COUNT_FIELDS,
+        )
+    add_due_this_hour(user_decks, now)
+    # Stale counters are served now and recounted in the background.
+    schedule_refresh([ud.id for ud in user_decks if kinds[ud.id] == STALE])
+    for kind in (HIT, STALE, MISS):
+        record(kind, sum(1 for k in kinds.values() if k == kind))
 
     return render(request, "library/library.html", {"user_decks": user_decks})
 
@@ -113,6 +133,7 @@ def deck_create(request):
 
 
 @login_required
+@use_replica
 def deck_manage(request, deck_id: int):
     deck = get_object_or_404(Deck.objects.select_related("language"), id=deck_id)
 
@@ -199,16 +220,22 @@ def deck_visibility(request, deck_id: int):
 
 
 @login_required
+@use_replica
 def deck_export_csv(request, deck_id: int):
     deck = get_object_or_404(Deck.objects.select_related("language"), id=deck_id)
 
     if deck.created_by_id != request.user.id:
         return HttpResponseForbidden("Only the creator can export this deck.")
 
-    csv_text = export_deck_to_csv_text(deck)
-
     filename = f"{deck.language.code}_{deck.title}".replace(" ", "_") + ".csv"
-    resp = HttpResponse(csv_text, content_type="text/csv; charset=utf-8")
+    content = iter_deck_csv(deck)
+    content_type = "text/csv; charset=utf-8"
+    if request.GET.get("gzip") == "1":
+        content = gzip_stream(content)
+        content_type = "application/gzip"
+        filename += ".gz"
+
+    resp = StreamingHttpResponse(content, content_type=content_type)
     resp["Content-Disposition"] = f'attachment; filename="{filename}"'
     return resp
 
@@ -224,11 +251,10 @@ def deck_import_csv(request, deck_id: int):
         form = DeckImportCSVForm(request.POST, request.FILES)
         if form.is_valid():
             f = form.cleaned_data["csv_file"]
-            rows, errors = parse_csv_bytes(f.read())
+            stats, errors = import_csv_into_deck(deck=deck, user=request.user, chunks=f.chunks())
             if errors:
                 return render(request, "library/deck_import.html", {"deck": deck, "form": form, "errors": errors})
 
-            stats = import_rows_into_deck(deck=deck, user=request.user, rows=rows)
             messages.success(
                 request,
                 f"Imported: {stats['created']} created, {stats['attached']} attached, {stats['skipped']} skipped."
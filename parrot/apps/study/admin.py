@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import CardProgress, StudySession, ReviewLog
+from .models import CardProgress, StudySession, ReviewLog, SchedulerParams
 admin.site.register(CardProgress)
 admin.site.register(StudySession)
 admin.site.register(ReviewLog)
+admin.site.register(SchedulerParams)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class StudyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.study'
+
+    def ready(self):
+        from apps.study import signals  # noqa: F401
@@ -0,0 +1,176 @@
+"""
+Async versions of the study endpoints, routed instead of ``views`` when
+STUDY_ASYNC_VIEWS is on (the ASGI entry point turns it on).
+
+Plain reads use the async ORM. Anything that has to hold row locks runs as
+one sync function through ``sync_to_async``, because ``transaction.atomic``
+and ``select_for_update`` only work in sync code.
+"""
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.db import transaction
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
+from django.shortcuts import get_object_or_404, render
+
+from apps.core.models import Deck
+from apps.study.models import StudySession
+from apps.study.services.cards import acurrent_card, aupcoming_cards, current_card
+from apps.study.services.grading import GradeEntry, apply_grades
+from apps.study.services.sessions import start_session
+from apps.study.views import MAX_BATCH_ENTRIES, PREFETCH_DEFAULT, PREFETCH_MAX, _parse_reviewed_at
+
+
+def login_required(view):
+    # django.contrib.auth's decorator only wraps async views from Django 5.0.
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # Resolving request.user loads the session and user; later reads are cached.
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def _aget_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+
+
+@transaction.atomic
+def _grade_locked(session_id, user, entries):
+    session = get_object_or_404(StudySession.objects.select_for_update(), id=session_id, user=user)
+    applied = apply_grades(session, user, entries) if session.status == "active" else 0
+    return session, applied
+
+
+@transaction.atomic
+def _grade_one_locked(session_id, user, entry):
+    # Same outcomes as views.grade_card: a stale index/nonce applies nothing
+    # and re-renders the current card; a finished queue renders "done".
+    session, _ = _grade_locked(session_id, user, [entry])
+    card = current_card(session) if session.status == "active" else None
+    return session, card
+
+
+@login_required
+async def study_start(request, deck_id: int):
+    deck = await _aget_or_404(Deck.objects.all(), id=deck_id)
+
+    existing = await (
+        StudySession.objects
+        .filter(user=request.user, deck=deck, status="active")
+        .order_by("-started_at")
+        .afirst()
+    )
+
+    if existing:
+        card = await acurrent_card(existing)
+        if card:
+            return render(request, "study/study.html", {
+                "deck": deck,
+                "session": existing,
+                "card": card,
+                "resumed": True,
+            })
+
+    session = await sync_to_async(start_session)(request.user, deck, endless=request.GET.get("endless") == "1")
+    if session is None:
+        return render(request, "study/empty.html", {"deck": deck})
+
+    card = await acurrent_card(session)
+    if card is None:
+        return render(request, "study/empty.html", {"deck": deck})
+    return render(request, "study/study.html", {"deck": deck, "session": session, "card": card, "resumed": False})
+
+
+@login_required
+async def grade_card(request, session_id: int):
+    if request.method != "POST":
+        return HttpResponseBadRequest("POST required")
+
+    session = await _aget_or_404(StudySession.objects.all(), id=session_id, user=request.user)
+
+    if session.status != "active":
+        return render(request, "study/done_partial.html")
+
+    try:
+        entry = GradeEntry(
+            index=int(request.POST["index"]),
+            nonce=request.POST["nonce"],
+            quality=int(request.POST["quality"]),
+        )
+    except (KeyError, ValueError):
+        return HttpResponseBadRequest("Bad payload")
+
+    session, card = await sync_to_async(_grade_one_locked)(session.id, request.user, entry)
+    if card is None:
+        return render(request, "study/done_partial.html")
+    return render(request, "study/card_partial.html", {"session": session, "card": card})
+
+
+@login_required
+async def grade_batch(request, session_id: int):
+    if request.method != "POST":
+        return HttpResponseBadRequest("POST required")
+
+    session = await _aget_or_404(StudySession.objects.all(), id=session_id, user=request.user)
+
+    try:
+        payload = json.loads(request.body)
+        entries = [
+            GradeEntry(
+                index=int(e["index"]),
+                nonce=str(e["nonce"]),
+                quality=int(e["quality"]),
+                reviewed_at=_parse_reviewed_at(e.get("reviewed_at")),
+            )
+            for e in payload["entries"]
+        ]
+    except (KeyError, TypeError, ValueError):
+        return HttpResponseBadRequest("Bad payload")
+
+    if len(entries) > MAX_BATCH_ENTRIES:
+        return HttpResponseBadRequest(f"At most {MAX_BATCH_ENTRIES} entries per batch")
+
+    applied = 0
+    if session.status == "active":
+        session, applied = await sync_to_async(_grade_locked)(session.id, request.user, entries)
+
+    return JsonResponse({
+        "applied": applied,
+        "index": session.index,
+        "nonce": session.current_nonce,
+        "finished": session.status != "active",
+    })
+
+
+@login_required
+async def session_cards(request, session_id: int):
+    session = await _aget_or_404(StudySession.objects.all(), id=session_id, user=request.user)
+
+    try:
+        n = min(int(request.GET.get("n", PREFETCH_DEFAULT)), PREFETCH_MAX)
+    except ValueError:
+        return HttpResponseBadRequest("Bad n")
+
+    cards = await aupcoming_cards(session, n) if session.status == "active" else []
+    return JsonResponse({
+        "index": session.index,
+        "nonce": session.current_nonce,
+        "finished": session.status != "active",
+        "cards": [
+            {
+                "index": index,
+                "id": card.id,
+                "word": card.word,
+                "translation": card.translation,
+                "context": card.context_sentence,
+            }
+            for index, card in cards
+        ],
+    })
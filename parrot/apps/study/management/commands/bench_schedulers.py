@@ -0,0 +1,64 @@
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.study.models import CardProgress
+from apps.study.services.algorithms import SCHEDULERS, forecast_load
+
+
+class Command(BaseCommand):
+    help = "Compare registered schedulers: per-review update cost and predicted daily review load."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--algorithm", action="append", help="Scheduler name (repeatable, default all)")
+        parser.add_argument("--reviews", type=int, default=20000, help="Scalar updates to time (default 20000)")
+        parser.add_argument("--batch", type=int, default=1_000_000, help="Cards per batch update (default 1000000)")
+        parser.add_argument("--cards", type=int, default=10000, help="Cards in the load forecast (default 10000)")
+        parser.add_argument("--new-per-day", type=int, default=20, help="New cards introduced per day (default 20)")
+        parser.add_argument("--days", type=int, default=365, help="Forecast horizon in days (default 365)")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **opts):
+        names = opts["algorithm"] or sorted(SCHEDULERS)
+        unknown = [n for n in names if n not in SCHEDULERS]
+        if unknown:
+            raise CommandError(f"Unknown scheduler(s): {', '.join(unknown)}. Known: {', '.join(sorted(SCHEDULERS))}")
+
+        introduced = np.arange(opts["cards"]) // max(1, opts["new_per_day"])
+        self.stdout.write(
+            f"{'algorithm':<10} {'scalar us/review':>17} {'batch ns/review':>16} "
+            f"{'mean reviews/day':>17} {'peak reviews/day':>17} {'total reviews':>14}"
+        )
+        for name in names:
+            scheduler = SCHEDULERS[name]
+            scalar_us = self._time_scalar(scheduler, opts["reviews"], opts["seed"])
+            batch_ns = self._time_batch(scheduler, opts["batch"], opts["seed"])
+            load = forecast_load(scheduler, introduced, opts["days"], seed=opts["seed"])
+            self.stdout.write(
+                f"{name:<10} {scalar_us:>17.2f} {batch_ns:>16.2f} "
+                f"{load.mean():>17.1f} {load.max():>17d} {load.sum():>14d}"
+            )
+
+    def _time_scalar(self, scheduler, n, seed):
+        rng = random.Random(seed)
+        now = timezone.now()
+        # Four reviews per card keeps intervals (and due dates) in range.
+        progress = [CardProgress(algorithm=scheduler.name, due_at=now) for _ in range(n // 4 + 1)]
+        qualities = [rng.choice([1, 3, 4, 4, 5]) for _ in range(n)]
+        t0 = time.perf_counter()
+        for i, q in enumerate(qualities):
+            scheduler.update(progress[i // 4], q, now=now)
+        return (time.perf_counter() - t0) / max(1, n) * 1e6
+
+    def _time_batch(self, scheduler, n, seed):
+        rng = np.random.default_rng(seed)
+        state = scheduler.initial_state(n)
+        quality = rng.choice([1, 3, 4, 4, 5], size=n)
+        elapsed = rng.uniform(0, 30, size=n)
+        state, _ = scheduler.update_batch(state, quality, elapsed)
+        t0 = time.perf_counter()
+        scheduler.update_batch(state, quality, elapsed)
+        return (time.perf_counter() - t0) / max(1, n) * 1e9
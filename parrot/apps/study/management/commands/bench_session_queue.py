@@ -0,0 +1,134 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.core.models import Language, Deck, Flashcard, DeckCard
+from apps.library.models import UserDeck
+from apps.study.models import CardProgress
+from apps.study.services import due_index
+from apps.study.services.selector import select_session_queue
+
+
+def _legacy_select_session_queue(user, deck, chunk_size, new_ratio, daily_new_limit, new_today):
+    now = timezone.now()
+    due_ids = list(
+        Flashcard.objects.filter(
+            deck_cards__deck=deck,
+            progress__user=user,
+            progress__due_at__lte=now,
+        ).distinct().order_by("progress__due_at", "id").values_list("id", flat=True)[:chunk_size]
+    )
+    if len(due_ids) >= chunk_size:
+        return due_ids
+    new_target = min(int(round(chunk_size * new_ratio)), chunk_size - len(due_ids), max(0, daily_new_limit - new_today))
+    if new_target <= 0:
+        return due_ids
+    new_ids = list(
+        Flashcard.objects.filter(deck_cards__deck=deck)
+        .exclude(progress__user=user)
+        .distinct()
+        .order_by(F("frequency_rank").asc(nulls_last=True), "id")
+        .values_list("id", flat=True)[:new_target]
+    )
+    return due_ids + new_ids
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark select_session_queue latency as the user's progress row count grows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--deck-size", type=int, default=10000, help="Cards in the studied deck (default 10000)")
+        parser.add_argument(
+            "--progress",
+            default="0,10000,50000",
+            help="Comma-separated counts of progress rows outside the deck (default 0,10000,50000)",
+        )
+        parser.add_argument("--repeat", type=int, default=20, help="Timed runs per step (default 20)")
+        parser.add_argument("--chunk-size", type=int, default=20)
+        parser.add_argument("--legacy", action="store_true", help="Also time the previous two-query selector")
+
+    def handle(self, *args, **opts):
+        deck_size: int = opts["deck_size"]
+        repeat: int = opts["repeat"]
+        chunk_size: int = opts["chunk_size"]
+        try:
+            steps = sorted({int(s) for s in opts["progress"].split(",") if s.strip()})
+        except ValueError:
+            raise CommandError("--progress must be a comma-separated list of integers.")
+
+        try:
+            with transaction.atomic():
+                self._run(deck_size, steps, repeat, chunk_size, opts["legacy"])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, deck_size, steps, repeat, chunk_size, legacy):
+        now = timezone.now()
+        language = Language.objects.create(code="bench-queue", name="Bench")
+        deck = Deck.objects.create(language=language, title="Bench deck")
+        user = get_user_model().objects.create(username="bench-queue-user")
+        UserDeck.objects.create(user=user, deck=deck)
+
+        total_cards = deck_size + max(steps)
+        Flashcard.objects.bulk_create(
+            [Flashcard(language=language, word=f"w{i}", frequency_rank=i) for i in range(total_cards)],
+            batch_size=2000,
+        )
+        card_ids = list(Flashcard.objects.filter(language=language).order_by("frequency_rank").values_list("id", flat=True))
+        deck_ids, other_ids = card_ids[:deck_size], card_ids[deck_size:]
+        DeckCard.objects.bulk_create(
+            [DeckCard(deck=deck, card_id=cid, position=i, card_rank=i) for i, cid in enumerate(deck_ids)],
+            batch_size=2000,
+        )
+
+        # Half of the deck is already in progress and stays fixed; each step only
+        # adds progress rows for cards outside the deck, as for a user with many decks.
+        self._add_progress(user, deck_ids[: deck_size // 2], now)
+        have = 0
+        kwargs = dict(chunk_size=chunk_size, new_ratio=0.2, daily_new_limit=1000, new_today=0)
+        for step in steps:
+            self._add_progress(user, other_ids[have:step], now)
+            have = step
+
+            line = f"other progress={step:>8}  new: {self._time(select_session_queue, user, deck, repeat, kwargs):8.2f} ms"
+            if legacy:
+                line += f"  legacy: {self._time(_legacy_select_session_queue, user, deck, repeat, kwargs):8.2f} ms"
+            self.stdout.write(line)
+
+        self.stdout.write(self.style.SUCCESS(f"Done (deck size {deck_size}, median of {repeat} runs)."))
+
+    def _add_progress(self, user, card_ids, now):
+        CardProgress.objects.bulk_create(
+            [
+                CardProgress(
+                    user=user,
+                    card_id=cid,
+                    due_at=now + timedelta(days=(i % 30) - 5),
+                    state="review",
+                    repetitions=2,
+                )
+                for i, cid in enumerate(card_ids)
+            ],
+            batch_size=2000,
+        )
+        due_index.rebuild([user.id])
+
+    def _time(self, fn, user, deck, repeat, kwargs):
+        fn(user=user, deck=deck, **kwargs)
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn(user=user, deck=deck, **kwargs)
+            samples.append((time.perf_counter() - t0) * 1000)
+        return statistics.median(samples)
@@ -0,0 +1,95 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count, Max
+
+from apps.study.models import ReviewLog, SchedulerParams
+from apps.study.services.fsrs_optimizer import fit_user, store_params
+
+
+def _init_worker():
+    django.setup()
+
+
+def _fit(user_id, upto_id, init, options):
+    # Workers only read; the parent writes results so SQLite's single writer
+    # never sees contention.
+    try:
+        return (user_id, upto_id, *fit_user(user_id, upto_id=upto_id, init=init, **options))
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Fit per-user FSRS weights from ReviewLog history and store them in SchedulerParams."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", help="User id to fit (repeatable)")
+        parser.add_argument("--all", action="store_true", help="Fit every user with enough reviews")
+        parser.add_argument("--min-reviews", type=int, default=200, help="Skip users with fewer reviews (default 200)")
+        parser.add_argument("--workers", type=int, default=1, help="Worker processes (default 1)")
+        parser.add_argument("--chunk-size", type=int, default=20000, help="Reviews per streamed chunk (default 20000)")
+        parser.add_argument("--epochs", type=int, default=5, help="Passes over each user's history (default 5)")
+        parser.add_argument("--lr", type=float, default=0.04, help="Adam learning rate (default 0.04)")
+        parser.add_argument("--refit", action="store_true", help="Refit users with no new reviews since their last fit")
+
+    def handle(self, *args, **opts):
+        if not opts["user"] and not opts["all"]:
+            raise CommandError("Pass --user or --all.")
+
+        logs = ReviewLog.objects.all()
+        if opts["user"]:
+            logs = logs.filter(user_id__in=opts["user"])
+        totals = (
+            logs.values("user_id")
+            .annotate(n=Count("id"), upto=Max("id"))
+            .filter(n__gte=opts["min_reviews"])
+            .order_by("user_id")
+        )
+        fitted = {
+            user_id: (last_review_id, params.get("w"))
+            for user_id, last_review_id, params in SchedulerParams.objects
+            .filter(algorithm="fsrs")
+            .values_list("user_id", "last_review_id", "params")
+        }
+        # Runs are resumable: users already fitted up to their latest review
+        # are skipped, and refits warm-start from the stored weights.
+        jobs = [
+            (row["user_id"], row["upto"], fitted.get(row["user_id"], (0, None))[1])
+            for row in totals
+            if opts["refit"] or fitted.get(row["user_id"], (0, None))[0] < row["upto"]
+        ]
+        if not jobs:
+            self.stdout.write("Nothing to fit.")
+            return
+
+        options = {"chunk_size": opts["chunk_size"], "epochs": opts["epochs"], "lr": opts["lr"]}
+        self.stdout.write(f"Fitting {len(jobs)} user(s) with {opts['workers']} worker(s)")
+        t0 = time.perf_counter()
+
+        if opts["workers"] <= 1:
+            for done, (user_id, upto_id, init) in enumerate(jobs, start=1):
+                result = fit_user(user_id, upto_id=upto_id, init=init, **options)
+                self._store(done, len(jobs), user_id, upto_id, *result)
+        else:
+            # Forked workers must not inherit the parent's open connections.
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=opts["workers"], initializer=_init_worker)
+            try:
+                futures = [pool.submit(_fit, *job, options) for job in jobs]
+                for done, future in enumerate(as_completed(futures), start=1):
+                    self._store(done, len(jobs), *future.result())
+            except KeyboardInterrupt:
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise CommandError("Interrupted; rerun to resume with the remaining users.")
+            pool.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.perf_counter() - t0:.1f}s"))
+
+    def _store(self, done, total, user_id, upto_id, weights, loss, reviews):
+        store_params(user_id, weights, loss, reviews, upto_id)
+        loss_text = "n/a" if loss is None else f"{loss:.4f}"
+        self.stdout.write(f"[{done}/{total}] user {user_id}: {reviews} reviews, log loss {loss_text}")
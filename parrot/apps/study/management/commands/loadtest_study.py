@@ -0,0 +1,319 @@
+import http.client
+import json
+import os
+import random
+import re
+import secrets
+import shlex
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.core.models import Language, Deck, Flashcard, DeckCard
+from apps.library.models import UserDeck
+
+FIXTURE_LANGUAGE = "loadtest"
+FIXTURE_USER_PREFIX = "loadtest-"
+
+SERVER_COMMANDS = {
+    "wsgi": "gunicorn parrot.wsgi:application --worker-class gthread --workers {workers} --threads {threads} "
+            "--bind 127.0.0.1:{port}",
+    "asgi": "uvicorn parrot.asgi:application --workers {workers} --host 127.0.0.1 --port {port} --no-access-log",
+}
+
+GRADE_URL_RE = re.compile(r'hx-post="/study/grade/(\d+)/"')
+INDEX_RE = re.compile(r'name="index" value="(\d+)"')
+NONCE_RE = re.compile(r'name="nonce" value="([^"]+)"')
+
+
+def _tree_rss_bytes(pid):
+    # Sum over the server and its worker processes (Linux only).
+    total, stack = 0, [pid]
+    while stack:
+        p = stack.pop()
+        try:
+            with open(f"/proc/{p}/statm") as f:
+                total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+            for task in os.listdir(f"/proc/{p}/task"):
+                with open(f"/proc/{p}/task/{task}/children") as f:
+                    stack.extend(int(c) for c in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class _VirtualUser(threading.Thread):
+    """Starts a session and grades cards in a loop over one keep-alive connection."""
+
+    def __init__(self, host, port, deck_id, cookie, csrf, measure_from, stop_at):
+        super().__init__(daemon=True)
+        self.host, self.port, self.deck_id = host, port, deck_id
+        self.headers = {"Cookie": cookie, "X-CSRFToken": csrf}
+        self.measure_from, self.stop_at = measure_from, stop_at
+        self.samples = []  # (endpoint, seconds)
+        self.errors = 0
+        self.empty = 0
+        self.conn = None
+
+    def _request(self, endpoint, method, path, body=None):
+        headers = dict(self.headers)
+        if body is not None:
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        t0 = time.perf_counter()
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            text = response.read().decode("utf-8", "replace")
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.conn = None
+            text, status = "", 0
+        elapsed = time.perf_counter() - t0
+        if time.perf_counter() >= self.measure_from:
+            self.samples.append((endpoint, elapsed))
+            if status != 200:
+                self.errors += 1
+        return text if status == 200 else None
+
+    def run(self):
+        session = None
+        while time.perf_counter() < self.stop_at:
+            if session is None:
+                text = self._request("study_start", "GET", f"/study/start/{self.deck_id}/")
+            else:
+                session_id, index, nonce = session
+                body = f"index={index}&nonce={nonce}&quality={random.choice((3, 4, 5))}"
+                text = self._request("grade_card", "POST", f"/study/grade/{session_id}/", body)
+            session = self._parse(text)
+
+    def _parse(self, text):
+        if not text:
+            return None
+        grade, index, nonce = GRADE_URL_RE.search(text), INDEX_RE.search(text), NONCE_RE.search(text)
+        if not (grade and index and nonce):
+            if "No cards available" in text:
+                self.empty += 1
+            return None
+        return grade.group(1), index.group(1), nonce.group(1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the study flow (start + grade) under WSGI (gunicorn, sync views) and ASGI "
+        "(uvicorn, async views): requests/sec, latency percentiles and server RSS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--servers", default="wsgi,asgi", help="Comma-separated servers to run (default wsgi,asgi)")
+        parser.add_argument("--workers", type=int, default=2, help="Server worker processes (default 2)")
+        parser.add_argument("--threads", type=int, default=4, help="Threads per gunicorn worker (default 4)")
+        parser.add_argument("--wsgi-cmd", default=SERVER_COMMANDS["wsgi"], help="WSGI server command template")
+        parser.add_argument("--asgi-cmd", default=SERVER_COMMANDS["asgi"], help="ASGI server command template")
+        parser.add_argument("--url", help="Load an already running server at this host:port instead of starting one")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--users", type=int, default=32, help="Concurrent virtual users (default 32)")
+        parser.add_argument("--duration", type=float, default=30, help="Measured seconds per server (default 30)")
+        parser.add_argument("--warmup", type=float, default=3, help="Unmeasured seconds before each run (default 3)")
+        parser.add_argument("--cards", type=int, default=2000, help="Cards in the fixture deck (default 2000)")
+        parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file")
+        parser.add_argument("--cleanup", action="store_true", help="Delete the fixture users and deck afterwards")
+
+    def handle(self, *args, **opts):
+        servers = [s.strip() for s in opts["servers"].split(",") if s.strip()]
+        unknown = set(servers) - set(SERVER_COMMANDS)
+        if unknown:
+            raise CommandError(f"Unknown server(s): {', '.join(sorted(unknown))}. Choose from wsgi, asgi.")
+        if opts["url"] and len(servers) != 1:
+            raise CommandError("--url loads one running server; pass a single --servers label for it.")
+        if connection.vendor == "sqlite":
+            self.stderr.write(
+                "SQLite serialises writes, so grading will mostly measure lock waits; "
+                "point DATABASE_URL at PostgreSQL for meaningful numbers."
+            )
+
+        deck, users = self._fixtures(opts["users"], opts["cards"])
+        results = []
+        try:
+            for server in servers:
+                # Every run starts from fresh sessions so the two servers see the same work.
+                cookies = self._login(users)
+                result = self._run_server(server, deck, cookies, opts)
+                results.append(result)
+                self._report(result)
+        finally:
+            if opts["cleanup"]:
+                get_user_model().objects.filter(username__startswith=FIXTURE_USER_PREFIX).delete()
+                Language.objects.filter(code=FIXTURE_LANGUAGE).delete()
+
+        if opts["json_path"]:
+            Path(opts["json_path"]).write_text(json.dumps(results, indent=2), encoding="utf-8")
+            self.stdout.write(f"Wrote {opts['json_path']}")
+        self.stdout.write(self.style.SUCCESS("Done."))
+
+    def _fixtures(self, n_users, n_cards):
+        language, _ = Language.objects.get_or_create(code=FIXTURE_LANGUAGE, defaults={"name": "Load test"})
+        deck, _ = Deck.objects.get_or_create(language=language, title="Load test")
+        have = DeckCard.objects.filter(deck=deck).count()
+        if have < n_cards:
+            cards = Flashcard.objects.bulk_create(
+                [
+                    Flashcard(language=language, word=f"lt{i}", translation=f"t{i}", frequency_rank=i)
+                    for i in range(have, n_cards)
+                ],
+                batch_size=2000,
+            )
+            DeckCard.objects.bulk_create(
+                [DeckCard(deck=deck, card=c, position=i, card_rank=i) for i, c in enumerate(cards, start=have)],
+                batch_size=2000,
+            )
+
+        User = get_user_model()
+        users = []
+        for i in range(n_users):
+            user, created = User.objects.get_or_create(username=f"{FIXTURE_USER_PREFIX}{i}")
+            if created:
+                user.set_unusable_password()
+                user.save(update_fields=["password"])
+            users.append(user)
+        UserDeck.objects.bulk_create(
+            [UserDeck(user=u, deck=deck, daily_new_limit=n_cards, new_ratio=1.0) for u in users],
+            ignore_conflicts=True,
+        )
+        UserDeck.objects.filter(deck=deck, user__in=users).update(new_today=0, daily_new_limit=n_cards)
+        return deck, users
+
+    def _login(self, users):
+        # Write sessions directly instead of posting the login form per user.
+        cookies = []
+        for user in users:
+            store = SessionStore()
+            store[SESSION_KEY] = str(user.pk)
+            store[BACKEND_SESSION_KEY] = "django.contrib.auth.backends.ModelBackend"
+            store[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            store.create()
+            csrf = secrets.token_hex(16)
+            cookies.append((f"{settings.SESSION_COOKIE_NAME}={store.session_key}; {settings.CSRF_COOKIE_NAME}={csrf}", csrf))
+        return cookies
+
+    def _run_server(self, server, deck, cookies, opts):
+        proc = None
+        if opts["url"]:
+            host, _, port = opts["url"].rpartition(":")
+            host, port = host or "127.0.0.1", int(port)
+        else:
+            host, port = "127.0.0.1", opts["port"]
+            proc = self._start(server, opts)
+        try:
+            self._wait_ready(host, port, proc)
+            rss = []
+            t0 = time.perf_counter()
+            measure_from = t0 + opts["warmup"]
+            stop_at = measure_from + opts["duration"]
+            users = [_VirtualUser(host, port, deck.id, cookie, csrf, measure_from, stop_at) for cookie, csrf in cookies]
+            for u in users:
+                u.start()
+            while any(u.is_alive() for u in users):
+                if proc is not None and time.perf_counter() >= measure_from:
+                    rss.append(_tree_rss_bytes(proc.pid))
+                time.sleep(0.25)
+        finally:
+            if proc is not None:
+                self._stop(proc)
+
+        by_endpoint = {}
+        for u in users:
+            for endpoint, seconds in u.samples:
+                by_endpoint.setdefault(endpoint, []).append(seconds * 1000)
+        latencies = sorted(ms for values in by_endpoint.values() for ms in values)
+        result = {
+            "server": server,
+            "workers": opts["workers"],
+            "threads": opts["threads"] if server == "wsgi" else None,
+            "users": len(users),
+            "duration_s": opts["duration"],
+            "requests": len(latencies),
+            "rps": len(latencies) / opts["duration"],
+            "errors": sum(u.errors for u in users),
+            "empty_queues": sum(u.empty for u in users),
+            "p50_ms": _percentile(latencies, 0.50),
+            "p99_ms": _percentile(latencies, 0.99),
+            "endpoints": {
+                endpoint: {"requests": len(v), "p50_ms": _percentile(sorted(v), 0.50), "p99_ms": _percentile(sorted(v), 0.99)}
+                for endpoint, v in sorted(by_endpoint.items())
+            },
+            "rss_peak_mib": max(rss) / 2**20 if rss else None,
+            "rss_mean_mib": sum(rss) / len(rss) / 2**20 if rss else None,
+        }
+        return result
+
+    def _start(self, server, opts):
+        template = opts[f"{server}_cmd"]
+        cmd = shlex.split(template.format(workers=opts["workers"], threads=opts["threads"], port=opts["port"]))
+        if shutil.which(cmd[0]) is None:
+            raise CommandError(f"{cmd[0]} is not installed (pip install {cmd[0]}), or pass --{server}-cmd.")
+        env = {**os.environ, "STUDY_ASYNC_VIEWS": "1" if server == "asgi" else "0"}
+        if server == "asgi":
+            env["DJANGO_CONN_MAX_AGE"] = "0"
+        self.stdout.write(f"Starting {server}: {' '.join(cmd)}")
+        return subprocess.Popen(
+            cmd,
+            cwd=settings.BASE_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+
+    def _wait_ready(self, host, port, proc, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if proc is not None and proc.poll() is not None:
+                raise CommandError(f"Server exited with status {proc.returncode} before accepting requests.")
+            try:
+                conn = http.client.HTTPConnection(host, port, timeout=2)
+                conn.request("GET", "/accounts/login/")
+                if conn.getresponse().status < 500:
+                    return
+            except OSError:
+                pass
+            time.sleep(0.2)
+        raise CommandError(f"Server at {host}:{port} did not answer within {timeout}s.")
+
+    def _stop(self, proc):
+        try:
+            os.killpg(proc.pid, signal.SIGTERM)
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+        except ProcessLookupError:
+            pass
+
+    def _report(self, r):
+        rss = "n/a" if r["rss_peak_mib"] is None else f"{r['rss_peak_mib']:.0f} MiB peak / {r['rss_mean_mib']:.0f} MiB mean"
+        shape = f"{r['workers']}w" + (f"x{r['threads']}t" if r["threads"] else "")
+        self.stdout.write(
+            f"{r['server']:<5} {shape:<7} {r['rps']:>8.1f} req/s  p50 {r['p50_ms']:>7.1f} ms  "
+            f"p99 {r['p99_ms']:>7.1f} ms  errors {r['errors']}  server RSS {rss}"
+        )
+        for endpoint, e in r["endpoints"].items():
+            self.stdout.write(f"      {endpoint:<12} {e['requests']:>7} req  p50 {e['p50_ms']:>7.1f} ms  p99 {e['p99_ms']:>7.1f} ms")
+        if r["empty_queues"]:
+            self.stderr.write(f"      {r['empty_queues']} start(s) found no cards; raise --cards for longer runs.")
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.27 on 2026-10-18 05:58
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reviewlog',
+            name='reviewed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.27 on 2026-10-18 05:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0002_reviewlog_reviewed_at_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studysession',
+            name='cards',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='studysession',
+            name='cards_stale',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.27 on 2026-10-18 06:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('study', '0003_studysession_cards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchedulerParams',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('algorithm', models.CharField(max_length=16)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('loss', models.FloatField(blank=True, null=True)),
+                ('reviews', models.PositiveIntegerField(default=0)),
+                ('last_review_id', models.BigIntegerField(default=0)),
+                ('fitted_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='reviewlog',
+            index=models.Index(fields=['user', 'card', 'reviewed_at'], name='study_revie_user_id_d8e4d7_idx'),
+        ),
+        migrations.AddField(
+            model_name='schedulerparams',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scheduler_params', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='schedulerparams',
+            constraint=models.UniqueConstraint(fields=('user', 'algorithm'), name='uniq_user_scheduler_params'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.27 on 2026-10-18 06:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill(apps, schema_editor):
+    qn = schema_editor.connection.ops.quote_name
+    DeckDue = apps.get_model("study", "DeckDue")
+    CardProgress = apps.get_model("study", "CardProgress")
+    DeckCard = apps.get_model("core", "DeckCard")
+    UserDeck = apps.get_model("library", "UserDeck")
+    schema_editor.execute(
+        f"INSERT INTO {qn(DeckDue._meta.db_table)} (user_id, deck_id, card_id, due_at) "
+        f"SELECT p.user_id, dc.deck_id, p.card_id, p.due_at "
+        f"FROM {qn(CardProgress._meta.db_table)} p "
+        f"JOIN {qn(DeckCard._meta.db_table)} dc ON dc.card_id = p.card_id "
+        f"JOIN {qn(UserDeck._meta.db_table)} ud ON ud.user_id = p.user_id AND ud.deck_id = dc.deck_id"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0002_deck_card_count'),
+        ('library', '0004_userdeck_counted_at'),
+        ('study', '0004_scheduler_params'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeckDue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('due_at', models.DateTimeField()),
+                ('card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.flashcard')),
+                ('deck', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.deck')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'deck', 'due_at', 'card'], name='study_deckdue_user_deck_due')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='deckdue',
+            constraint=models.UniqueConstraint(fields=('user', 'deck', 'card'), name='uniq_user_deck_card_due'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
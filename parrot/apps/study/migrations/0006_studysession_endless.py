@@ -0,0 +1,23 @@
+# Generated by Django 4.2.27 on 2026-10-18 06:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('study', '0005_deckdue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studysession',
+            name='endless',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='studysession',
+            name='queue_offset',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -50,6 +50,14 @@ class StudySession(models.Model):
 
     queue = models.JSONField(default=list)
     index = models.PositiveIntegerField(default=0)
+    # Endless sessions refill the queue as it runs low and drop the graded
+    # prefix; queue[0] is then position queue_offset. Positions (index, the
+    # grading API) stay absolute.
+    endless = models.BooleanField(default=False)
+    queue_offset = models.PositiveIntegerField(default=0)
+
+    cards = models.JSONField(default=dict, blank=True)
+    cards_stale = models.BooleanField(default=False)
 
     current_nonce = models.CharField(max_length=36, default="", blank=True)
 
@@ -62,6 +70,17 @@ class StudySession(models.Model):
     def rotate_nonce(self):
         self.current_nonce = str(uuid.uuid4())
 
+    @property
+    def queue_end(self) -> int:
+        return self.queue_offset + len(self.queue)
+
+    def card_id_at(self, index: int) -> int:
+        return self.queue[index - self.queue_offset]
+
+    def pending(self) -> list[int]:
+        """Card ids from the current position to the end of the queue."""
+        return self.queue[self.index - self.queue_offset:]
+
 
 class ReviewLog(models.Model):
     session = models.ForeignKey(StudySession, on_delete=models.SET_NULL, null=True, blank=True, related_name="reviews")
@@ -70,7 +89,7 @@ class ReviewLog(models.Model):
     card = models.ForeignKey("core.Flashcard", on_delete=models.CASCADE, related_name="review_logs")
 
     quality = models.PositiveSmallIntegerField()
-    reviewed_at = models.DateTimeField(auto_now_add=True)
+    reviewed_at = models.DateTimeField(default=timezone.now)
 
     due_before = models.DateTimeField(null=True, blank=True)
     due_after = models.DateTimeField(null=True, blank=True)
@@ -82,5 +101,44 @@ class ReviewLog(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=["user", "reviewed_at"]),
-            models.Index(fields=["user", "deck", "reviewed_at"])
-        ]
\ No newline at end of file
+            models.Index(fields=["user", "deck", "reviewed_at"]),
+            models.Index(fields=["user", "card", "reviewed_at"]),
+        ]
+
+
+class SchedulerParams(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="scheduler_params")
+    algorithm = models.CharField(max_length=16)
+    params = models.JSONField(default=dict, blank=True)
+
+    loss = models.FloatField(null=True, blank=True)
+    reviews = models.PositiveIntegerField(default=0)
+    last_review_id = models.BigIntegerField(default=0)
+    fitted_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "algorithm"], name="uniq_user_scheduler_params"),
+        ]
+
+
+class DeckDue(models.Model):
+    """
+    CardProgress.due_at copied out per library deck holding the card, so a
+    single deck's due cards are one range scan of (user, deck, due_at).
+    Kept in step by apps.study.services.due_index; rows exist only for decks
+    in the user's library.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    deck = models.ForeignKey("core.Deck", on_delete=models.CASCADE, related_name="+")
+    card = models.ForeignKey("core.Flashcard", on_delete=models.CASCADE, related_name="+")
+    due_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "deck", "card"], name="uniq_user_deck_card_due"),
+        ]
+        indexes = [
+            # card_id last makes the index covering and matches the queue's tie-break.
+            models.Index(fields=["user", "deck", "due_at", "card"], name="study_deckdue_user_deck_due"),
+        ]
@@ -0,0 +1,157 @@
+from abc import ABC, abstractmethod
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from apps.study.services import fsrs
+from apps.study.services.scheduler import sm2_update
+from apps.study.services.sm2_batch import sm2_update_batch
+
+
+class Scheduler(ABC):
+    """
+    Common interface for spaced-repetition algorithms.
+
+    ``update`` schedules one CardProgress in place and returns the ReviewLog
+    before/after values; ``params`` are the user's fitted SchedulerParams, if
+    any. ``update_batch`` advances a dict of state arrays by
+    one review per card and returns ``(state, interval_days)``; ``elapsed``
+    is the days since each card's previous review.
+    """
+
+    name = ""
+
+    @abstractmethod
+    def update(self, progress, quality: int, now=None, params=None) -> dict:
+        ...
+
+    @abstractmethod
+    def initial_state(self, n: int) -> dict:
+        ...
+
+    @abstractmethod
+    def update_batch(self, state: dict, quality, elapsed) -> tuple[dict, np.ndarray]:
+        ...
+
+
+class SM2Scheduler(Scheduler):
+    name = "sm2"
+
+    def update(self, progress, quality, now=None, params=None):
+        return sm2_update(progress, quality, now=now)
+
+    def initial_state(self, n):
+        return {
+            "ease": np.full(n, 2.5),
+            "interval_days": np.zeros(n, dtype=np.int64),
+            "repetitions": np.zeros(n, dtype=np.int64),
+            "lapses": np.zeros(n, dtype=np.int64),
+        }
+
+    def update_batch(self, state, quality, elapsed):
+        out = sm2_update_batch(state["ease"], state["interval_days"], state["repetitions"], state["lapses"], quality)
+        new_state = {
+            "ease": out.ease,
+            "interval_days": out.interval_days,
+            "repetitions": out.repetitions,
+            "lapses": out.lapses,
+        }
+        return new_state, out.interval_days
+
+
+class FSRSScheduler(Scheduler):
+    name = "fsrs"
+
+    def update(self, progress, quality, now=None, params=None):
+        now = now or timezone.now()
+        grade = fsrs.grade_from_quality(quality)
+        fitted = params or {}
+        params = progress.algo_state or {}
+        w = params.get("w") or fitted.get("w") or fsrs.DEFAULT_WEIGHTS
+        retention = params.get("r") or fitted.get("r") or fsrs.DEFAULT_RETENTION
+
+        elapsed = 0.0
+        if progress.last_reviewed_at is not None:
+            elapsed = max(0.0, (now - progress.last_reviewed_at).total_seconds() / 86400)
+
+        interval_before = progress.interval_days
+        due_before = progress.due_at
+        stability, difficulty = fsrs.fsrs_step(params.get("s"), params.get("d"), elapsed, grade, w)
+
+        progress.algo_state = {**params, "s": stability, "d": difficulty}
+        progress.last_reviewed_at = now
+        progress.interval_days = fsrs.next_interval(stability, retention)
+        progress.due_at = now + timedelta(days=progress.interval_days)
+        if grade == 1:
+            progress.repetitions = 0
+            progress.lapses += 1
+            progress.state = "relearning"
+        else:
+            progress.repetitions += 1
+            progress.state = "review"
+
+        return {
+            "ease_before": progress.ease,
+            "ease_after": progress.ease,
+            "interval_before": interval_before,
+            "interval_after": progress.interval_days,
+            "due_before": due_before,
+            "due_after": progress.due_at,
+        }
+
+    def initial_state(self, n):
+        return {"s": np.full(n, np.nan), "d": np.full(n, np.nan)}
+
+    def update_batch(self, state, quality, elapsed, w=fsrs.DEFAULT_WEIGHTS, retention=fsrs.DEFAULT_RETENTION):
+        grade = np.where(np.asarray(quality) < 3, 1, np.clip(np.asarray(quality), 3, 5) - 1)
+        s, d = fsrs.fsrs_step_batch(state["s"], state["d"], elapsed, grade, w)
+        return {"s": s, "d": d}, fsrs.next_interval_batch(s, retention)
+
+
+DEFAULT_ALGORITHM = "sm2"
+
+SCHEDULERS: dict[str, Scheduler] = {}
+
+
+def register(scheduler: Scheduler) -> Scheduler:
+    SCHEDULERS[scheduler.name] = scheduler
+    return scheduler
+
+
+def get_scheduler(name: str | None) -> Scheduler:
+    return SCHEDULERS.get(name or DEFAULT_ALGORITHM) or SCHEDULERS[DEFAULT_ALGORITHM]
+
+
+register(SM2Scheduler())
+register(FSRSScheduler())
+
+
+def forecast_load(scheduler: Scheduler, due_in_days, days: int, quality_p=None, seed=0, state=None) -> np.ndarray:
+    """
+    Simulate ``days`` of study and return the number of reviews per day.
+
+    Every card due on a day is reviewed with a quality drawn from
+    ``quality_p`` (probabilities for qualities 0..5), then rescheduled.
+    """
+    rng = np.random.default_rng(seed)
+    if quality_p is None:
+        quality_p = [0.02, 0.03, 0.05, 0.15, 0.5, 0.25]
+    due = np.asarray(due_in_days, dtype=np.float64).copy()
+    last = np.full(len(due), np.nan)
+    state = {k: np.array(v, copy=True) for k, v in (state or scheduler.initial_state(len(due))).items()}
+
+    load = np.zeros(days, dtype=np.int64)
+    for day in range(days):
+        idx = np.flatnonzero(due <= day)
+        load[day] = len(idx)
+        if not len(idx):
+            continue
+        quality = rng.choice(6, size=len(idx), p=quality_p)
+        elapsed = np.nan_to_num(day - last[idx], nan=0.0)
+        new_state, interval = scheduler.update_batch({k: v[idx] for k, v in state.items()}, quality, elapsed)
+        for k, v in new_state.items():
+            state[k][idx] = v
+        due[idx] = day + interval
+        last[idx] = day
+    return load
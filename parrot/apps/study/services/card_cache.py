@@ -0,0 +1,189 @@
+"""
+Process-local LRU of Flashcard render data, keyed by card id.
+
+Popular decks are studied by many users at once, so session snapshots
+mostly ask for the same few thousand cards. Lookups go to the database only
+for ids missing from the cache.
+
+Each process checks one generation counter in the shared cache per lookup.
+Card edits (Flashcard save/delete signals, and bulk edits such as
+generate_top_deck that call invalidate) bump it after commit. The editing
+process drops just those ids; any other process that sees the counter move
+clears its whole cache. That only works if the counter lives in a cache
+shared by every process, so CARD_CACHE_SIZE defaults to 0 on locmem.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.core.models import Flashcard
+
+GENERATION_KEY = "card_cache:generation"
+
+
+class CachedCard:
+    __slots__ = ("word", "translation", "context_sentence", "nbytes")
+
+    def __init__(self, word, translation, context_sentence):
+        self.word = word
+        self.translation = translation
+        self.context_sentence = context_sentence
+        self.nbytes = sys.getsizeof(self) + sum(sys.getsizeof(s) for s in (word, translation, context_sentence))
+
+    def render(self) -> list[str]:
+        return [self.word, self.translation, self.context_sentence]
+
+
+_lock = threading.Lock()
+_entries: "OrderedDict[int, CachedCard]" = OrderedDict()
+_state = {"generation": None, "bytes": 0, "hits": 0, "misses": 0, "evictions": 0, "flushes": 0}
+
+
+def _new_generation() -> int:
+    # Clock-based so a counter lost to eviction never restarts at a value a
+    # process still holds.
+    return time.time_ns() // 1000
+
+
+def _generation() -> int:
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, _new_generation(), None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+async def _ageneration() -> int:
+    generation = await cache.aget(GENERATION_KEY)
+    if generation is None:
+        await cache.aadd(GENERATION_KEY, _new_generation(), None)
+        generation = await cache.aget(GENERATION_KEY)
+    return generation
+
+
+def _flush_locked(generation) -> None:
+    if _entries:
+        _state["flushes"] += 1
+    _entries.clear()
+    _state["bytes"] = 0
+    _state["generation"] = generation
+
+
+def _pop_locked(card_id) -> None:
+    entry = _entries.pop(card_id, None)
+    if entry is not None:
+        _state["bytes"] -= entry.nbytes
+
+
+def _cached(card_ids, generation) -> tuple[dict, list]:
+    found, missing = {}, []
+    with _lock:
+        if _state["generation"] != generation:
+            _flush_locked(generation)
+        for card_id in card_ids:
+            entry = _entries.get(card_id)
+            if entry is None:
+                missing.append(card_id)
+            else:
+                _entries.move_to_end(card_id)
+                found[card_id] = entry
+        _state["hits"] += len(found)
+        _state["misses"] += len(missing)
+    return found, missing
+
+
+def _store(rows, generation) -> dict:
+    fresh = {card_id: CachedCard(word, translation, context) for card_id, word, translation, context in rows}
+    size = settings.CARD_CACHE_SIZE
+    with _lock:
+        # A newer generation arrived while the rows were read; they may
+        # predate it, so they are returned but not kept.
+        if _state["generation"] != generation or not size:
+            return fresh
+        for card_id, entry in fresh.items():
+            _pop_locked(card_id)
+            _entries[card_id] = entry
+            _state["bytes"] += entry.nbytes
+        while len(_entries) > size:
+            _, evicted = _entries.popitem(last=False)
+            _state["bytes"] -= evicted.nbytes
+            _state["evictions"] += 1
+    return fresh
+
+
+def _render(card_ids, found) -> dict:
+    return {str(card_id): found[card_id].render() for card_id in card_ids if card_id in found}
+
+
+def _rows(card_ids):
+    return Flashcard.objects.filter(id__in=card_ids).values_list("id", "word", "translation", "context_sentence")
+
+
+def get_cards(card_ids) -> dict:
+    """``{str(card_id): [word, translation, context_sentence]}``; deleted cards are left out."""
+    card_ids = list(dict.fromkeys(card_ids))
+    generation = _generation()
+    found, missing = _cached(card_ids, generation)
+    if missing:
+        found.update(_store(list(_rows(missing)), generation))
+    return _render(card_ids, found)
+
+
+async def aget_cards(card_ids) -> dict:
+    card_ids = list(dict.fromkeys(card_ids))
+    generation = await _ageneration()
+    found, missing = _cached(card_ids, generation)
+    if missing:
+        found.update(_store([row async for row in _rows(missing)], generation))
+    return _render(card_ids, found)
+
+
+def _bump(card_ids) -> None:
+    try:
+        generation = cache.incr(GENERATION_KEY)
+    except ValueError:
+        generation = None
+    with _lock:
+        if generation is not None and _state["generation"] == generation - 1:
+            for card_id in card_ids:
+                _pop_locked(card_id)
+            _state["generation"] = generation
+        else:
+            _flush_locked(None)
+
+
+def invalidate(card_ids) -> None:
+    card_ids = list(card_ids)
+    if not card_ids:
+        return
+    # Dropped now so this transaction reads its own edits, and again after
+    # commit in case a concurrent reader cached the old rows meanwhile.
+    with _lock:
+        for card_id in card_ids:
+            _pop_locked(card_id)
+    transaction.on_commit(lambda: _bump(card_ids))
+
+
+def stats() -> dict:
+    with _lock:
+        lookups = _state["hits"] + _state["misses"]
+        return {
+            "entries": len(_entries),
+            "bytes": _state["bytes"],
+            "hits": _state["hits"],
+            "misses": _state["misses"],
+            "hit_rate": _state["hits"] / lookups if lookups else 0.0,
+            "evictions": _state["evictions"],
+            "flushes": _state["flushes"],
+        }
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+        _state.update(generation=None, bytes=0, hits=0, misses=0, evictions=0, flushes=0)
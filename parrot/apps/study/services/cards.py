@@ -0,0 +1,106 @@
+from collections import namedtuple
+
+from django.utils import timezone
+
+from apps.study.models import StudySession
+from apps.study.services import card_cache
+
+CardView = namedtuple("CardView", ["id", "word", "translation", "context_sentence"])
+
+RENDER_FIELDS = {"word", "translation", "context_sentence"}
+
+
+def snapshot_cards(card_ids) -> dict:
+    return card_cache.get_cards(card_ids)
+
+
+async def asnapshot_cards(card_ids) -> dict:
+    return await card_cache.aget_cards(card_ids)
+
+
+def _needs_refresh(session: StudySession) -> bool:
+    return session.cards_stale or (not session.cards and bool(session.queue))
+
+
+def refresh_session_cards(session: StudySession) -> None:
+    if not _needs_refresh(session):
+        return
+    session.cards = snapshot_cards(session.pending())
+    session.cards_stale = False
+    session.save(update_fields=["cards", "cards_stale"])
+
+
+async def arefresh_session_cards(session: StudySession) -> None:
+    if not _needs_refresh(session):
+        return
+    session.cards = await asnapshot_cards(session.pending())
+    session.cards_stale = False
+    await session.asave(update_fields=["cards", "cards_stale"])
+
+
+def card_at(session: StudySession, index: int) -> CardView | None:
+    card_id = session.card_id_at(index)
+    data = session.cards.get(str(card_id))
+    return CardView(card_id, *data) if data else None
+
+
+def _upcoming(session: StudySession, n: int) -> list[tuple[int, CardView]]:
+    cards = []
+    for index in range(session.index, min(session.queue_end, session.index + n)):
+        card = card_at(session, index)
+        if card:
+            cards.append((index, card))
+    return cards
+
+
+def upcoming_cards(session: StudySession, n: int) -> list[tuple[int, CardView]]:
+    refresh_session_cards(session)
+    return _upcoming(session, n)
+
+
+async def aupcoming_cards(session: StudySession, n: int) -> list[tuple[int, CardView]]:
+    await arefresh_session_cards(session)
+    return _upcoming(session, n)
+
+
+def _advance(session: StudySession) -> tuple[CardView | None, list[str]]:
+    # Skips cards deleted since the snapshot and finishes the session when
+    # none are left; returns the fields that need saving.
+    start = session.index
+    card = None
+    while session.index < session.queue_end:
+        card = card_at(session, session.index)
+        if card:
+            break
+        session.index += 1
+    fields = ["index"] if session.index != start else []
+
+    if card is None and session.status == "active":
+        session.status = "finished"
+        session.finished_at = timezone.now()
+        fields += ["status", "finished_at"]
+    return card, fields
+
+
+def current_card(session: StudySession) -> CardView | None:
+    refresh_session_cards(session)
+    card, fields = _advance(session)
+    if fields:
+        session.save(update_fields=fields)
+    return card
+
+
+async def acurrent_card(session: StudySession) -> CardView | None:
+    await arefresh_session_cards(session)
+    card, fields = _advance(session)
+    if fields:
+        await session.asave(update_fields=fields)
+    return card
+
+
+def invalidate_card_sessions(card_ids) -> int:
+    return (
+        StudySession.objects
+        .filter(status="active", cards_stale=False, deck__deck_cards__card_id__in=card_ids)
+        .update(cards_stale=True)
+    )
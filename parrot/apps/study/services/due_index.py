@@ -0,0 +1,96 @@
+"""
+Maintenance of DeckDue, the per-(user, deck) copy of CardProgress.due_at.
+
+Rows exist for every (progress row, library deck holding its card) pair.
+They are written when progress changes (sync_progress), when cards join or
+leave a deck (add_deck_cards / remove_deck_cards) and when a deck enters or
+leaves a library (add_user_deck / remove_user_deck). Bulk loads that bypass
+those paths finish with rebuild().
+"""
+from django.db import connection, transaction
+
+from apps.core.models import DeckCard
+from apps.library.models import UserDeck
+from apps.study.models import CardProgress, DeckDue
+
+BATCH_SIZE = 1000
+
+
+def sync_progress(user_id, due_by_card: dict) -> None:
+    """Upsert the rows for ``{card_id: due_at}`` in every library deck holding the card."""
+    if not due_by_card:
+        return
+    memberships = DeckCard.objects.filter(
+        card_id__in=due_by_card,
+        deck_id__in=UserDeck.objects.filter(user_id=user_id).values("deck_id"),
+    ).values_list("deck_id", "card_id")
+    DeckDue.objects.bulk_create(
+        [
+            DeckDue(user_id=user_id, deck_id=deck_id, card_id=card_id, due_at=due_by_card[card_id])
+            for deck_id, card_id in memberships
+        ],
+        update_conflicts=True,
+        unique_fields=["user", "deck", "card"],
+        update_fields=["due_at"],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def add_deck_cards(deck_id, card_ids) -> None:
+    for start in range(0, len(card_ids), BATCH_SIZE):
+        progress = CardProgress.objects.filter(
+            card_id__in=card_ids[start:start + BATCH_SIZE],
+            user_id__in=UserDeck.objects.filter(deck_id=deck_id).values("user_id"),
+        ).values_list("user_id", "card_id", "due_at")
+        DeckDue.objects.bulk_create(
+            [DeckDue(user_id=user_id, deck_id=deck_id, card_id=card_id, due_at=due_at) for user_id, card_id, due_at in progress],
+            ignore_conflicts=True,
+        )
+
+
+def remove_deck_cards(deck_id, card_ids) -> None:
+    for start in range(0, len(card_ids), BATCH_SIZE):
+        DeckDue.objects.filter(deck_id=deck_id, card_id__in=card_ids[start:start + BATCH_SIZE]).delete()
+
+
+def add_user_deck(user_id, deck_id) -> None:
+    progress = CardProgress.objects.filter(user_id=user_id, card__deck_cards__deck_id=deck_id).values_list(
+        "card_id", "due_at"
+    )
+    DeckDue.objects.bulk_create(
+        [DeckDue(user_id=user_id, deck_id=deck_id, card_id=card_id, due_at=due_at) for card_id, due_at in progress],
+        ignore_conflicts=True,
+        batch_size=BATCH_SIZE,
+    )
+
+
+def remove_user_deck(user_id, deck_id) -> None:
+    DeckDue.objects.filter(user_id=user_id, deck_id=deck_id).delete()
+
+
+@transaction.atomic
+def rebuild(user_ids=None) -> int:
+    """Recreate the rows of ``user_ids`` (every user when None) from CardProgress."""
+    stale = DeckDue.objects.all()
+    if user_ids is not None:
+        user_ids = [int(u) for u in user_ids]
+        if not user_ids:
+            return 0
+        stale = stale.filter(user_id__in=user_ids)
+    stale.delete()
+
+    qn = connection.ops.quote_name
+    sql = (
+        f"INSERT INTO {qn(DeckDue._meta.db_table)} (user_id, deck_id, card_id, due_at) "
+        f"SELECT p.user_id, dc.deck_id, p.card_id, p.due_at "
+        f"FROM {qn(CardProgress._meta.db_table)} p "
+        f"JOIN {qn(DeckCard._meta.db_table)} dc ON dc.card_id = p.card_id "
+        f"JOIN {qn(UserDeck._meta.db_table)} ud ON ud.user_id = p.user_id AND ud.deck_id = dc.deck_id"
+    )
+    params = []
+    if user_ids is not None:
+        sql += f" WHERE p.user_id IN ({', '.join(['%s'] * len(user_ids))})"
+        params = user_ids
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
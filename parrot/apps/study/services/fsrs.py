@@ -0,0 +1,88 @@
+import math
+
+import numpy as np
+
+# FSRS-4.5 default weights. Per-user fits live in SchedulerParams; per-card
+# overrides in CardProgress.algo_state["w"].
+DEFAULT_WEIGHTS = (
+    0.4872, 1.4003, 3.7145, 13.8206, 5.1618, 1.2298, 0.8975, 0.031, 1.6474,
+    0.1367, 1.0461, 2.1072, 0.0793, 0.3246, 1.587, 0.2272, 2.8755,
+)
+DEFAULT_RETENTION = 0.9
+DECAY = -0.5
+FACTOR = 19 / 81
+
+
+def grade_from_quality(quality: int) -> int:
+    q = max(0, min(5, int(quality)))
+    if q < 3:
+        return 1
+    return q - 1
+
+
+def retrievability(elapsed_days: float, stability: float) -> float:
+    return (1 + FACTOR * elapsed_days / stability) ** DECAY
+
+
+def next_interval(stability: float, retention: float = DEFAULT_RETENTION) -> int:
+    return max(1, int(round(stability / FACTOR * (retention ** (1 / DECAY) - 1))))
+
+
+def _initial_difficulty(w, grade):
+    return min(10.0, max(1.0, w[4] - (grade - 3) * w[5]))
+
+
+def fsrs_step(stability, difficulty, elapsed_days, grade, w=DEFAULT_WEIGHTS):
+    if stability is None:
+        return w[grade - 1], _initial_difficulty(w, grade)
+
+    r = retrievability(elapsed_days, stability)
+    if grade == 1:
+        new_s = w[11] * difficulty ** -w[12] * ((stability + 1) ** w[13] - 1) * math.exp(w[14] * (1 - r))
+        new_s = min(new_s, stability)
+    else:
+        hard = w[15] if grade == 2 else 1.0
+        easy = w[16] if grade == 4 else 1.0
+        new_s = stability * (
+            math.exp(w[8]) * (11 - difficulty) * stability ** -w[9] * (math.exp(w[10] * (1 - r)) - 1) * hard * easy + 1
+        )
+
+    new_d = difficulty - w[6] * (grade - 3)
+    new_d = w[7] * _initial_difficulty(w, 3) + (1 - w[7]) * new_d
+    return new_s, min(10.0, max(1.0, new_d))
+
+
+def fsrs_step_batch(stability, difficulty, elapsed_days, grade, w=DEFAULT_WEIGHTS):
+    # ``stability`` is NaN for cards that have never been reviewed. ``w`` is
+    # either one weight vector or shape (17, P, 1), which evaluates P weight
+    # sets at once against states of shape (P, n).
+    w = np.asarray(w, dtype=np.float64)
+    s = np.asarray(stability, dtype=np.float64)
+    d = np.asarray(difficulty, dtype=np.float64)
+    t = np.asarray(elapsed_days, dtype=np.float64)
+    g = np.asarray(grade, dtype=np.int64)
+
+    first = np.isnan(s)
+    safe_s = np.where(first, 1.0, s)
+    safe_d = np.where(first, w[4], d)
+    r = (1 + FACTOR * t / safe_s) ** DECAY
+
+    fail_s = w[11] * safe_d ** -w[12] * ((safe_s + 1) ** w[13] - 1) * np.exp(w[14] * (1 - r))
+    fail_s = np.minimum(fail_s, safe_s)
+    bonus = np.where(g == 2, w[15], 1.0) * np.where(g == 4, w[16], 1.0)
+    ok_s = safe_s * (np.exp(w[8]) * (11 - safe_d) * safe_s ** -w[9] * (np.exp(w[10] * (1 - r)) - 1) * bonus + 1)
+    new_s = np.where(g == 1, fail_s, ok_s)
+
+    d0 = np.clip(w[4] - (g - 3) * w[5], 1.0, 10.0)
+    new_d = safe_d - w[6] * (g - 3)
+    new_d = np.clip(w[7] * np.clip(w[4], 1.0, 10.0) + (1 - w[7]) * new_d, 1.0, 10.0)
+
+    s0 = np.select([g <= 1, g == 2, g == 3], [w[0], w[1], w[2]], w[3])
+    new_s = np.where(first, s0, new_s)
+    new_d = np.where(first, d0, new_d)
+    return new_s, new_d
+
+
+def next_interval_batch(stability, retention=DEFAULT_RETENTION):
+    days = np.rint(np.asarray(stability) / FACTOR * (retention ** (1 / DECAY) - 1))
+    return np.maximum(1, days).astype(np.int64)
@@ -0,0 +1,153 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.library.models import UserDeck
+from apps.library.services.counts import apply_reviews
+from apps.study.models import CardProgress, StudySession, ReviewLog, SchedulerParams
+from apps.study.services import due_index
+from apps.study.services.cards import refresh_session_cards
+from apps.study.services.sessions import REFILL_AT, RELEARN_GAP, refill_session
+from apps.study.services.algorithms import DEFAULT_ALGORITHM, get_scheduler
+
+PROGRESS_FIELDS = [
+    "due_at", "last_reviewed_at", "ease", "interval_days", "repetitions", "lapses", "state", "algorithm", "algo_state",
+]
+
+
+@dataclass
+class GradeEntry:
+    index: int
+    nonce: str
+    quality: int
+    reviewed_at: datetime | None = None
+
+
+# Applies the leading entries that match the session's index and nonce and
+# returns how many were taken. Every entry of one call carries the nonce the
+# client was last given and the nonce rotates once per call, so a replayed
+# request matches nothing. The caller must hold the session row lock.
+@transaction.atomic
+def apply_grades(session: StudySession, user, entries: list[GradeEntry]) -> int:
+    now = timezone.now()
+    nonce = session.current_nonce
+
+    accepted: list[tuple[int, GradeEntry]] = []
+    for entry in entries:
+        index = session.index + len(accepted)
+        if entry.index != index or entry.nonce != nonce or index >= session.queue_end:
+            break
+        accepted.append((session.card_id_at(index), entry))
+    if not accepted:
+        return 0
+
+    # Cards deleted mid-session drop out of the payload and are skipped.
+    refresh_session_cards(session)
+    card_ids = {card_id for card_id, _ in accepted}
+    live_ids = {card_id for card_id in card_ids if str(card_id) in session.cards}
+    progress = {
+        p.card_id: p
+        for p in CardProgress.objects.select_for_update().filter(user=user, card_id__in=card_ids)
+    }
+    # Cards reviewed for the first time take the scheduler picked for the deck.
+    new_algorithm = DEFAULT_ALGORITHM
+    if live_ids - progress.keys():
+        new_algorithm = UserDeck.objects.filter(user=user, deck_id=session.deck_id).values_list(
+            "algorithm", flat=True
+        ).first() or DEFAULT_ALGORITHM
+    user_params = {}
+    if new_algorithm != DEFAULT_ALGORITHM or any(p.algorithm != DEFAULT_ALGORITHM for p in progress.values()):
+        user_params = dict(SchedulerParams.objects.filter(user=user).values_list("algorithm", "params"))
+
+    logs = []
+    reviews = []
+    forgot = []
+    for card_id, entry in accepted:
+        if card_id not in live_ids:
+            continue
+        reviewed_at = min(entry.reviewed_at or now, now)
+        reviewed_at = max(reviewed_at, session.started_at)
+
+        p = progress.get(card_id)
+        if p is None:
+            p = progress[card_id] = CardProgress(
+                user=user, card_id=card_id, due_at=reviewed_at, state="new", algorithm=new_algorithm,
+            )
+            due_before = None
+        else:
+            due_before = p.due_at
+        ease_before = p.ease
+        interval_before = p.interval_days
+
+        get_scheduler(p.algorithm).update(p, entry.quality, now=reviewed_at, params=user_params.get(p.algorithm))
+
+        reviews.append((card_id, due_before, p.due_at))
+        if entry.quality < 3:
+            forgot.append(card_id)
+        logs.append(ReviewLog(
+            session=session,
+            user=user,
+            deck_id=session.deck_id,
+            card_id=card_id,
+            quality=max(0, min(5, entry.quality)),
+            reviewed_at=reviewed_at,
+            due_before=due_before or reviewed_at,
+            due_after=p.due_at,
+            ease_before=ease_before,
+            ease_after=p.ease,
+            interval_before=interval_before,
+            interval_after=p.interval_days,
+        ))
+
+    ud = None
+    if logs:
+        # Upsert on (user, card) rather than the primary key, so new and
+        # existing rows go out in the same statement.
+        rows = list(progress.values())
+        for p in rows:
+            p.pk = None
+        CardProgress.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["user", "card"],
+            update_fields=PROGRESS_FIELDS,
+        )
+        ReviewLog.objects.bulk_create(logs)
+        due_index.sync_progress(user.id, {card_id: due_after for card_id, _, due_after in reviews})
+        apply_reviews(user, reviews, now=now)
+
+        ud = UserDeck.objects.select_for_update().get(user=user, deck_id=session.deck_id)
+        ud.bump_today(len(logs))
+        ud.save(update_fields=["last_studied_at", "reviews_today", "reviews_today_date", "total_reviews"])
+
+    session.index += len(accepted)
+    fields = ["index"]
+    if session.endless:
+        fields += _requeue(session, forgot)
+        if session.queue_end - session.index <= REFILL_AT:
+            if ud is None:
+                ud = UserDeck.objects.select_for_update().get(user=user, deck_id=session.deck_id)
+            if refill_session(session, ud):
+                fields += ["queue", "queue_offset", "cards"]
+    if session.index >= session.queue_end:
+        session.status = "finished"
+        session.finished_at = now
+        session.save(update_fields=list(dict.fromkeys(fields + ["status", "finished_at"])))
+    else:
+        session.rotate_nonce()
+        session.save(update_fields=list(dict.fromkeys(fields + ["current_nonce"])))
+    return len(accepted)
+
+
+def _requeue(session: StudySession, card_ids: list[int]) -> list[str]:
+    # Relearning step: a card just forgotten comes back RELEARN_GAP positions
+    # after the current one (or at the end of a shorter queue). Positions
+    # after the insert shift by one.
+    pending = set(session.pending())
+    card_ids = [card_id for card_id in card_ids if card_id not in pending]
+    for i, card_id in enumerate(card_ids):
+        position = min(session.queue_end, session.index + RELEARN_GAP + i)
+        session.queue.insert(position - session.queue_offset, card_id)
+    return ["queue"] if card_ids else []
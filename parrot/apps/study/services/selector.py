@@ -1,41 +1,78 @@
+from django.db import connection
+from django.db.models import DateTimeField, Exists, F, IntegerField, OuterRef, Value
 from django.utils import timezone
-from apps.core.models import Flashcard
-from django.db.models import F
 
+from apps.core.models import DeckCard
+from apps.library.services.frontier import advance, ahead_of
+from apps.study.models import CardProgress, DeckDue
 
-def select_session_queue(user, deck, chunk_size: int, new_ratio: float, daily_new_limit: int, new_today: int):
-    now = timezone.now()
 
-    due_qs = Flashcard.objects.filter(
-        deck_cards__deck=deck,
-        progress__user=user,
-        progress__due_at__lte=now,
-    ).distinct().order_by("progress__due_at", "id")
+def _due_branch(user, deck, now, limit):
+    # A range scan of the covering (user, deck, due_at, card) index on
+    # DeckDue; rows come out in order, so there is no sort and no join.
+    return (
+        DeckDue.objects
+        .filter(user=user, deck=deck, due_at__lte=now)
+        .annotate(rank=Value(None, output_field=IntegerField()))
+        .order_by("due_at", "card_id")
+        .values_list("card_id", "due_at", "rank")[:limit]
+    )
 
-    due_ids = list(due_qs.values_list("id", flat=True)[:chunk_size])
 
-    if len(due_ids) >= chunk_size:
-        return due_ids
+def _new_branch(user, deck, limit, frontier):
+    # Reads forward from the frontier on the (deck, card_rank, card) index and
+    # probes the (user, card) index once per card, so the cost is the cards
+    # returned plus the already-seen ones still ahead of the frontier.
+    return (
+        ahead_of(DeckCard.objects.filter(deck=deck), *frontier)
+        .filter(~Exists(CardProgress.objects.filter(user=user, card_id=OuterRef("card_id"))))
+        .annotate(
+            due=Value(None, output_field=DateTimeField()),
+            rank=F("card_rank"),
+        )
+        .order_by("card_rank", "card_id")
+        .values_list("card_id", "due", "rank")[:limit]
+    )
 
-    remaining = chunk_size - len(due_ids)
 
-    new_target = int(round(chunk_size * new_ratio))
-    new_target = min(new_target, remaining)
+def select_session_queue(
+    user, deck, chunk_size: int, new_ratio: float, daily_new_limit: int, new_today: int, user_deck=None, exclude=(),
+):
+    """
+    Card ids for the next session: due cards first, oldest due first, then
+    new cards in rank order. With ``user_deck``, new cards are read from its
+    frontier, which is advanced in place (the caller saves it). Cards in
+    ``exclude`` (still queued in an endless session) are skipped; each branch
+    reads that many extra rows, so the cost does not depend on session length.
+    """
+    now = timezone.now()
+    frontier = (user_deck.new_cursor_rank, user_deck.new_cursor_card) if user_deck is not None else (0, 0)
+    exclude = set(exclude)
 
+    new_target = int(round(chunk_size * new_ratio))
     remaining_new_today = max(0, daily_new_limit - new_today)
     new_target = min(new_target, remaining_new_today)
 
-    if new_target <= 0:
-        return due_ids
+    due_qs = _due_branch(user, deck, now, chunk_size + len(exclude))
 
-    new_qs = (
-        Flashcard.objects
-        .filter(deck_cards__deck=deck)
-        .exclude(progress__user=user)
-        .distinct()
-        .order_by(F("frequency_rank").asc(nulls_last=True), "id")
+    if new_target <= 0:
+        return [card_id for card_id, _, _ in due_qs if card_id not in exclude][:chunk_size]
 
-    )
-    new_ids = list(new_qs.values_list("id", flat=True)[:new_target])
+    if connection.features.supports_slicing_ordering_in_compound:
+        rows = list(due_qs.union(_new_branch(user, deck, new_target + len(exclude), frontier), all=True))
+        due_rows = sorted((r for r in rows if r[1] is not None and r[0] not in exclude), key=lambda r: (r[1], r[0]))
+        new_rows = sorted((r for r in rows if r[1] is None), key=lambda r: (r[2], r[0]))
+    else:
+        due_rows = [r for r in due_qs if r[0] not in exclude]
+        if len(due_rows) >= chunk_size:
+            return [card_id for card_id, _, _ in due_rows[:chunk_size]]
+        new_rows = list(_new_branch(
+            user, deck, min(new_target, chunk_size - len(due_rows)) + len(exclude), frontier,
+        ))
 
-    return due_ids + new_ids
+    if user_deck is not None:
+        # Excluded cards are unseen too, so the frontier may stop at one.
+        advance(user_deck, (new_rows[0][2], new_rows[0][0]) if new_rows else None)
+    due_rows = due_rows[:chunk_size]
+    new_rows = [r for r in new_rows if r[0] not in exclude][:min(new_target, chunk_size - len(due_rows))]
+    return [r[0] for r in due_rows] + [r[0] for r in new_rows]
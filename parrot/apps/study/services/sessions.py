@@ -0,0 +1,101 @@
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from apps.library.models import UserDeck
+from apps.study.models import CardProgress, StudySession
+from apps.study.services.cards import snapshot_cards
+from apps.study.services.selector import select_session_queue
+
+# Endless sessions top the queue up by REFILL_SIZE cards once REFILL_AT or
+# fewer are left, and put a card graded "forgot" back RELEARN_GAP positions on.
+REFILL_AT = 5
+REFILL_SIZE = 10
+RELEARN_GAP = 3
+
+USER_DECK_FIELDS = ["new_today", "new_today_date", "total_new_seen", "new_cursor_rank", "new_cursor_card"]
+
+
+def _next_cards(user, deck, ud: UserDeck, chunk_size: int, exclude=()) -> list[int]:
+    # Picks the next cards and charges the new ones to the daily allowance;
+    # the caller holds the UserDeck lock and saves USER_DECK_FIELDS.
+    today = timezone.localdate()
+    if ud.new_today_date != today:
+        ud.new_today_date = today
+        ud.new_today = 0
+
+    queue = select_session_queue(
+        user=user,
+        deck=deck,
+        chunk_size=chunk_size,
+        new_ratio=ud.new_ratio,
+        daily_new_limit=ud.daily_new_limit,
+        new_today=ud.new_today,
+        user_deck=ud,
+        exclude=exclude,
+    )
+    if not queue:
+        return queue
+
+    existing_progress_ids = set(
+        CardProgress.objects.filter(user=user, card_id__in=queue)
+        .values_list("card_id", flat=True)
+    )
+    new_in_queue = sum(1 for cid in queue if cid not in existing_progress_ids)
+
+    ud.new_today += new_in_queue
+    ud.total_new_seen += new_in_queue
+    return queue
+
+
+@transaction.atomic
+def start_session(user, deck, endless: bool = False) -> StudySession | None:
+    """
+    Pick the next queue for ``user`` in ``deck`` and open a session on it.
+
+    Runs under a lock on the UserDeck so concurrent starts cannot both spend
+    the daily new-card allowance. Returns None when nothing is due.
+    """
+    ud = get_object_or_404(UserDeck.objects.select_for_update(), user=user, deck=deck)
+
+    queue = _next_cards(user, deck, ud, ud.chunk_size)
+    ud.save(update_fields=USER_DECK_FIELDS)
+    if not queue:
+        return None
+
+    session = StudySession(
+        user=user,
+        deck=deck,
+        queue=queue,
+        cards=snapshot_cards(queue),
+        index=0,
+        status="active",
+        endless=endless,
+    )
+    session.rotate_nonce()
+    session.save()
+    return session
+
+
+def refill_session(session: StudySession, ud: UserDeck) -> bool:
+    """
+    Top up an endless session that is running low; returns whether it changed.
+
+    The graded prefix is dropped (positions stay absolute through
+    queue_offset) and the next cards are read past the ones still queued, so
+    each refill costs the same however long the session has run. The caller
+    holds the session and ``ud`` row locks and saves the session.
+    """
+    if not session.endless or session.queue_end - session.index > REFILL_AT:
+        return False
+
+    pending = session.pending()
+    added = _next_cards(session.user_id, session.deck_id, ud, REFILL_SIZE, exclude=pending)
+    ud.save(update_fields=USER_DECK_FIELDS)
+
+    cards = {str(card_id): session.cards[str(card_id)] for card_id in pending if str(card_id) in session.cards}
+    cards.update(snapshot_cards(added))
+    session.queue = pending + added
+    session.queue_offset = session.index
+    session.cards = cards
+    return True
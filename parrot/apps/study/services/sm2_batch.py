@@ -0,0 +1,81 @@
+from typing import NamedTuple
+
+import numpy as np
+
+
+class SM2State(NamedTuple):
+    ease: np.ndarray
+    interval_days: np.ndarray
+    repetitions: np.ndarray
+    lapses: np.ndarray
+    state: np.ndarray
+
+
+def initial_state(n: int) -> SM2State:
+    return SM2State(
+        ease=np.full(n, 2.5),
+        interval_days=np.zeros(n, dtype=np.int64),
+        repetitions=np.zeros(n, dtype=np.int64),
+        lapses=np.zeros(n, dtype=np.int64),
+        state=np.full(n, "new", dtype="<U10"),
+    )
+
+
+def sm2_update_batch(ease, interval_days, repetitions, lapses, quality) -> SM2State:
+    # Mirrors scheduler.sm2_update operation for operation, so results are
+    # bit-identical to the scalar version.
+    ease = np.asarray(ease, dtype=np.float64)
+    interval_days = np.asarray(interval_days, dtype=np.int64)
+    repetitions = np.asarray(repetitions, dtype=np.int64)
+    lapses = np.asarray(lapses, dtype=np.int64)
+    q = np.clip(np.asarray(quality, dtype=np.int64), 0, 5)
+
+    failed = q < 3
+    first = ~failed & (repetitions == 0)
+    second = ~failed & (repetitions == 1)
+    later = ~failed & (repetitions >= 2)
+
+    new_interval = np.ones_like(interval_days)
+    new_interval[second] = 6
+    new_interval[later] = np.rint(interval_days[later] * ease[later]).astype(np.int64)
+
+    new_repetitions = np.where(failed, 0, repetitions + 1)
+    new_lapses = lapses + (failed | first)
+
+    new_ease = ease + (0.1 - (5 - q) * (0.08 + (5 - q) * 0.002))
+    new_ease = np.where(new_ease < 1.3, 1.3, new_ease)
+
+    state = np.where(failed, "relearning", "review").astype("<U10")
+    return SM2State(new_ease, new_interval, new_repetitions, new_lapses, state)
+
+
+def replay_history(card_ids, qualities) -> tuple[np.ndarray, SM2State]:
+    """
+    Replay review histories from scratch.
+
+    ``card_ids`` and ``qualities`` are parallel arrays in chronological order
+    (e.g. a user's ReviewLog ordered by reviewed_at). Returns the distinct card
+    ids and their final state. Cards advance in lockstep, one review per card
+    per step, so the loop runs once per review of the busiest card.
+    """
+    card_ids = np.asarray(card_ids)
+    qualities = np.asarray(qualities, dtype=np.int64)
+    cards, slot = np.unique(card_ids, return_inverse=True)
+    state = initial_state(len(cards))
+    if not len(card_ids):
+        return cards, state
+
+    order = np.argsort(slot, kind="stable")
+    sorted_slot = slot[order]
+    group_start = np.searchsorted(sorted_slot, sorted_slot, side="left")
+    step = np.empty_like(order)
+    step[order] = np.arange(len(order)) - group_start
+
+    ease, interval, reps, lapses, labels = (a.copy() for a in state)
+    for k in range(int(step.max()) + 1):
+        at = step == k
+        idx = slot[at]
+        out = sm2_update_batch(ease[idx], interval[idx], reps[idx], lapses[idx], qualities[at])
+        ease[idx], interval[idx], reps[idx], lapses[idx], labels[idx] = out
+    return cards, SM2State(ease, interval, reps, lapses, labels)
+
@@ -0,0 +1,39 @@
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from apps.core.models import Flashcard
+from apps.core.services.explore_cache import bump_badges
+from apps.library.services import card_index
+from apps.study.models import CardProgress, StudySession
+from apps.study.services import card_cache, due_index
+from apps.study.services.cards import RENDER_FIELDS, invalidate_card_sessions
+
+
+@receiver(post_save, sender=Flashcard)
+def flashcard_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not RENDER_FIELDS & set(update_fields)):
+        return
+    card_cache.invalidate([instance.id])
+    invalidate_card_sessions([instance.id])
+
+
+# pre_delete: by post_delete the DeckCard rows linking the card to sessions are gone.
+@receiver(pre_delete, sender=Flashcard)
+def flashcard_deleted(sender, instance, **kwargs):
+    card_cache.invalidate([instance.id])
+    invalidate_card_sessions([instance.id])
+
+
+@receiver(post_save, sender=StudySession)
+def study_session_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or "status" in update_fields:
+        bump_badges(instance.user_id)
+
+
+# Single-row saves; grading's bulk upsert syncs the index itself.
+@receiver(post_save, sender=CardProgress)
+def card_progress_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        card_index.cards_known(instance.user_id, [instance.card_id])
+    if update_fields is None or "due_at" in update_fields:
+        due_index.sync_progress(instance.user_id, {instance.card_id: instance.due_at})
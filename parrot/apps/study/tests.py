@@ -1,3 +1,665 @@
-from django.test import TestCase
+import json
+import random
+import unittest
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
 
-# Create your tests here.
+import numpy as np
+from hypothesis import given, settings, strategies as st
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils import timezone
+
+from apps.core.checks import per_process_caches
+from apps.core.models import Language, Deck, Flashcard, DeckCard
+from apps.library.models import UserDeck
+from apps.library.services.counts import apply_deck_cards_added
+from apps.study import async_views
+from apps.study.models import CardProgress, DeckDue, ReviewLog, StudySession
+from apps.study.services import card_cache, due_index, sessions
+from apps.study.services import fsrs
+from apps.study.services.algorithms import SCHEDULERS, Scheduler, get_scheduler
+from apps.study.services.fsrs_optimizer import chunk_loss, stream_histories
+from apps.study.services.scheduler import sm2_update
+from apps.study.services.selector import _due_branch, _new_branch, select_session_queue
+from apps.study.services.sm2_batch import replay_history, sm2_update_batch
+from apps.study.urls import study_patterns
+
+
+class SelectSessionQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="u")
+        cls.language = Language.objects.create(code="cs", name="Czech")
+        cls.deck = Deck.objects.create(language=cls.language, title="Top")
+        other = Deck.objects.create(language=cls.language, title="Other")
+        cls.cards = [
+            Flashcard.objects.create(language=cls.language, word=f"w{i}", frequency_rank=i)
+            for i in range(10)
+        ]
+        for i, card in enumerate(cls.cards[:8]):
+            DeckCard.objects.create(deck=cls.deck, card=card, position=i)
+        DeckCard.objects.create(deck=other, card=cls.cards[8], position=0)
+        UserDeck.objects.create(user=cls.user, deck=cls.deck)
+        UserDeck.objects.create(user=cls.user, deck=other)
+
+    def _progress(self, card, days):
+        return CardProgress.objects.create(user=self.user, card=card, due_at=timezone.now() + timedelta(days=days))
+
+    def test_due_first_then_new_by_rank(self):
+        self._progress(self.cards[5], -1)
+        self._progress(self.cards[3], -2)
+        self._progress(self.cards[0], 3)
+        self._progress(self.cards[8], -5)
+
+        queue = select_session_queue(self.user, self.deck, chunk_size=6, new_ratio=0.5, daily_new_limit=20, new_today=0)
+
+        self.assertEqual(queue, [self.cards[3].id, self.cards[5].id, self.cards[1].id, self.cards[2].id, self.cards[4].id])
+
+    def test_new_cards_respect_daily_limit(self):
+        queue = select_session_queue(self.user, self.deck, chunk_size=10, new_ratio=1.0, daily_new_limit=5, new_today=3)
+
+        self.assertEqual(queue, [self.cards[0].id, self.cards[1].id])
+
+    def test_due_fills_chunk(self):
+        for card in self.cards[:4]:
+            self._progress(card, -1)
+
+        queue = select_session_queue(self.user, self.deck, chunk_size=3, new_ratio=1.0, daily_new_limit=20, new_today=0)
+
+        self.assertEqual(len(queue), 3)
+        self.assertTrue(set(queue) <= {c.id for c in self.cards[:4]})
+
+    @unittest.skipUnless(
+        connection.features.supports_slicing_ordering_in_compound, "the union branch needs ordered compound queries",
+    )
+    def test_union_branch_breaks_due_ties_by_card(self):
+        due_at = timezone.now() - timedelta(hours=1)
+        for card in reversed(self.cards[:4]):
+            CardProgress.objects.create(user=self.user, card=card, due_at=due_at)
+
+        queue = select_session_queue(self.user, self.deck, chunk_size=6, new_ratio=0.5, daily_new_limit=20, new_today=0)
+
+        self.assertEqual(queue, [c.id for c in self.cards[:6]])
+
+
+class DeckDueIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="u")
+        language = Language.objects.create(code="cs", name="Czech")
+        cls.deck = Deck.objects.create(language=language, title="Top")
+        cls.other = Deck.objects.create(language=language, title="Other")
+        cls.cards = [Flashcard.objects.create(language=language, word=f"w{i}", frequency_rank=i) for i in range(6)]
+        for i, card in enumerate(cls.cards[:4]):
+            DeckCard.objects.create(deck=cls.deck, card=card, position=i)
+        DeckCard.objects.create(deck=cls.other, card=cls.cards[0], position=0)
+        UserDeck.objects.create(user=cls.user, deck=cls.deck)
+
+    def _rows(self):
+        return set(DeckDue.objects.values_list("user_id", "deck_id", "card_id", "due_at"))
+
+    def _plan(self, qs):
+        if connection.vendor == "postgresql":
+            # Tiny test tables would otherwise be read sequentially.
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        return qs.explain()
+
+    def test_index_follows_progress_membership_and_library(self):
+        due = timezone.now() - timedelta(hours=1)
+        CardProgress.objects.create(user=self.user, card=self.cards[0], due_at=due)
+        CardProgress.objects.create(user=self.user, card=self.cards[5], due_at=due)
+        self.assertEqual(self._rows(), {(self.user.id, self.deck.id, self.cards[0].id, due)})
+
+        UserDeck.objects.create(user=self.user, deck=self.other)
+        DeckCard.objects.create(deck=self.other, card=self.cards[5], position=1)
+        self.assertEqual(
+            {(deck_id, card_id) for _, deck_id, card_id, _ in self._rows()},
+            {(self.deck.id, self.cards[0].id), (self.other.id, self.cards[0].id), (self.other.id, self.cards[5].id)},
+        )
+
+        maintained = self._rows()
+        due_index.rebuild()
+        self.assertEqual(self._rows(), maintained)
+
+        DeckCard.objects.get(deck=self.deck, card=self.cards[0]).delete()
+        UserDeck.objects.get(user=self.user, deck=self.other).delete()
+        self.assertEqual(self._rows(), set())
+
+    def test_grading_moves_due_at(self):
+        UserDeck.objects.filter(user=self.user, deck=self.deck).update(chunk_size=2, new_ratio=1.0)
+        self.client.force_login(self.user)
+        self.client.get(f"/study/start/{self.deck.id}/")
+        session = StudySession.objects.get(user=self.user, deck=self.deck)
+        self.client.post(
+            f"/study/grade/{session.id}/batch/",
+            data=json.dumps({"entries": [{"index": i, "nonce": session.current_nonce, "quality": 4} for i in range(2)]}),
+            content_type="application/json",
+        )
+
+        progress = set(CardProgress.objects.values_list("user_id", "card_id", "due_at"))
+        self.assertEqual(len(progress), 2)
+        self.assertEqual(
+            self._rows(), {(user_id, self.deck.id, card_id, due_at) for user_id, card_id, due_at in progress}
+        )
+
+    @unittest.skipUnless(connection.vendor in ("sqlite", "postgresql"), "plan format is vendor-specific")
+    def test_due_lookup_is_an_index_range_scan(self):
+        for card in self.cards[:4]:
+            CardProgress.objects.create(user=self.user, card=card, due_at=timezone.now() - timedelta(days=1))
+
+        plan = self._plan(_due_branch(self.user, self.deck, timezone.now(), 20))
+
+        self.assertIn("study_deckdue_user_deck_due", plan)
+        if connection.vendor == "sqlite":
+            self.assertIn("SEARCH", plan)
+            self.assertIn("COVERING INDEX", plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+            self.assertNotIn("study_cardprogress", plan)
+            self.assertNotIn("core_deckcard", plan)
+        else:
+            self.assertIn("Index Only Scan", plan)
+            self.assertNotIn("Sort", plan)
+
+
+class NewCardFrontierTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="u")
+        cls.language = Language.objects.create(code="cs", name="Czech")
+        cls.deck = Deck.objects.create(language=cls.language, title="Top")
+        cls.other = Deck.objects.create(language=cls.language, title="Other")
+        cls.cards = [
+            Flashcard.objects.create(language=cls.language, word=f"w{i}", frequency_rank=(i + 1) * 10)
+            for i in range(8)
+        ]
+        for i, card in enumerate(cls.cards):
+            DeckCard.objects.create(deck=cls.deck, card=card, position=i)
+        DeckCard.objects.create(deck=cls.other, card=cls.cards[5], position=0)
+
+    def setUp(self):
+        self.ud = UserDeck.objects.create(user=self.user, deck=self.deck)
+
+    def _select(self, n):
+        return select_session_queue(
+            self.user, self.deck, chunk_size=n, new_ratio=1.0, daily_new_limit=100, new_today=0, user_deck=self.ud,
+        )
+
+    def _see(self, cards):
+        for card in cards:
+            CardProgress.objects.create(user=self.user, card=card, due_at=timezone.now() + timedelta(days=5))
+
+    def _frontier(self):
+        self.ud.refresh_from_db()
+        return self.ud.new_cursor_rank, self.ud.new_cursor_card
+
+    def test_frontier_skips_seen_cards_and_advances(self):
+        self.assertEqual(self._select(2), [self.cards[0].id, self.cards[1].id])
+        self._see(self.cards[:2])
+        self._see([self.cards[5]])  # studied from the other deck
+
+        self.assertEqual(self._select(4), [c.id for c in (self.cards[2], self.cards[3], self.cards[4], self.cards[6])])
+        self.assertEqual((self.ud.new_cursor_rank, self.ud.new_cursor_card), (30, self.cards[2].id))
+
+        self._see(self.cards[2:5] + self.cards[6:])
+        self.assertEqual(self._select(4), [])
+        self.assertEqual((self.ud.new_cursor_rank, self.ud.new_cursor_card), (80, self.cards[7].id + 1))
+
+    def test_cards_behind_the_frontier_rewind_it(self):
+        self._see(self.cards[:4])
+        self._select(1)
+        self.ud.save()
+        self.assertEqual(self._frontier(), (50, self.cards[4].id))
+
+        # Imported below the frontier.
+        early = Flashcard.objects.create(language=self.language, word="early", frequency_rank=15)
+        DeckCard.objects.bulk_create([DeckCard(deck=self.deck, card=early, position=99)])
+        apply_deck_cards_added(self.deck, [early.id])
+        self.assertEqual(self._frontier(), (15, early.id))
+        self.assertEqual(self._select(2), [early.id, self.cards[4].id])
+
+        # Re-ranked below the frontier.
+        self._see([early, self.cards[4]])
+        self._select(1)
+        self.ud.save()
+        self.cards[7].frequency_rank = 1
+        self.cards[7].save()
+        self.assertEqual(self._frontier(), (1, self.cards[7].id))
+        self.assertEqual(self._select(2), [self.cards[7].id, self.cards[5].id])
+
+    def test_start_session_saves_the_frontier(self):
+        self._see(self.cards[:3])
+        self.client.force_login(self.user)
+        self.client.get(f"/study/start/{self.deck.id}/")
+        self.assertEqual(self._frontier(), (40, self.cards[3].id))
+
+    @unittest.skipUnless(connection.vendor == "sqlite", "plan format is vendor-specific")
+    def test_new_cards_are_an_index_range_read(self):
+        plan = _new_branch(self.user, self.deck, 20, (30, self.cards[2].id)).explain()
+
+        self.assertIn("card_rank>?", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+
+class StudySessionTestCase(TestCase):
+    def setUp(self):
+        card_cache.clear()
+        self.user = get_user_model().objects.create(username="u")
+        language = Language.objects.create(code="cs", name="Czech")
+        self.deck = Deck.objects.create(language=language, title="Top", is_public=True)
+        self.cards = [Flashcard.objects.create(language=language, word=f"w{i}", frequency_rank=i) for i in range(5)]
+        for i, card in enumerate(self.cards):
+            DeckCard.objects.create(deck=self.deck, card=card, position=i)
+        UserDeck.objects.create(user=self.user, deck=self.deck, chunk_size=5, new_ratio=1.0)
+        self.client.force_login(self.user)
+        self.client.get(f"/study/start/{self.deck.id}/")
+        self.session = StudySession.objects.get(user=self.user, deck=self.deck)
+
+    def _post(self, entries):
+        return self.client.post(
+            f"/study/grade/{self.session.id}/batch/",
+            data=json.dumps({"entries": entries}),
+            content_type="application/json",
+        )
+
+
+class GradeBatchTests(StudySessionTestCase):
+    def test_batch_applies_entries_with_one_nonce(self):
+        nonce = self.session.current_nonce
+        entries = [{"index": i, "nonce": nonce, "quality": 4} for i in range(3)]
+
+        data = self._post(entries).json()
+
+        self.assertEqual(data["applied"], 3)
+        self.assertEqual(data["index"], 3)
+        self.assertNotEqual(data["nonce"], nonce)
+        self.assertEqual(ReviewLog.objects.filter(session=self.session).count(), 3)
+        self.assertEqual(CardProgress.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(UserDeck.objects.get(user=self.user, deck=self.deck).total_reviews, 3)
+
+        replay = self._post(entries).json()
+        self.assertEqual(replay["applied"], 0)
+        self.assertEqual(ReviewLog.objects.filter(session=self.session).count(), 3)
+
+    def test_batch_stops_at_first_mismatch(self):
+        nonce = self.session.current_nonce
+        entries = [
+            {"index": 0, "nonce": nonce, "quality": 4},
+            {"index": 2, "nonce": nonce, "quality": 4},
+        ]
+
+        self.assertEqual(self._post(entries).json()["applied"], 1)
+
+    def test_batch_finishes_session(self):
+        nonce = self.session.current_nonce
+        reviewed_at = (timezone.now() - timedelta(seconds=1)).isoformat()
+        entries = [{"index": i, "nonce": nonce, "quality": 1, "reviewed_at": reviewed_at} for i in range(5)]
+
+        data = self._post(entries).json()
+
+        self.assertTrue(data["finished"])
+        self.assertEqual(CardProgress.objects.filter(user=self.user, lapses=1).count(), 5)
+
+    def test_new_cards_use_the_deck_scheduler(self):
+        UserDeck.objects.filter(user=self.user, deck=self.deck).update(algorithm="fsrs")
+        nonce = self.session.current_nonce
+
+        self._post([{"index": i, "nonce": nonce, "quality": 4} for i in range(2)])
+
+        progress = CardProgress.objects.filter(user=self.user)
+        self.assertEqual({p.algorithm for p in progress}, {"fsrs"})
+        self.assertTrue(all("s" in p.algo_state for p in progress))
+
+    def test_single_grade_rejects_stale_nonce(self):
+        url = f"/study/grade/{self.session.id}/"
+        nonce = self.session.current_nonce
+        self.client.post(url, {"index": 0, "nonce": nonce, "quality": 4})
+        self.client.post(url, {"index": 0, "nonce": nonce, "quality": 4})
+
+        self.assertEqual(ReviewLog.objects.filter(session=self.session).count(), 1)
+
+
+class SessionCardPayloadTests(StudySessionTestCase):
+    def test_grading_renders_without_flashcard_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                f"/study/grade/{self.session.id}/",
+                {"index": 0, "nonce": self.session.current_nonce, "quality": 4},
+            )
+
+        self.assertContains(response, self.cards[1].word)
+        self.assertFalse([q for q in ctx.captured_queries if "core_flashcard" in q["sql"]])
+
+    def test_card_edit_is_visible_mid_session(self):
+        card = self.cards[1]
+        card.translation = "edited"
+        card.save()
+
+        response = self.client.post(
+            f"/study/grade/{self.session.id}/",
+            {"index": 0, "nonce": self.session.current_nonce, "quality": 4},
+        )
+
+        self.assertContains(response, "edited")
+
+    def test_prefetch_returns_upcoming_cards(self):
+        data = self.client.get(f"/study/session/{self.session.id}/cards/?n=3").json()
+
+        self.assertEqual([c["id"] for c in data["cards"]], [c.id for c in self.cards[:3]])
+        self.assertEqual(data["nonce"], self.session.current_nonce)
+
+
+class EndlessSessionTests(TestCase):
+    def setUp(self):
+        card_cache.clear()
+        self.user = get_user_model().objects.create(username="u")
+        language = Language.objects.create(code="cs", name="Czech")
+        self.deck = Deck.objects.create(language=language, title="Top", is_public=True)
+        self.cards = [Flashcard.objects.create(language=language, word=f"w{i}", frequency_rank=i) for i in range(60)]
+        for i, card in enumerate(self.cards):
+            DeckCard.objects.create(deck=self.deck, card=card, position=i)
+        UserDeck.objects.create(user=self.user, deck=self.deck, chunk_size=8, new_ratio=1.0, daily_new_limit=100)
+        self.client.force_login(self.user)
+        self.client.get(f"/study/start/{self.deck.id}/?endless=1")
+        self.session = StudySession.objects.get(user=self.user, deck=self.deck)
+        self.nonce = self.session.current_nonce
+
+    def _grade(self, index, quality=4):
+        data = self.client.post(
+            f"/study/grade/{self.session.id}/batch/",
+            data=json.dumps({"entries": [{"index": index, "nonce": self.nonce, "quality": quality}]}),
+            content_type="application/json",
+        ).json()
+        self.assertEqual(data["applied"], 1)
+        self.nonce = data["nonce"]
+        return data
+
+    def test_queue_refills_past_the_first_chunk(self):
+        self.assertTrue(self.session.endless)
+        for index in range(30):
+            self.assertFalse(self._grade(index)["finished"])
+
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.index, 30)
+        self.assertGreater(self.session.queue_offset, 0)
+        self.assertLessEqual(len(self.session.queue), 8 + sessions.REFILL_SIZE)
+        self.assertEqual(set(self.session.cards), {str(card_id) for card_id in self.session.queue})
+        reviewed = list(ReviewLog.objects.filter(session=self.session).values_list("card_id", flat=True))
+        self.assertEqual(reviewed, [c.id for c in self.cards[:30]])
+        self.assertEqual(UserDeck.objects.get(user=self.user, deck=self.deck).new_today, self.session.queue_end)
+
+    def test_card_position_after_a_refill(self):
+        for index in range(10):
+            self._grade(index)
+        self.session.refresh_from_db()
+        self.assertGreater(self.session.queue_offset, 0)
+
+        response = self.client.post(
+            f"/study/grade/{self.session.id}/",
+            {"index": 10, "nonce": self.nonce, "quality": 4},
+        )
+
+        self.assertContains(response, "Card 12 (endless)")
+
+    def test_forgotten_card_is_requeued(self):
+        self._grade(0, quality=1)
+
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.card_id_at(1 + sessions.RELEARN_GAP), self.cards[0].id)
+        for index in range(1, 1 + sessions.RELEARN_GAP):
+            self._grade(index)
+        response = self.client.get(f"/study/session/{self.session.id}/cards/?n=1").json()
+        self.assertEqual(response["cards"][0]["id"], self.cards[0].id)
+
+    def test_grade_cost_does_not_grow(self):
+        counts = []
+        for index in range(40):
+            with CaptureQueriesContext(connection) as ctx:
+                self._grade(index)
+            counts.append(len(ctx.captured_queries))
+
+        # A refill every REFILL_SIZE grades, in both windows.
+        self.assertEqual(max(counts[20:40]), max(counts[:20]))
+        self.assertEqual(sorted(set(counts[20:40])), sorted(set(counts[:20])))
+
+    def test_plain_sessions_keep_a_fixed_queue(self):
+        self.session.status = "finished"
+        self.session.save()
+        self.client.get(f"/study/start/{self.deck.id}/")
+        plain = StudySession.objects.filter(user=self.user, deck=self.deck).latest("started_at")
+        self.assertFalse(plain.endless)
+        self.assertEqual(len(plain.queue), 8)
+        response = self.client.get(f"/study/start/{self.deck.id}/")
+        self.assertContains(response, "Card 1 of 8")
+
+
+@override_settings(CARD_CACHE_SIZE=20000)
+class CardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        language = Language.objects.create(code="cs", name="Czech")
+        cls.cards = [Flashcard.objects.create(language=language, word=f"w{i}", translation=f"t{i}") for i in range(4)]
+        cls.ids = [c.id for c in cls.cards]
+
+    def setUp(self):
+        cache.clear()
+        card_cache.clear()
+
+    def test_repeat_lookups_skip_the_database(self):
+        card_cache.get_cards(self.ids[:2])
+        with self.assertNumQueries(1):
+            cards = card_cache.get_cards(self.ids)
+        with self.assertNumQueries(0):
+            self.assertEqual(card_cache.get_cards(self.ids), cards)
+
+        self.assertEqual(cards[str(self.ids[3])], ["w3", "t3", ""])
+        stats = card_cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (6, 4, 4))
+        self.assertEqual(stats["hit_rate"], 0.6)
+        self.assertGreater(stats["bytes"], 0)
+
+    def test_edits_and_other_processes_invalidate(self):
+        card_cache.get_cards(self.ids)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cards[0].translation = "edited"
+            self.cards[0].save()
+        with self.assertNumQueries(1):
+            self.assertEqual(card_cache.get_cards(self.ids)[str(self.ids[0])][1], "edited")
+
+        # Another process bumped the shared generation.
+        cache.incr(card_cache.GENERATION_KEY)
+        with self.assertNumQueries(1):
+            card_cache.get_cards(self.ids)
+        self.assertEqual(card_cache.stats()["flushes"], 1)
+
+    def test_deleted_cards_drop_out(self):
+        card_cache.get_cards(self.ids)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cards[2].delete()
+        self.assertNotIn(str(self.ids[2]), card_cache.get_cards(self.ids))
+
+    def test_per_process_cache_is_reported(self):
+        self.assertIn("core.W002", [e.id for e in per_process_caches(None)])
+
+    @override_settings(CARD_CACHE_SIZE=2)
+    def test_size_is_bounded(self):
+        card_cache.get_cards(self.ids)
+        stats = card_cache.stats()
+        self.assertEqual((stats["entries"], stats["evictions"]), (2, 2))
+        with self.assertNumQueries(0):
+            card_cache.get_cards(self.ids[2:])
+
+
+class AsyncURLConf:
+    urlpatterns = [
+        path("", include("apps.core.urls")),
+        path("", include("apps.library.urls")),
+        path("", include(study_patterns(async_views))),
+        path("accounts/", include("apps.accounts.urls")),
+    ]
+
+
+@override_settings(ROOT_URLCONF=AsyncURLConf)
+class AsyncGradeBatchTests(GradeBatchTests):
+    def test_requires_login(self):
+        self.client.logout()
+
+        response = self.client.get(f"/study/start/{self.deck.id}/")
+
+        self.assertRedirects(response, f"/accounts/login/?next=/study/start/{self.deck.id}/", fetch_redirect_response=False)
+
+    def test_resumes_active_session(self):
+        response = self.client.get(f"/study/start/{self.deck.id}/")
+
+        self.assertContains(response, self.cards[0].word)
+        self.assertEqual(StudySession.objects.filter(user=self.user, deck=self.deck).count(), 1)
+
+
+@override_settings(ROOT_URLCONF=AsyncURLConf)
+class AsyncSessionCardPayloadTests(SessionCardPayloadTests):
+    pass
+
+
+def _scalar_sm2(ease, interval, reps, lapses, quality):
+    p = SimpleNamespace(ease=ease, interval_days=interval, repetitions=reps, lapses=lapses, state="new")
+    sm2_update(p, quality, now=timezone.now())
+    return p.ease, p.interval_days, p.repetitions, p.lapses, p.state
+
+
+class SM2BatchTests(SimpleTestCase):
+    @settings(max_examples=300, deadline=None)
+    @given(st.lists(
+        st.tuples(
+            st.floats(min_value=1.3, max_value=5.0, allow_nan=False),
+            st.integers(min_value=0, max_value=10000),
+            st.integers(min_value=0, max_value=30),
+            st.integers(min_value=0, max_value=50),
+            st.integers(min_value=-2, max_value=7),
+        ),
+        min_size=1,
+        max_size=50,
+    ))
+    def test_batch_matches_scalar(self, rows):
+        self._assert_matches(rows)
+
+    def _assert_matches(self, rows):
+        out = sm2_update_batch(*zip(*rows))
+        for i, row in enumerate(rows):
+            expected = _scalar_sm2(*row)
+            self.assertEqual(
+                (float(out.ease[i]), int(out.interval_days[i]), int(out.repetitions[i]), int(out.lapses[i]), str(out.state[i])),
+                expected,
+            )
+
+    def test_replay_matches_sequential_scalar(self):
+        rng = random.Random(7)
+        reviews = [(rng.randrange(20), rng.choice([1, 3, 4, 4, 5])) for _ in range(400)]
+
+        cards, state = replay_history([c for c, _ in reviews], [q for _, q in reviews])
+
+        for i, card in enumerate(cards):
+            ease, interval, reps, lapses, label = 2.5, 0, 0, 0, "new"
+            for c, q in reviews:
+                if c == card:
+                    ease, interval, reps, lapses, label = _scalar_sm2(ease, interval, reps, lapses, q)
+            self.assertEqual(
+                (float(state.ease[i]), int(state.interval_days[i]), int(state.repetitions[i]), int(state.lapses[i])),
+                (ease, interval, reps, lapses),
+            )
+
+
+class SchedulerRegistryTests(SimpleTestCase):
+    def test_unknown_algorithm_falls_back_to_sm2(self):
+        self.assertEqual(get_scheduler("nope").name, "sm2")
+        self.assertEqual(get_scheduler("fsrs").name, "fsrs")
+
+    def test_schedulers_must_implement_the_interface(self):
+        class Partial(Scheduler):
+            def update(self, progress, quality, now=None, params=None):
+                return {}
+
+        with self.assertRaises(TypeError):
+            Partial()
+
+    def test_fsrs_scalar_matches_batch(self):
+        scheduler = SCHEDULERS["fsrs"]
+        now = timezone.now()
+        reviews = [(1, 4), (3, 1), (4, 3), (9, 5), (20, 4)]
+
+        p = CardProgress(algorithm="fsrs", due_at=now)
+        state = scheduler.initial_state(1)
+        when = now
+        for day, quality in reviews:
+            previous = when
+            when = now + timedelta(days=day)
+            scheduler.update(p, quality, now=when)
+            elapsed = 0.0 if day == reviews[0][0] else (when - previous).total_seconds() / 86400
+            state, interval = scheduler.update_batch(state, [quality], [elapsed])
+
+            self.assertAlmostEqual(p.algo_state["s"], float(state["s"][0]), places=9)
+            self.assertAlmostEqual(p.algo_state["d"], float(state["d"][0]), places=9)
+            self.assertEqual(p.interval_days, int(interval[0]))
+
+    def test_fsrs_lapse_lowers_stability(self):
+        scheduler = SCHEDULERS["fsrs"]
+        now = timezone.now()
+        p = CardProgress(algorithm="fsrs", due_at=now)
+        scheduler.update(p, 4, now=now)
+        scheduler.update(p, 4, now=now + timedelta(days=p.interval_days))
+        stable = p.algo_state["s"]
+
+        scheduler.update(p, 1, now=now + timedelta(days=30))
+
+        self.assertLess(p.algo_state["s"], stable)
+        self.assertEqual(p.state, "relearning")
+        self.assertEqual(p.lapses, 1)
+
+
+class FSRSOptimizerTests(TestCase):
+    def test_fit_reduces_loss_and_stores_params(self):
+        user = get_user_model().objects.create(username="fitter")
+        language = Language.objects.create(code="cs", name="Czech")
+        deck = Deck.objects.create(language=language, title="Top")
+        cards = Flashcard.objects.bulk_create(
+            Flashcard(language=language, word=f"w{i}", frequency_rank=i) for i in range(40)
+        )
+
+        # A learner who forgets much faster than the default weights predict.
+        rng = random.Random(0)
+        start = timezone.now() - timedelta(days=400)
+        logs = []
+        for card in cards:
+            when = start
+            for gap in (1, 3, 8, 20, 45):
+                when += timedelta(days=gap)
+                quality = 4 if rng.random() < 0.9 ** gap else 1
+                logs.append(ReviewLog(user=user, deck=deck, card=card, quality=quality, reviewed_at=when))
+        ReviewLog.objects.bulk_create(logs)
+        upto = ReviewLog.objects.latest("id").id
+
+        chunks = list(stream_histories(user.id, 64, upto))
+        self.assertEqual(sum(len(c.slot) for c in chunks), len(logs))
+        # Pages shorter than one card's history still carry every review.
+        short = list(stream_histories(user.id, 3, upto))
+        self.assertEqual([c.n_cards for c in short], [1] * len(cards))
+        self.assertEqual(sum(len(c.slot) for c in short), len(logs))
+
+        before = sum(chunk_loss(np.array([fsrs.DEFAULT_WEIGHTS]), c)[0][0] for c in chunks)
+
+        call_command(
+            "fit_scheduler_params", "--user", str(user.id), "--min-reviews", "1",
+            "--chunk-size", "64", "--epochs", "10", "--lr", "0.1", stdout=StringIO(),
+        )
+
+        stored = user.scheduler_params.get(algorithm="fsrs")
+        self.assertEqual(stored.last_review_id, upto)
+        self.assertEqual(stored.reviews, len(cards) * 4)
+        self.assertLess(stored.loss, before / stored.reviews)
+        self.assertEqual(len(stored.params["w"]), 17)
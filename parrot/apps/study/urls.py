@@ -1,6 +1,15 @@
+from django.conf import settings
 from django.urls import path
-from . import views
-urlpatterns = [
-    path("study/start/<int:deck_id>/", views.study_start, name="study_start"),
-    path("study/grade/<int:session_id>/", views.grade_card, name="grade_card"),
-]
\ No newline at end of file
+from . import async_views, views
+
+
+def study_patterns(views):
+    return [
+        path("study/start/<int:deck_id>/", views.study_start, name="study_start"),
+        path("study/grade/<int:session_id>/", views.grade_card, name="grade_card"),
+        path("study/grade/<int:session_id>/batch/", views.grade_batch, name="grade_batch"),
+        path("study/session/<int:session_id>/cards/", views.session_cards, name="session_cards"),
+    ]
+
+
+urlpatterns = study_patterns(async_views if settings.STUDY_ASYNC_VIEWS else views)
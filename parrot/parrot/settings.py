@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 import os
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -49,7 +50,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.core.query_stats.QueryStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'apps.core.db_router.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -95,10 +98,88 @@ WSGI_APPLICATION = 'parrot.wsgi.application'
 DATABASES = {
     "default": dj_database_url.config(
         default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}",
-        conn_max_age=600,
+        conn_max_age=int(os.getenv("DJANGO_CONN_MAX_AGE", "600")),
     )
 }
 
+# Read replicas: DATABASE_REPLICA_URLS is a comma-separated list of database
+# URLs, added as "replica_0", "replica_1", ... Views decorated with
+# apps.core.db_router.use_replica read from them; a client that wrote stays
+# on the primary for DATABASE_REPLICA_PIN_SECONDS. To try it locally, copy
+# db.sqlite3 to e.g. /tmp/replica.sqlite3 and set
+# DATABASE_REPLICA_URLS=sqlite:////tmp/replica.sqlite3.
+DATABASE_REPLICAS = []
+for _i, _url in enumerate(u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()):
+    DATABASES[f"replica_{_i}"] = {
+        **dj_database_url.parse(_url, conn_max_age=DATABASES["default"]["CONN_MAX_AGE"]),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica_{_i}")
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv("DATABASE_REPLICA_PIN_SECONDS", "10"))
+DATABASE_ROUTERS = ["apps.core.db_router.ReplicaRouter"]
+
+
+# Cache
+# DJANGO_CACHE_BACKEND: "locmem" (default), "file" or "redis". The location is
+# a directory for "file" and a redis:// URL for "redis" (any Redis-compatible
+# server works; needs the redis package).
+
+_CACHE_BACKENDS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "parrot"),
+    "file": ("django.core.cache.backends.filebased.FileBasedCache", str(BASE_DIR / ".cache")),
+    "redis": ("django.core.cache.backends.redis.RedisCache", "redis://127.0.0.1:6379/0"),
+}
+_cache_name = os.getenv("DJANGO_CACHE_BACKEND", "locmem")
+if _cache_name not in _CACHE_BACKENDS:
+    raise ImproperlyConfigured(
+        f"DJANGO_CACHE_BACKEND={_cache_name!r} is not one of: {', '.join(sorted(_CACHE_BACKENDS))}."
+    )
+_cache_backend, _cache_location = _CACHE_BACKENDS[_cache_name]
+# locmem is per process, so the per-process caches below that rely on
+# shared version keys default to off with it.
+_SHARED_CACHE = _cache_name != "locmem"
+
+CACHES = {
+    "default": {
+        "BACKEND": _cache_backend,
+        "LOCATION": os.getenv("DJANGO_CACHE_LOCATION", _cache_location),
+        "KEY_PREFIX": os.getenv("DJANGO_CACHE_PREFIX", "parrot"),
+    }
+}
+
+# Seconds a cached explore listing or badge set may live; version keys
+# invalidate them earlier on any relevant change.
+EXPLORE_CACHE_TIMEOUT = int(os.getenv("EXPLORE_CACHE_TIMEOUT", "3600"))
+
+# UserDeck counters older than this many seconds (since the last full
+# recount) are served as-is and recounted in the background; 0 disables.
+USERDECK_COUNTS_TTL = int(os.getenv("USERDECK_COUNTS_TTL", "900"))
+# "thread" (in-process pool) or "sync" (inline).
+USERDECK_COUNTS_REFRESH = os.getenv("USERDECK_COUNTS_REFRESH", "thread")
+USERDECK_COUNTS_REFRESH_WORKERS = int(os.getenv("USERDECK_COUNTS_REFRESH_WORKERS", "2"))
+
+# Deck and user card bitmaps kept per process for known/new-card counts
+# (see apps.library.services.card_index); 0 disables the index. Needs a
+# shared cache backend. KnownCardCount rows are not kept up to date while
+# the index is on: delete them before turning it off (they refill on read).
+CARD_INDEX_SIZE = int(os.getenv("CARD_INDEX_SIZE", "2048" if _SHARED_CACHE else "0"))
+
+# Flashcards whose render data each process keeps for study snapshots
+# (see apps.study.services.card_cache); 0 disables the cache. Needs a
+# shared cache backend, like CARD_INDEX_SIZE.
+CARD_CACHE_SIZE = int(os.getenv("CARD_CACHE_SIZE", "20000" if _SHARED_CACHE else "0"))
+
+# Route the study endpoints to apps.study.async_views. parrot/asgi.py turns
+# this on (and DJANGO_CONN_MAX_AGE off: persistent connections are not safe
+# to reuse across async requests).
+STUDY_ASYNC_VIEWS = os.getenv("STUDY_ASYNC_VIEWS", "0") == "1"
+
+# Fraction of requests whose queries are counted and timed (0 disables,
+# 1 records every request); see apps.core.query_stats. Server-Timing headers
+# expose DB timings to the client, so they default to DEBUG only.
+QUERY_STATS_SAMPLE_RATE = float(os.getenv("QUERY_STATS_SAMPLE_RATE", "1" if DEBUG else "0.01"))
+QUERY_STATS_SERVER_TIMING = os.getenv("QUERY_STATS_SERVER_TIMING", "1" if DEBUG else "0") == "1"
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 